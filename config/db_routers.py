@@ -0,0 +1,69 @@
+"""
+Database routers for the config project.
+
+Exports and reports read from the optional ``replica`` alias so the long
+``export_csv`` scans do not compete with imports on the primary. Everything
+else (all writes and normal page reads) stays on ``default``.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+import logging
+
+from django.db import DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+REPLICA_ALIAS = "replica"
+
+# the alias chosen when reporting_reads() was entered, None outside it
+_reporting = ContextVar("reporting_reads", default=None)
+
+
+def reporting_db():
+    """
+    Return the alias reporting queries should use.
+
+    Falls back to ``default`` when no replica is configured or it cannot be reached.
+    """
+    if REPLICA_ALIAS not in connections.settings:
+        return "default"
+    try:
+        connections[REPLICA_ALIAS].ensure_connection()
+    except DatabaseError as e:
+        logger.warning("Replica unavailable, reading from default: %s", e)
+        return "default"
+    return REPLICA_ALIAS
+
+
+@contextmanager
+def reporting_reads():
+    """
+    Route every read made inside the block to the reporting database.
+
+    Querysets are lazy, so a queryset that is iterated after the block exits
+    must be pinned with ``.using()`` on the yielded alias.
+
+    The alias is chosen once on entry (a nested block keeps it): with the replica
+    down, the block pays one connect timeout rather than one per query.
+    """
+    alias = _reporting.get() or reporting_db()
+    token = _reporting.set(alias)
+    try:
+        yield alias
+    finally:
+        _reporting.reset(token)
+
+
+class ReplicaRouter:
+    """Send reads inside ``reporting_reads()`` to the replica, everything else to default."""
+
+    def db_for_read(self, model, **hints):
+        return _reporting.get() or "default"
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # the replica holds the same rows as default
+        return True
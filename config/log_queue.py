@@ -0,0 +1,56 @@
+"""
+Non-blocking logging for the config project (settings.LOGGING).
+
+Request, import and export threads only put the log record on an in-memory queue.
+A listener thread formats the records and writes them to the real handlers, so a
+slow console, file or pipe never holds up an import loop.
+"""
+
+import logging
+import os
+import queue
+from logging.config import ConvertingList
+from logging.handlers import QueueHandler, QueueListener
+
+
+class QueueListenerHandler(QueueHandler):
+    """
+    QueueHandler that owns the QueueListener writing to ``handlers``, given in LOGGING
+    as "cfg://handlers.<name>". dictConfig configures handlers in name order, so those
+    handlers need names that sort before this one's.
+    """
+
+    def __init__(self, handlers, respect_handler_level=True):
+        super().__init__(queue.SimpleQueue())
+        if isinstance(handlers, ConvertingList):
+            # indexing converts the cfg:// references to the configured handlers
+            handlers = [handlers[index] for index in range(len(handlers))]
+        self.handlers = handlers
+        self.respect_handler_level = respect_handler_level
+        self._listener = None
+        self._pid = None
+        self._start()
+
+    def _start(self):
+        self._listener = QueueListener(self.queue, *self.handlers, respect_handler_level=self.respect_handler_level)
+        self._listener.start()
+        self._pid = os.getpid()
+
+    def prepare(self, record):
+        # same process, nothing is pickled: the listener thread does the %-formatting
+        # (QueueHandler would format here, on the logging thread). Arguments are
+        # rendered when the record is written, so do not log objects that change after
+        return record
+
+    def emit(self, record):
+        if self._pid != os.getpid():
+            # a forked worker (e.g. gunicorn --preload) does not inherit the listener thread
+            self._start()
+        super().emit(record)
+
+    def close(self):
+        # logging.shutdown() at exit and a reconfiguration close the handler: write what is queued
+        listener, self._listener = self._listener, None
+        if listener is not None and self._pid == os.getpid():
+            listener.stop()
+        super().close()
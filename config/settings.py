@@ -14,6 +14,7 @@ from django.contrib.messages import constants as messages
 from pathlib import Path
 from dotenv import load_dotenv
 import os
+import tempfile
 
 load_dotenv()
 
@@ -70,6 +71,8 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    # ?profile=cprofile|sample for staff users, after AuthenticationMiddleware
+    "pages.profiling.RequestProfilerMiddleware",
     #"debug_toolbar.middleware.DebugToolbarMiddleware",
 ]
 
@@ -103,16 +106,81 @@ WSGI_APPLICATION = "config.wsgi.application"
 #     }
 # }
 # change database default setting to use postgresql
+# connection details come from the environment (see .env), the literals below are
+# only the local development fallbacks
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.postgresql",
-        "NAME": "hwdemo1",
-        "USER": "postgres",
-        "PASSWORD": "1111",
-        "HOST": "localhost",
+        "NAME": os.getenv("DB_NAME", "hwdemo1"),
+        "USER": os.getenv("DB_USER", "postgres"),
+        "PASSWORD": os.getenv("DB_PASSWORD", "1111"),
+        "HOST": os.getenv("DB_HOST", "localhost"),
+        "PORT": os.getenv("DB_PORT", ""),
+        # keep connections open between requests and check them before reuse
+        "CONN_MAX_AGE": int(os.getenv("DB_CONN_MAX_AGE", "60")),
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {},
     }
 }
 
+# DB_ENGINE=sqlite runs on a local SQLite file instead (benchmarks, single-box deployments).
+# The pragmas run on every new connection: WAL lets exports read while an import writes,
+# synchronous=NORMAL only syncs at checkpoints, and the page cache and mmap window are
+# sized for the bulk import and export scans. IMMEDIATE transactions take the write lock
+# up front, so concurrent writers wait out the timeout instead of failing with "database is locked".
+if os.getenv("DB_ENGINE", "postgresql").lower() == "sqlite":
+    DATABASES["default"] = {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": os.getenv("DB_NAME", str(BASE_DIR / "db.sqlite3")),
+        "CONN_MAX_AGE": DATABASES["default"]["CONN_MAX_AGE"],
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {
+            "transaction_mode": "IMMEDIATE",
+            "timeout": int(os.getenv("DB_SQLITE_TIMEOUT", "20")),
+            "init_command": (
+                "PRAGMA journal_mode=WAL;"
+                "PRAGMA synchronous=NORMAL;"
+                f"PRAGMA mmap_size={int(os.getenv('DB_SQLITE_MMAP_MB', '256')) * 1024 * 1024};"
+                f"PRAGMA cache_size=-{int(os.getenv('DB_SQLITE_CACHE_MB', '64')) * 1024};"
+                "PRAGMA temp_store=MEMORY;"
+            ),
+        },
+    }
+
+# DB_POOL=1 switches to the psycopg 3 connection pool (needs psycopg[pool]).
+# Django does not allow persistent connections together with the pool.
+if os.getenv("DB_POOL", "").lower() in ("1", "true", "yes") and DATABASES["default"]["ENGINE"].endswith("postgresql"):
+    DATABASES["default"]["CONN_MAX_AGE"] = 0
+    DATABASES["default"]["OPTIONS"]["pool"] = {
+        "min_size": int(os.getenv("DB_POOL_MIN_SIZE", "2")),
+        "max_size": int(os.getenv("DB_POOL_MAX_SIZE", "10")),
+        "timeout": int(os.getenv("DB_POOL_TIMEOUT", "30")),
+    }
+
+# Optional read replica used by exports and reports (config.db_routers).
+# Any DB_REPLICA_* value left unset is taken from the default database, so two
+# local databases only need DB_REPLICA_NAME.
+if os.getenv("DB_REPLICA_NAME") or os.getenv("DB_REPLICA_HOST"):
+    DATABASES["replica"] = {
+        **DATABASES["default"],
+        "NAME": os.getenv("DB_REPLICA_NAME", DATABASES["default"]["NAME"]),
+        "USER": os.getenv("DB_REPLICA_USER", DATABASES["default"]["USER"]),
+        "PASSWORD": os.getenv("DB_REPLICA_PASSWORD", DATABASES["default"]["PASSWORD"]),
+        "HOST": os.getenv("DB_REPLICA_HOST", DATABASES["default"]["HOST"]),
+        "PORT": os.getenv("DB_REPLICA_PORT", DATABASES["default"]["PORT"]),
+        "OPTIONS": dict(DATABASES["default"]["OPTIONS"]),
+    }
+
+DATABASE_ROUTERS = ["config.db_routers.ReplicaRouter"]
+
+# Thread pools used by the async (ASGI) views in pages.views, the size of each
+# pool is also the most database connections it can hold open
+ASYNC_POOL_WORKERS = {
+    "import": int(os.getenv("ASYNC_IMPORT_WORKERS", "2")),
+    "orm": int(os.getenv("ASYNC_ORM_WORKERS", "8")),
+    "io": int(os.getenv("ASYNC_IO_WORKERS", "4")),
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -167,6 +235,84 @@ DEFAULT_AUTO_FIELD = (
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 MEDIA_URL = "/media/"
 
+# Hash uploads while they stream in (pages.views.import_csv skips files that
+# already imported cleanly), then hand them to Django's default handlers
+FILE_UPLOAD_HANDLERS = [
+    "pages.upload_handlers.HashingUploadHandler",
+    "django.core.files.uploadhandler.MemoryFileUploadHandler",
+    "django.core.files.uploadhandler.TemporaryFileUploadHandler",
+]
+
+# Copies of uploaded CSVs, kept so `manage.py resume_import` can restart from a checkpoint.
+# A copy is deleted when its run completes; `manage.py prune_error_logs` removes the ones no
+# failed run needs, and those of failed runs after IMPORT_UPLOAD_MAX_AGE_DAYS
+IMPORT_UPLOAD_DIR = os.path.join(BASE_DIR, "import_uploads")
+IMPORT_UPLOAD_MAX_AGE_DAYS = int(os.getenv("IMPORT_UPLOAD_MAX_AGE_DAYS", "7"))
+
+# Chunk size clients must use for the chunked upload API (pages.views.chunked_upload_start)
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", str(8 * 1024 * 1024)))
+
+# Check product price / stock / weight a batch at a time with NumPy (needs numpy installed),
+# compare with `manage.py benchmark_numeric_parsing`
+IMPORT_COLUMNAR_NUMERICS = os.getenv("IMPORT_COLUMNAR_NUMERICS", "").lower() in ("1", "true", "yes")
+
+# Rows per batch in the CSV importers (one lookup query and one transaction per batch)
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "500"))
+
+# Trace allocations with tracemalloc during imports (pages.helper.ImportProfiler): peak memory
+# per phase and the top IMPORT_PROFILE_TOP allocation sites in the error log and the app log.
+# Tracing slows the import down noticeably, wall and CPU time per phase are always reported.
+IMPORT_PROFILE_MEMORY = os.getenv("IMPORT_PROFILE_MEMORY", "").lower() in ("1", "true", "yes")
+IMPORT_PROFILE_TOP = int(os.getenv("IMPORT_PROFILE_TOP", "10"))
+
+# Import error logs (pages.views.import_csv), pruned by `manage.py prune_error_logs`
+ERROR_LOG_DIR = os.path.join(BASE_DIR, "error_logs")
+# store new logs as .txt.gz
+ERROR_LOG_GZIP = os.getenv("ERROR_LOG_GZIP", "").lower() in ("1", "true", "yes")
+ERROR_LOG_MAX_AGE_DAYS = int(os.getenv("ERROR_LOG_MAX_AGE_DAYS", "30"))
+ERROR_LOG_MAX_TOTAL_MB = int(os.getenv("ERROR_LOG_MAX_TOTAL_MB", "1024"))
+
+# Import / export metrics served at /metrics (pages.metrics): every worker process on the
+# host writes its own file in METRICS_DIR, so all workers must share the directory.
+METRICS_DIR = os.getenv("METRICS_DIR", os.path.join(tempfile.gettempdir(), "csv_import_metrics"))
+# when set, /metrics answers only requests with "Authorization: Bearer <METRICS_TOKEN>"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+# Request profiles (pages.profiling), listed at /profiles/; the oldest beyond PROFILES_KEEP are removed
+PROFILES_DIR = os.getenv("PROFILES_DIR", os.path.join(BASE_DIR, "profiles"))
+PROFILES_KEEP = int(os.getenv("PROFILES_KEEP", "50"))
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.005"))
+
+# Logging (config.log_queue): the app loggers log at LOG_LEVEL, everything else from WARNING.
+# Records go through a queue, a listener thread writes them to stderr and to LOG_FILE when set.
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FILE = os.getenv("LOG_FILE", "")
+# with LOG_LEVEL=DEBUG the importers log one row in every IMPORT_ROW_LOG_SAMPLE (1 logs every row)
+IMPORT_ROW_LOG_SAMPLE = max(int(os.getenv("IMPORT_ROW_LOG_SAMPLE", "1000")), 1)
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {
+        "app": {"format": "%(asctime)s %(levelname)s %(name)s [%(threadName)s] %(message)s"},
+    },
+    "handlers": {
+        "console": {"class": "logging.StreamHandler", "formatter": "app"},
+        # named to sort after the handlers it writes to, dictConfig configures them in name order
+        "queue": {
+            "()": "config.log_queue.QueueListenerHandler",
+            "handlers": ["cfg://handlers.console"] + (["cfg://handlers.file"] if LOG_FILE else []),
+        },
+    },
+    "root": {"handlers": ["queue"], "level": "WARNING"},
+    "loggers": {
+        name: {"level": LOG_LEVEL} for name in ("config", "pages", "customers", "products", "orders")
+    },
+}
+if LOG_FILE:
+    # WatchedFileHandler reopens the file after logrotate moves it
+    LOGGING["handlers"]["file"] = {"class": "logging.handlers.WatchedFileHandler", "filename": LOG_FILE, "formatter": "app"}
+
 
 # https://django-debug-toolbar.readthedocs.io/en/latest/installation.html
 INTERNAL_IPS = [
@@ -1,13 +1,25 @@
 from django.contrib import admin
-from .models import Customer
+from .models import Customer, CustomerStats
 # Register your models here.
 
 
 class CustomerAdmin(admin.ModelAdmin):
-    list_display = ("customer_id", "name", "email", "phone", "address", "created_at")
+    list_display = (
+        "customer_id", "name", "email", "phone", "address", "created_at",
+        "stats__order_count", "stats__lifetime_spend", "stats__last_order_date",
+    )
     list_display_links = ("customer_id", "name")
+    list_select_related = ("stats",)
     search_fields = ("name", "email", "phone")
     list_per_page = 25
 
 
+class CustomerStatsAdmin(admin.ModelAdmin):
+    list_display = ("customer", "order_count", "lifetime_spend", "last_order_date")
+    list_select_related = ("customer",)
+    search_fields = ("customer__name", "customer__email")
+    list_per_page = 25
+
+
 admin.site.register(Customer, CustomerAdmin)
+admin.site.register(CustomerStats, CustomerStatsAdmin)
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='row_hash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+    ]
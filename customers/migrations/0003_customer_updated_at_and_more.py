@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0002_customer_row_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['updated_at', 'customer_id'], name='customers_c_updated_258708_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Max, Sum
+
+
+def fill_customer_stats(apps, schema_editor):
+    # same grouped query as CustomerStats.rebuild(), on the historical models
+    Order = apps.get_model("orders", "Order")
+    CustomerStats = apps.get_model("customers", "CustomerStats")
+    rows = (
+        Order.objects.order_by()
+        .values("customer_id")
+        .annotate(order_count=Count("pk"), lifetime_spend=Sum("total_amount"), last_order_date=Max("order_date"))
+    )
+    CustomerStats.objects.bulk_create((CustomerStats(**row) for row in rows.iterator()), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0003_customer_updated_at_and_more'),
+        ('orders', '0004_order_access_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerStats',
+            fields=[
+                ('customer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='customers.customer')),
+                ('order_count', models.IntegerField(default=0)),
+                ('lifetime_spend', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('last_order_date', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name_plural': 'customer stats',
+            },
+        ),
+        migrations.RunPython(fill_customer_stats, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,17 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, F, Max, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
 from django.core.validators import MinLengthValidator, RegexValidator
 from django.core.exceptions import ValidationError
+from pages.helper import row_fingerprint
+from contextlib import contextmanager
+from contextvars import ContextVar
+from decimal import Decimal
 import re
 
+# per-customer deltas collected inside CustomerStats.deferred()
+_pending_stats = ContextVar("pending_customer_stats", default=None)
+
 # Create your models here.
 class Customer(models.Model):
     
@@ -14,6 +23,23 @@ class Customer(models.Model):
         help_text="Optional phone number",)
     address = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # bumped on every save, drives the incremental (?since=) exports
+    updated_at = models.DateTimeField(auto_now=True)
+    # fingerprint of the imported fields, lets a re-import skip unchanged rows
+    row_hash = models.CharField(max_length=64, blank=True, default="", editable=False)
+
+    class Meta:
+        indexes = [
+            # changes since a watermark, in (updated_at, pk) order
+            models.Index(fields=["updated_at", "customer_id"]),
+        ]
+
+    @staticmethod
+    def fingerprint(name, email, phone, address):
+        return row_fingerprint(name, email, phone or "", address or "")
+
+    def compute_row_hash(self):
+        return self.fingerprint(self.name, self.email, self.phone, self.address)
 
     def clean(self):
         errors = {}
@@ -47,5 +73,99 @@ class Customer(models.Model):
         if errors:
             raise ValidationError(errors)
         
+    def save(self, *args, **kwargs):
+        self.row_hash = self.compute_row_hash()
+        if kwargs.get("update_fields") is not None:
+            # auto_now only applies to fields that are saved
+            kwargs["update_fields"] = {*kwargs["update_fields"], "row_hash", "updated_at"}
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return self.name
+
+
+class CustomerStats(models.Model):
+    """
+    Order counters per customer, so showing them does not aggregate the orders table.
+    Kept in step by Order.save/delete and the order import; a customer without a row
+    has no orders. reconcile_customer_stats rebuilds them from the orders.
+    """
+
+    customer = models.OneToOneField(Customer, primary_key=True, on_delete=models.CASCADE, related_name="stats")
+    order_count = models.IntegerField(default=0)
+    lifetime_spend = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    last_order_date = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name_plural = "customer stats"
+
+    @classmethod
+    def record(cls, customer_id, orders=0, spend=0, order_date=None):
+        """Add to a customer's counters, or to the pending deltas inside deferred()"""
+        spend = Decimal(str(spend))
+        pending = _pending_stats.get()
+        if pending is None:
+            cls._apply(customer_id, orders, spend, order_date)
+            return
+        count, total, last = pending.get(customer_id, (0, Decimal("0"), None))
+        if last is None or (order_date is not None and order_date > last):
+            last = order_date
+        pending[customer_id] = (count + orders, total + spend, last)
+
+    @classmethod
+    def _apply(cls, customer_id, orders, spend, order_date):
+        # F() expressions, concurrent orders for the same customer do not overwrite each other
+        updates = {"order_count": F("order_count") + orders, "lifetime_spend": F("lifetime_spend") + spend}
+        if order_date is not None:
+            # GREATEST() with a NULL argument is NULL on SQLite
+            updates["last_order_date"] = Greatest(Coalesce("last_order_date", Value(order_date)), Value(order_date))
+        if not cls.objects.filter(customer_id=customer_id).update(**updates):
+            cls.objects.get_or_create(customer_id=customer_id)
+            cls.objects.filter(customer_id=customer_id).update(**updates)
+
+    @classmethod
+    @contextmanager
+    def deferred(cls):
+        """
+        Collect the record() calls made in the block and apply them once per customer when
+        it exits without an error, for bulk paths that save many orders in one transaction.
+        """
+        pending = {}
+        token = _pending_stats.set(pending)
+        try:
+            yield pending
+        finally:
+            _pending_stats.reset(token)
+        # in customer order, so parallel import shards lock the counter rows in the same order
+        for customer_id in sorted(pending):
+            cls._apply(customer_id, *pending[customer_id])
+
+    @classmethod
+    def rebuild(cls, customer_ids=None):
+        """
+        Recompute the counters of ``customer_ids`` (default: everyone) from the orders
+        with one grouped query. Returns the number of counter rows written.
+        """
+        from orders.models import Order  # orders.models imports this module
+
+        orders = Order.objects.order_by()
+        stats = cls.objects.all()
+        if customer_ids is not None:
+            customer_ids = set(customer_ids)
+            orders = orders.filter(customer_id__in=customer_ids)
+            stats = stats.filter(customer_id__in=customer_ids)
+            pending = _pending_stats.get()
+            if pending:
+                # the orders behind those deltas are already in the rebuilt counts
+                for customer_id in customer_ids:
+                    pending.pop(customer_id, None)
+        rows = orders.values("customer_id").annotate(
+            order_count=Count("pk"), lifetime_spend=Sum("total_amount"), last_order_date=Max("order_date")
+        )
+        with transaction.atomic():
+            stats.delete()
+            created = cls.objects.bulk_create((cls(**row) for row in rows.iterator()), batch_size=1000)
+        return len(created)
+
     def __str__(self):
-        return self.name
\ No newline at end of file
+        return f"{self.customer_id}: {self.order_count} orders"
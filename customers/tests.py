@@ -1,3 +1,172 @@
+import io
+import os
+import tempfile
+from decimal import Decimal
+from unittest import mock
+
+from django.core.management import call_command
+from django.db.models import Count, Max, Sum
 from django.test import TestCase
 
-# Create your tests here.
+from orders.models import Order
+from orders.views import import_orders_with_validation
+
+from pages.helper import save_import_checkpoint
+from pages.models import ImportRowError, ImportRun
+from products.models import Product
+
+from .models import Customer, CustomerStats
+from .views import import_customers_with_validation
+
+HEADER = "name,email,phone,address\n"
+ROWS = "John William,john@example.com,,1 Main Street\nJane Doe,jane@example.com,,2 Main Street\n"
+
+
+class CustomerImportTests(TestCase):
+    def setUp(self):
+        self.error_log_path = os.path.join(self.enterContext(tempfile.TemporaryDirectory()), "errors.txt")
+
+    def run_import(self, rows, **kwargs):
+        return import_customers_with_validation(io.StringIO(HEADER + rows), self.error_log_path, **kwargs)
+
+    def read_log(self):
+        with open(self.error_log_path, encoding="utf-8") as f:
+            return f.read()
+
+    def test_error_log_has_the_rows_then_the_summary(self):
+        self.assertEqual(self.run_import(ROWS + ",,,\n", batch_size=1)[:2], (2, 1))
+        log = self.read_log()
+        self.assertLess(log.index("Column Mapping"), log.index("Row 2:"))
+        self.assertLess(log.index("Row 2:"), log.index("Row 4:"))
+        self.assertLess(log.index("  [SKIPPED] Empty row"), log.index("IMPORT SUMMARY"))
+        self.assertLess(log.index("IMPORT SUMMARY"), log.index("IMPORT PROFILE"))
+        self.assertIn("Successful: 2\n", log)
+
+    def test_row_errors_are_stored_on_the_run(self):
+        run = ImportRun.objects.create(model_type="customer")
+        self.run_import(ROWS + "No Email,,,\n,,,\n", import_run=run)
+        errors = ImportRowError.objects.filter(run=run).order_by("row_number")
+        self.assertEqual(
+            list(errors.values_list("row_number", "field", "code")),
+            [(4, "email", "validation"), (5, "", "empty_row")],
+        )
+        self.assertEqual(errors[0].raw_data, str({"name": "No Email", "email": "", "phone": "", "address": ""}))
+
+    def test_unchanged_rows_are_skipped_on_reimport(self):
+        self.run_import(ROWS)
+        updated_at = dict(Customer.objects.values_list("email", "updated_at"))
+
+        run = ImportRun.objects.create(model_type="customer")
+        changed = ROWS.replace("2 Main Street", "3 Main Street")
+        self.assertEqual(self.run_import(changed, import_run=run)[:2], (0, 0))
+        self.assertEqual(run.unchanged_count, 1)
+        self.assertEqual(Customer.objects.get(email="john@example.com").updated_at, updated_at["john@example.com"])
+        jane = Customer.objects.get(email="jane@example.com")
+        self.assertEqual(jane.address, "3 Main Street")
+        self.assertGreater(jane.updated_at, updated_at["jane@example.com"])
+        self.assertEqual(jane.row_hash, jane.compute_row_hash())
+
+    def test_fatal_error_keeps_the_batches_already_logged(self):
+        calls = []
+
+        def fail_second_batch(*args):
+            calls.append(args)
+            if len(calls) == 2:
+                raise RuntimeError("disk full")
+            return save_import_checkpoint(*args)
+
+        with mock.patch("customers.views.save_import_checkpoint", side_effect=fail_second_batch), self.assertLogs("customers.views", "ERROR"):
+            self.assertEqual(self.run_import(ROWS, batch_size=1), (0, 0, ["Fatal error: disk full"]))
+        self.assertEqual(list(Customer.objects.values_list("email", flat=True)), ["john@example.com"])
+        log = self.read_log()
+        self.assertIn("✅ CREATED new customer: john@example.com", log)
+        self.assertNotIn("jane@example.com", log)
+        self.assertTrue(log.endswith("Fatal Error during import: disk full\n"))
+
+
+class CustomerStatsTests(TestCase):
+    def setUp(self):
+        self.ann = Customer.objects.create(name="Ann Lee", email="ann@example.com")
+        self.bob = Customer.objects.create(name="Bob Ray", email="bob@example.com")
+        self.product = Product.objects.create(name="Widget", sku="W-1", price=10, stock_quantity=100)
+
+    def order(self, customer, day, total="10.00", quantity=1):
+        return Order.objects.create(
+            customer=customer, product=self.product, quantity=quantity,
+            order_date=f"2024-01-{day:02d}T10:00:00Z", total_amount=Decimal(total),
+        )
+
+    def assertStatsMatchOrders(self):
+        expected = {
+            row["customer_id"]: (row["order_count"], row["lifetime_spend"], row["last_order_date"])
+            for row in Order.objects.order_by().values("customer_id").annotate(
+                order_count=Count("pk"), lifetime_spend=Sum("total_amount"), last_order_date=Max("order_date")
+            )
+        }
+        stats = {
+            customer_id: (order_count, lifetime_spend, last_order_date)
+            for customer_id, order_count, lifetime_spend, last_order_date in CustomerStats.objects.values_list(
+                "customer_id", "order_count", "lifetime_spend", "last_order_date"
+            )
+            # a counter row left at zero is the same as no row
+            if order_count
+        }
+        self.assertEqual(stats, expected)
+
+    def test_order_changes_keep_the_counters_in_step(self):
+        first = self.order(self.ann, 1)
+        second = self.order(self.ann, 5, "25.50")
+        self.order(self.bob, 3)
+        self.assertStatsMatchOrders()
+
+        second.total_amount = Decimal("30.00")
+        second.save()
+        self.assertStatsMatchOrders()
+
+        # moving the newest order away moves ann's last order date back
+        second.customer = self.bob
+        second.save()
+        self.assertStatsMatchOrders()
+
+        first.order_date = "2023-12-31T10:00:00Z"
+        first.save()
+        self.assertStatsMatchOrders()
+
+        first.delete()
+        self.assertStatsMatchOrders()
+        self.assertFalse(CustomerStats.objects.filter(customer=self.ann).exists())
+
+    def test_order_import_matches_the_aggregate(self):
+        rows = "".join(
+            f"{email},W-1,1,2024-02-{day:02d} 10:00:00,pending,{total}\n"
+            for email, day, total in [("ann@example.com", 1, "5.00"), ("bob@example.com", 2, "7.25"),
+                                      ("ann@example.com", 9, "1.10"), ("ann@example.com", 4, "3.00")]
+        )
+        self.order(self.bob, 1)
+        csv_text = "customer_email,product_sku,quantity,order_date,status,total_amount\n" + rows
+        error_log_path = os.path.join(self.enterContext(tempfile.TemporaryDirectory()), "errors.txt")
+
+        result = import_orders_with_validation(io.StringIO(csv_text), error_log_path, batch_size=2)
+        self.assertEqual(result[:2], (4, 0))
+        self.assertStatsMatchOrders()
+        import_orders_with_validation(io.StringIO(csv_text), error_log_path, delete_existing=True)
+        self.assertStatsMatchOrders()
+        self.assertEqual(CustomerStats.objects.get(customer=self.ann).order_count, 3)
+
+    def test_rebuild_repairs_the_counters(self):
+        self.order(self.ann, 1)
+        self.order(self.ann, 2, "5.00")
+        self.order(self.bob, 3)
+        CustomerStats.objects.update(order_count=99, lifetime_spend=0, last_order_date=None)
+
+        self.assertEqual(CustomerStats.rebuild([self.ann.pk]), 1)
+        self.assertEqual(CustomerStats.objects.get(customer=self.bob).order_count, 99)
+        self.assertEqual(
+            CustomerStats.objects.filter(customer=self.ann).values_list("order_count", "lifetime_spend").get(),
+            (2, Decimal("15.00")),
+        )
+
+        stdout = io.StringIO()
+        call_command("reconcile_customer_stats", stdout=stdout)
+        self.assertIn("Rebuilt order counters for 2 customer(s)", stdout.getvalue())
+        self.assertStatsMatchOrders()
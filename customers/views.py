@@ -2,10 +2,20 @@ from django.shortcuts import render, redirect
 from django.http import HttpResponse
 from django.contrib import messages
 
-# from django.db import transaction
+from django.db import transaction
 from customers.models import Customer
 from customers.forms import CustomerCSVForm
 
+from pages.helper import ImportErrorRecorder
+from pages.helper import ImportProfiler
+from pages.helper import RowDebugLog
+from pages.metrics import ImportMeter
+from pages.helper import batched_rows
+from pages.helper import OffsetTrackingLines
+from pages.helper import RowProjection
+from pages.helper import save_import_checkpoint
+from pages.helper import open_error_log
+
 
 from django.conf import settings
 import os
@@ -17,14 +27,26 @@ import logging
 logger = logging.getLogger(__name__)
 # Create your views here.
 
-def import_customers_with_validation(decoded_data, error_log_path, encoding="utf-8", delete_existing=False):
+def import_customers_with_validation(decoded_data, error_log_path, encoding="utf-8", delete_existing=False, import_run=None, dry_run=False, resume=False, base_offset=0, lookup=None, batch_size=None):
     """
     Import customers with comprehensive validation and error logging
+    Row errors are also stored against import_run (pages.models.ImportRun) when given
+    dry_run validates against the existing emails loaded once and writes nothing
+    Each batch commits in one transaction together with its checkpoint on import_run;
+    resume=True continues that run's counters and row numbers (see resume_import)
+    decoded_data is the decoded file or a text stream of its lines (large uploads are never read whole)
+    lookup (pages.helper.ImportLookup) collects the imported customers by email for a bundle import
+    batch_size rows are committed per transaction (default IMPORT_BATCH_SIZE)
     """
+    recorder = ImportErrorRecorder(import_run, "customer")
+    profiler = ImportProfiler("Customer import")
+    row_log = RowDebugLog(logger)
+    meter = ImportMeter("customer", dry_run)
+    error_file = None
     try:
         # ====== DELETE EXISTING CUSTOMERS IF REQUESTED ======
         customers_deleted = 0
-        if delete_existing:
+        if delete_existing and not dry_run:
             try:
                 # Get count before deletion
                 customers_deleted = Customer.objects.count()
@@ -33,27 +55,33 @@ def import_customers_with_validation(decoded_data, error_log_path, encoding="utf
                 deleted_info = Customer.objects.all().delete()
                 customers_deleted = deleted_info[0] if deleted_info else 0
 
-                logger.info(f"Deleted {customers_deleted} existing customers before import")
+                logger.info("Deleted %s existing customers before import", customers_deleted)
             except Exception as delete_error:
-                logger.error(f"Error deleting existing customers: {str(delete_error)}")
+                logger.error("Error deleting existing customers: %s", delete_error)
                 return 0, 0, [f"Error clearing existing customers: {str(delete_error)}"]
             
-        # Create StringIO object from decoded data
-        io_string = io.StringIO(decoded_data)
+        # ====== DRY RUN: load existing emails once, nothing is written ======
+        existing_emails = None
+        if dry_run:
+            existing_emails = {} if delete_existing else dict(Customer.objects.values_list("email", "row_hash"))
+
+        profiler.switch("sniff")
+        # Line iterator that tracks the byte offset of each row for checkpoints
+        lines = OffsetTrackingLines(decoded_data, encoding, base_offset)
 
         # Try to detect dialect
-        sample = decoded_data[:1024]  # Read first 1024 chars
+        sample = lines.sample()
         sniffer = csv.Sniffer()
 
         try:
             dialect = sniffer.sniff(sample)
             delimiter = dialect.delimiter
-            logger.info(f"Detected CSV delimiter: {repr(delimiter)}")
+            logger.info("Detected CSV delimiter: %r", delimiter)
         except:
             delimiter = ","  # Default to comma
             logger.warning("Could not detect CSV delimiter, using comma")
 
-        reader = csv.reader(io_string, delimiter=delimiter, quotechar='"')
+        reader = csv.reader(lines, delimiter=delimiter, quotechar='"')
 
         # Read header
         try:
@@ -64,177 +92,236 @@ def import_customers_with_validation(decoded_data, error_log_path, encoding="utf
             return 0, 0, [f"Error reading CSV header: {str(e)}"]
 
         # Log header info for debugging
-        logger.info(f"CSV Header: {header}")
-        logger.info(f"Number of columns: {len(header)}")
+        logger.info("CSV Header: %s", header)
+        logger.info("Number of columns: %s", len(header))
 
-        # # Normalize header names (strip whitespace, lowercase)
-        # normalized_header = [col.strip().lower() for col in header]
-        # logger.info(f"Normalized Header: {normalized_header}")
-
-        # Map column indices
-        column_mapping = {}
+        # Match the header to the fields by name once, in any column order
         expected_columns = ["name", "email", "phone", "address"]
-
-        # for i, col_name in enumerate(normalized_header):
-        #     for expected in expected_columns:
-        #         if expected in col_name or col_name in expected:
-        #             column_mapping[expected] = i
-        #             break
-
-        # If no mapping found, assume standard order
-        if not column_mapping:
-            column_mapping = {
-                expected: i for i, expected in enumerate(expected_columns)
-            }
-
-        logger.info(f"Column mapping: {column_mapping}")
+        project_row = RowProjection(header, expected_columns)
+        column_mapping = project_row.mapping
+        missing_columns = project_row.missing_required(CustomerCSVForm)
+        if missing_columns:
+            return 0, 0, [f"CSV header is missing required column(s): {', '.join(missing_columns)} (header: {header})"]
+        header_warnings = project_row.warnings()
+        for warning in header_warnings:
+            logger.warning("Customer CSV: %s", warning)
+
+        logger.info("Column mapping: %s", column_mapping)
+
+        # Open error log file, the row lines are written after each batch
+        error_file = open_error_log(error_log_path)
+        error_file.write(f"Customer Import Error Log - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+        error_file.write("=" * 80 + "\n\n")
+        if dry_run:
+            error_file.write("DRY RUN - validation only, no data was written\n")
+        error_file.write(f"Encoding: {encoding}\n")
+        error_file.write(f"Delimiter: {repr(delimiter)}\n")
+        error_file.write(f"Header: {header}\n")
+        error_file.write(f"Column Mapping: {column_mapping}\n")
+        for warning in header_warnings:
+            error_file.write(f"Header warning: {warning}\n")
+        error_file.write("-" * 80 + "\n\n")
 
         success_count = 0
         error_count = 0
         error_details = []
-        error_log_content = []  # Store log lines in memory
-        
-        for row_num, row in enumerate(reader, start=2):  # start=2 because of header
-                row_errors = []
-
-                # Log raw row for debugging
-                error_log_content.append(f"Row {row_num}: {row}\n")
-
-                # Check for empty row
-                if not row or not any(cell and str(cell).strip() for cell in row):
-                    error_log_content.append(f"  [SKIPPED] Empty row\n\n")
-                    error_count += 1
-                    error_details.append(f"Row {row_num}: Empty row")
-                    continue
-
-                try:
-                    # Extract data based on column mapping
-                    data = {}
-                    for field, col_index in column_mapping.items():
-                        if col_index < len(row):
-                            value = row[col_index]
-                            if value is not None:
-                                data[field] = str(value).strip()
-                            else:
-                                data[field] = ""
-                        else:
-                            data[field] = ""
-
-                    # Ensure all fields are present
-                    for field in expected_columns:
-                        if field not in data:
-                            data[field] = ""
-
-                    # Log extracted data
-                    error_log_content.append(f"  Extracted data: {data}\n")
-
-                    # Validate using form
-                    form = CustomerCSVForm(data)
-
-                    if form.is_valid():
-                        cleaned_data = form.cleaned_data
-
-                        # Check for duplicate email
-                        try:
-                            if Customer.objects.filter(email=cleaned_data["email"]).exists():
-                                customer = Customer.objects.get(email=cleaned_data["email"])
-                                # Update existing customer
-                                customer.name = cleaned_data["name"]
-                                customer.phone = cleaned_data["phone"] or None
-                                customer.address = data.get("address") or None
-                                customer.save()
-                                error_log_content.append(
-                                    f"  ✅ UPDATED existing customer: {cleaned_data['email']}\n\n"
-                                )
-                            else:
-                                # Create new customer
-                                Customer.objects.create(
-                                    name=cleaned_data["name"],
-                                    email=cleaned_data["email"],
-                                    phone=cleaned_data["phone"] or None,
-                                    address=data.get("address") or None,
-                                )
-                                success_count += 1
-                                error_log_content.append(
-                                    f"  ✅ CREATED new customer: {cleaned_data['email']}\n\n"
+        error_log_content = []  # log lines of the current batch
+        unchanged_count = 0
+        start_row = 2  # start=2 because of header
+        if resume and import_run is not None:
+            success_count = import_run.success_count
+            error_count = import_run.error_count
+            unchanged_count = import_run.unchanged_count
+            start_row = import_run.checkpoint_row + 1 if import_run.checkpoint_row else 2
+        email_index = column_mapping.get("email")
+
+        meter.start(success_count, error_count, unchanged_count)
+        # "read" is decoding and CSV parsing, batched_rows pulls them a batch at a time
+        profiler.switch("read")
+        for batch in batched_rows(reader, start=start_row, batch_size=batch_size or settings.IMPORT_BATCH_SIZE):
+            profiler.switch("database")
+            # one indexed read per batch for the customers that already exist
+            existing_customers = {}
+            if not dry_run and email_index is not None:
+                batch_emails = {row[email_index].strip().lower() for _, row in batch if email_index < len(row)}
+                existing_customers = {c.email: c for c in Customer.objects.filter(email__in=batch_emails)}
+
+            # the batch and its checkpoint commit together
+            with transaction.atomic():
+                for row_num, row in batch:
+                    row_log(row_num, "%s", row)
+                    row_errors = []
+
+                    # Log raw row for debugging
+                    error_log_content.append(f"Row {row_num}: {row}\n")
+
+                    # Check for empty row
+                    if not row or not any(cell and str(cell).strip() for cell in row):
+                        error_log_content.append(f"  [SKIPPED] Empty row\n\n")
+                        error_count += 1
+                        error_details.append(f"Row {row_num}: Empty row")
+                        recorder.add(row_num, "empty_row", "Empty row", raw_data=row)
+                        continue
+
+                    try:
+                        profiler.switch("validate")
+                        # One call: the header was matched to the fields up front
+                        data = project_row(row)
+
+                        # Log extracted data
+                        error_log_content.append(f"  Extracted data: {data}\n")
+
+                        # Validate using form
+                        form = CustomerCSVForm(data)
+                        is_valid = form.is_valid()
+                        profiler.switch("database")
+
+                        if is_valid:
+                            cleaned_data = form.cleaned_data
+
+                            # Check for duplicate email
+                            try:
+                                row_hash = Customer.fingerprint(
+                                    cleaned_data["name"], cleaned_data["email"], cleaned_data["phone"], data.get("address")
                                 )
+                                if dry_run:
+                                    if existing_emails.get(cleaned_data["email"]) == row_hash:
+                                        unchanged_count += 1
+                                        error_log_content.append(f"  ⏭️ UNCHANGED customer: {cleaned_data['email']}\n\n")
+                                    elif cleaned_data["email"] in existing_emails:
+                                        existing_emails[cleaned_data["email"]] = row_hash
+                                        error_log_content.append(f"  ✅ WOULD UPDATE existing customer: {cleaned_data['email']}\n\n")
+                                    else:
+                                        existing_emails[cleaned_data["email"]] = row_hash
+                                        if lookup is not None:
+                                            # unsaved, lets a dry-run order stage see the would-be customer
+                                            lookup.customers[cleaned_data["email"]] = Customer(
+                                                name=cleaned_data["name"], email=cleaned_data["email"]
+                                            )
+                                        success_count += 1
+                                        error_log_content.append(f"  ✅ WOULD CREATE new customer: {cleaned_data['email']}\n\n")
+                                elif cleaned_data["email"] in existing_customers:
+                                    customer = existing_customers[cleaned_data["email"]]
+                                    if customer.row_hash == row_hash:
+                                        # same content as the stored row, skip the write
+                                        unchanged_count += 1
+                                        error_log_content.append(f"  ⏭️ UNCHANGED customer: {cleaned_data['email']}\n\n")
+                                        continue
+                                    # Update existing customer
+                                    customer.name = cleaned_data["name"]
+                                    customer.phone = cleaned_data["phone"] or None
+                                    customer.address = data.get("address") or None
+                                    with transaction.atomic():  # savepoint, a failed row must not break the batch
+                                        customer.save(update_fields=["name", "phone", "address"])
+                                    error_log_content.append(
+                                        f"  ✅ UPDATED existing customer: {cleaned_data['email']}\n\n"
+                                    )
+                                else:
+                                    # Create new customer
+                                    with transaction.atomic():  # savepoint, a failed row must not break the batch
+                                        existing_customers[cleaned_data["email"]] = Customer.objects.create(
+                                            name=cleaned_data["name"],
+                                            email=cleaned_data["email"],
+                                            phone=cleaned_data["phone"] or None,
+                                            address=data.get("address") or None,
+                                        )
+                                    success_count += 1
+                                    error_log_content.append(
+                                        f"  ✅ CREATED new customer: {cleaned_data['email']}\n\n"
+                                    )
 
                             
 
-                        except Exception as db_error:
-                            error_count += 1
-                            error_msg = (
-                                f"Row {row_num}: Database Error - {str(db_error)}"
-                            )
-                            row_errors.append(error_msg)
-                            error_details.append(error_msg)
-                            error_log_content.append(f"  ❌ DATABASE ERROR: {str(db_error)}\n")
-                            error_log_content.append(f"     Data: {cleaned_data}\n\n")
-
-                    else:
-                        # Collect all form errors
-                        error_count += 1
-                        for field, field_errors in form.errors.items():
-                            for error in field_errors:
+                            except Exception as db_error:
+                                error_count += 1
                                 error_msg = (
-                                    f"Row {row_num}: {field.capitalize()} - {error}"
+                                    f"Row {row_num}: Database Error - {str(db_error)}"
                                 )
                                 row_errors.append(error_msg)
                                 error_details.append(error_msg)
+                                error_log_content.append(f"  ❌ DATABASE ERROR: {str(db_error)}\n")
+                                error_log_content.append(f"     Data: {cleaned_data}\n\n")
+                                recorder.add(row_num, "database", str(db_error), raw_data=data)
 
-                        # Write detailed errors to log file
-                        error_log_content.append(f"  ❌ VALIDATION FAILED:\n")
-                        for field, field_errors in form.errors.items():
-                            for error in field_errors:
-                                error_log_content.append(f"     • {field}: {error}\n")
-                        error_log_content.append(f"     Raw data: {data}\n\n")
-
-                except Exception as e:
-                    error_count += 1
-                    error_msg = f"Row {row_num}: Processing Error - {str(e)}"
-                    row_errors.append(error_msg)
-                    error_details.append(error_msg)
-                    error_log_content.append(f"  ❌ PROCESSING ERROR: {str(e)}\n")
-                    error_log_content.append(f"     Raw row: {row}\n\n")
+                        else:
+                            # Collect all form errors
+                            error_count += 1
+                            for field, field_errors in form.errors.items():
+                                for error in field_errors:
+                                    error_msg = (
+                                        f"Row {row_num}: {field.capitalize()} - {error}"
+                                    )
+                                    row_errors.append(error_msg)
+                                    error_details.append(error_msg)
+
+                            # Write detailed errors to log file
+                            recorder.add_form_errors(row_num, form, raw_data=data)
+                            error_log_content.append(f"  ❌ VALIDATION FAILED:\n")
+                            for field, field_errors in form.errors.items():
+                                for error in field_errors:
+                                    error_log_content.append(f"     • {field}: {error}\n")
+                            error_log_content.append(f"     Raw data: {data}\n\n")
+
+                    except Exception as e:
+                        error_count += 1
+                        error_msg = f"Row {row_num}: Processing Error - {str(e)}"
+                        row_errors.append(error_msg)
+                        error_details.append(error_msg)
+                        error_log_content.append(f"  ❌ PROCESSING ERROR: {str(e)}\n")
+                        error_log_content.append(f"     Raw row: {row}\n\n")
+                        recorder.add(row_num, "processing", str(e), raw_data=row)
+
+                recorder.flush()
+                save_import_checkpoint(import_run, lines.offset, row_num, success_count, error_count, unchanged_count)
+
+            if lookup is not None:
+                lookup.customers.update(existing_customers)
+            profiler.switch("error_log")
+            error_file.writelines(error_log_content)
+            error_log_content.clear()
+            meter.batch(len(batch), success_count, error_count, unchanged_count)
+            profiler.switch("read")
+
+        profiler.switch("database")
+        recorder.flush()
+        if import_run is not None:
+            import_run.unchanged_count = unchanged_count
 
         # Update summary
         total_rows = row_num - 1 if "row_num" in locals() else 0
         
         # Create summary
         summary_lines = [
-            f"Customer Import Error Log - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n",
-            "=" * 80 + "\n\n",
-            f"Encoding: {encoding}\n",
-            f"Delimiter: {repr(delimiter)}\n",
+            "=" * 80 + "\n",
+            f"IMPORT SUMMARY - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n",
             f"Total rows processed: {total_rows}\n",
             f"Successful: {success_count}\n",
             f"Failed: {error_count}\n",
             f"Success rate: {(success_count / max(total_rows, 1) * 100):.1f}%\n",
             f"Duplicates handled: {'Update existing'}\n",
-            "-" * 80 + "\n\n",
+            f"Unchanged (skipped): {unchanged_count}\n",
         ]
 
-        # error_file.write(summary + content[len(summary) :])
-        # Open error log file
-        with open(error_log_path, "w", encoding="utf-8") as error_file:
-            error_file.write(f"Customer Import Error Log - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-            error_file.write("=" * 80 + "\n\n")
-            error_file.write(f"Encoding: {encoding}\n")
-            error_file.write(f"Delimiter: {repr(delimiter)}\n")
-            error_file.write(f"Header: {header}\n")
-            error_file.write(f"Column Mapping: {column_mapping}\n")
-            error_file.write("-" * 80 + "\n\n")
-            error_file.writelines(summary_lines)
-            error_file.writelines(row_errors)
-            error_file.writelines(error_log_content)            
+        # the rows are already in the log, the summary and profile go after them
+        profiler.switch("error_log")
+        error_file.writelines(summary_lines)
+        profiler.finish()
+        error_file.write("=" * 80 + "\n")
+        error_file.write("IMPORT PROFILE\n")
+        error_file.writelines(profiler.lines())
 
         return success_count, error_count, error_details[:20]
 
     except Exception as e:
-        logger.error(
-            f"Error in import_customers_with_validation: {str(e)}", exc_info=True
-        )
-        # Create minimal error log
-        with open(error_log_path, "w", encoding="utf-8") as f:
-            f.write(f"Fatal Error during import: {str(e)}\n")
+        logger.error("Error in import_customers_with_validation: %s", e, exc_info=True)
+        # keep the rows logged so far, or create a minimal error log
+        if error_file is None:
+            error_file = open_error_log(error_log_path)
+        error_file.write(f"Fatal Error during import: {str(e)}\n")
         return 0, 0, [f"Fatal error: {str(e)}"]
+    finally:
+        # also closes the profile (and its tracemalloc use) on the early returns
+        profiler.finish()
+        meter.finish()
+        if error_file is not None:
+            error_file.close()
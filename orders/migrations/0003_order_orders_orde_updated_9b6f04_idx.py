@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0003_customer_updated_at_and_more'),
+        ('orders', '0002_alter_order_options_order_created_at_and_more'),
+        ('products', '0004_product_updated_at_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['updated_at', 'order_id'], name='orders_orde_updated_9b6f04_idx'),
+        ),
+    ]
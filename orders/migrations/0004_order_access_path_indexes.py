@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def create_order_date_brin(apps, schema_editor):
+    # BRIN only exists on PostgreSQL; orders are appended roughly in order_date order,
+    # so a few pages of block ranges cover date range scans of the whole table
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS order_order_date_brin ON orders_order USING brin (order_date)"
+    )
+
+
+def drop_order_date_brin(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS order_order_date_brin")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0003_customer_updated_at_and_more'),
+        ('orders', '0003_order_orders_orde_updated_9b6f04_idx'),
+        ('products', '0004_product_updated_at_and_more'),
+    ]
+
+    # the composite indexes are created before the indexes they replace are dropped
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['customer', 'order_date'], name='order_customer_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['product', 'order_date'], name='order_product_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', 'order_date'], name='order_status_date_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='order',
+            name='orders_orde_status_c6dd84_idx',
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='customer',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='orders', to='customers.customer'),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='product',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='orders', to='products.product'),
+        ),
+        migrations.RunPython(create_order_date_brin, drop_order_date_brin),
+    ]
@@ -2,8 +2,9 @@
 from django.db import models
 from django.core.exceptions import ValidationError
 from datetime import datetime
-from products.models import Product
-from customers.models import Customer
+from products.models import InventoryMovement, Product
+from customers.models import Customer, CustomerStats
+from decimal import Decimal
 from django.utils import timezone
 
 
@@ -18,8 +19,10 @@ class Order(models.Model):
     ]
 
     order_id = models.AutoField(primary_key=True)
-    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name="orders")
-    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="orders")
+    # the (customer, order_date) and (product, order_date) indexes below lead with the FK,
+    # a separate single-column FK index would only be another index to maintain on insert
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name="orders", db_index=False)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="orders", db_index=False)
     quantity = models.IntegerField()
     order_date = models.DateTimeField()
     status = models.CharField(max_length=20, choices=ORDER_STATUS_CHOICES, default="pending")
@@ -30,9 +33,17 @@ class Order(models.Model):
 
     class Meta:
         ordering = ["-order_date"]
+        # querysets that do not need the -order_date ordering (counts, bulk deletes,
+        # aggregates, pk paged exports) clear it with .order_by()
         indexes = [
             models.Index(fields=["order_date"]),
-            models.Index(fields=["status"]),
+            # customer.orders / product.orders / status filters come back already in
+            # order_date order (read backwards for the default ordering), no sort step
+            models.Index(fields=["customer", "order_date"], name="order_customer_date_idx"),
+            models.Index(fields=["product", "order_date"], name="order_product_date_idx"),
+            models.Index(fields=["status", "order_date"], name="order_status_date_idx"),
+            # changes since a watermark, in (updated_at, pk) order
+            models.Index(fields=["updated_at", "order_id"]),
         ]
 
     def clean(self):
@@ -51,14 +62,16 @@ class Order(models.Model):
             old_order = Order.objects.get(pk=self.pk)
             if old_order.quantity != self.quantity:
                 stock_needed = self.quantity - old_order.quantity
-                if stock_needed > 0 and self.product.stock_quantity < stock_needed:
+                available = self.product.available_stock() if stock_needed > 0 else 0
+                if stock_needed > 0 and available < stock_needed:
                     errors["quantity"] = (
-                        f"Insufficient stock. Only {self.product.stock_quantity} available."
+                        f"Insufficient stock. Only {available} available."
                     )
         else:  # New order
-            if self.quantity > self.product.stock_quantity:
+            available = self.product.available_stock()
+            if self.quantity > available:
                 errors["quantity"] = (
-                    f"Insufficient stock. Only {self.product.stock_quantity} available."
+                    f"Insufficient stock. Only {available} available."
                 )
 
         # Order date validation (cannot be in the future by too much)
@@ -88,24 +101,41 @@ class Order(models.Model):
         # Run full validation
         self.full_clean()
 
-        # Update product stock
-        if self.pk:  # Existing order
-            old_order = Order.objects.get(pk=self.pk)
-            if old_order.quantity != self.quantity:
-                stock_change = old_order.quantity - self.quantity
-                self.product.stock_quantity += stock_change
-                self.product.save()
-        else:  # New order
-            self.product.stock_quantity -= self.quantity
-            self.product.save()
+        old_order = Order.objects.get(pk=self.pk) if self.pk else None
 
         super().save(*args, **kwargs)
 
+        # Update product stock, appended to the ledger (the product row is not written)
+        if old_order is None:
+            InventoryMovement.objects.create(
+                product_id=self.product_id, delta=-self.quantity, reason="order_created", order_id=self.pk
+            )
+        elif old_order.quantity != self.quantity:
+            InventoryMovement.objects.create(
+                product_id=self.product_id,
+                delta=old_order.quantity - self.quantity,
+                reason="order_changed",
+                order_id=self.pk,
+            )
+
+        # Update the customer's order counters
+        total = Decimal(str(self.total_amount))
+        if old_order is None:
+            CustomerStats.record(self.customer_id, 1, total, self.order_date)
+        elif old_order.customer_id != self.customer_id or old_order.order_date != self.order_date:
+            # last_order_date can move backwards, recount the customers involved
+            CustomerStats.rebuild([old_order.customer_id, self.customer_id])
+        elif old_order.total_amount != total:
+            CustomerStats.record(self.customer_id, spend=total - old_order.total_amount)
+
     def delete(self, *args, **kwargs):
         # Restore stock when order is deleted
-        self.product.stock_quantity += self.quantity
-        self.product.save()
+        InventoryMovement.objects.create(
+            product_id=self.product_id, delta=self.quantity, reason="order_deleted", order_id=self.pk
+        )
         super().delete(*args, **kwargs)
+        # the deleted order may have been the customer's last one, recount
+        CustomerStats.rebuild([self.customer_id])
 
     def __str__(self):
         return f"Order #{self.order_id} - {self.customer.name} - {self.product.name}"
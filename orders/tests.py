@@ -1,3 +1,111 @@
+import io
+import os
+import tempfile
+
+from django.db import connection
 from django.test import TestCase
 
-# Create your tests here.
+from customers.models import Customer
+from products.models import Product
+
+from .models import Order
+from .views import import_orders_with_validation
+
+HEADER = "customer_email,product_sku,quantity,order_date,status,total_amount\n"
+
+
+class OrderImportTests(TestCase):
+    def setUp(self):
+        self.customer = Customer.objects.create(name="Import Tester", email="buyer@example.com")
+        self.product = Product.objects.create(name="Widget", sku="W-1", price=10, stock_quantity=3)
+
+    def run_import(self, rows, **kwargs):
+        with tempfile.TemporaryDirectory() as directory:
+            return import_orders_with_validation(
+                io.StringIO(HEADER + rows), os.path.join(directory, "errors.txt"), **kwargs
+            )
+
+    def test_dry_run_reports_what_the_import_would_do(self):
+        rows = (
+            "buyer@example.com,W-1,2,2024-01-01 10:00:00,pending,20.00\n"
+            # the first order's stock is taken in memory, so this one is short
+            "buyer@example.com,W-1,2,2024-01-02 10:00:00,pending,20.00\n"
+            "nobody@example.com,W-1,1,2024-01-03 10:00:00,pending,10.00\n"
+        )
+        dry_run = self.run_import(rows, dry_run=True)
+        self.assertEqual(dry_run[:2], (1, 2))
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(self.product.available_stock(), 3)
+
+        self.assertEqual(self.run_import(rows)[:2], dry_run[:2])
+        self.assertEqual(self.product.available_stock(), 1)
+
+    def test_dry_run_replace_counts_the_stock_given_back(self):
+        Order.objects.create(
+            customer=self.customer, product=self.product, quantity=3,
+            order_date="2023-12-01T00:00:00Z", total_amount=30,
+        )
+        rows = "buyer@example.com,W-1,3,2024-01-01 10:00:00,pending,30.00\n"
+        self.assertEqual(self.run_import(rows, dry_run=True)[:2], (0, 1))
+        self.assertEqual(self.run_import(rows, dry_run=True, delete_existing=True)[:2], (1, 0))
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(self.product.available_stock(), 0)
+
+
+class OrderQueryPlanTests(TestCase):
+    """EXPLAIN checks that the order access paths are served by the composite indexes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = Customer.objects.create(name="Plan Tester", email="plan@example.com")
+        cls.product = Product.objects.create(name="Plan Widget", sku="PLAN-1", price=10, stock_quantity=100)
+
+    def plan(self, queryset):
+        if connection.vendor == "postgresql":
+            # a test sized table is cheaper to scan (or to bitmap scan and sort), make the
+            # planner show the ordered index scan it would use on a real table
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+                cursor.execute("SET LOCAL enable_bitmapscan = off")
+        return queryset.explain()
+
+    def assertIndexedWithoutSort(self, queryset, index_name):
+        plan = self.plan(queryset)
+        self.assertIn(index_name, plan)
+        # SQLite reports "USE TEMP B-TREE FOR ORDER BY", PostgreSQL a Sort node
+        self.assertNotIn("TEMP B-TREE", plan)
+        self.assertNotRegex(plan, r"(?m)^\s*(->\s*)?Sort\b")
+
+    def test_customer_orders_use_customer_date_index(self):
+        self.assertIndexedWithoutSort(self.customer.orders.all(), "order_customer_date_idx")
+
+    def test_product_orders_use_product_date_index(self):
+        self.assertIndexedWithoutSort(self.product.orders.all(), "order_product_date_idx")
+
+    def test_status_filter_uses_status_date_index(self):
+        self.assertIndexedWithoutSort(Order.objects.filter(status="pending"), "order_status_date_idx")
+
+    def test_existing_order_check_uses_composite_index(self):
+        # the importer's duplicate check (orders.views.import_orders_with_validation),
+        # either FK + order_date index matches two of its equality conditions
+        queryset = Order.objects.filter(
+            customer=self.customer, product=self.product, order_date="2024-01-01T00:00:00Z", quantity=1
+        )
+        self.assertRegex(self.plan(queryset), r"order_(customer|product)_date_idx")
+
+    def test_bulk_querysets_skip_default_ordering(self):
+        self.assertNotIn("ORDER BY", str(Order.objects.order_by().values("product_id").query))
+        plan = self.plan(Order.objects.order_by().filter(customer=self.customer))
+        self.assertNotIn("TEMP B-TREE", plan)
+        self.assertNotRegex(plan, r"(?m)^\s*(->\s*)?Sort\b")
+
+    def test_order_date_brin_index(self):
+        if connection.vendor != "postgresql":
+            self.skipTest("BRIN indexes are PostgreSQL only")
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT indexdef FROM pg_indexes WHERE tablename = 'orders_order' AND indexname = 'order_order_date_brin'"
+            )
+            row = cursor.fetchone()
+        self.assertIsNotNone(row)
+        self.assertIn("USING brin", row[0])
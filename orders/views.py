@@ -2,15 +2,25 @@ from django.shortcuts import render, redirect
 from django.http import HttpResponse
 from django.contrib import messages
 
-# from django.db import transaction
+from django.db import transaction
+from django.db.models import Sum
 from .models import Order
 from .forms import OrderCSVForm
 
-from customers.models import Customer
-from products.models import Product
+from customers.models import Customer, CustomerStats
+from products.models import InventoryMovement, Product
 
 from pages.helper import parse_numeric_string
 from pages.helper import format_currency
+from pages.helper import open_error_log
+from pages.helper import ImportErrorRecorder
+from pages.helper import ImportProfiler
+from pages.helper import RowDebugLog
+from pages.metrics import ImportMeter
+from pages.helper import batched_rows
+from pages.helper import OffsetTrackingLines
+from pages.helper import RowProjection
+from pages.helper import save_import_checkpoint
 
 
 from django.conf import settings
@@ -23,49 +33,105 @@ import logging
 logger = logging.getLogger(__name__)
 # Create your views here.
 def import_orders_with_validation(
-    decoded_data, error_log_path, encoding="utf-8", delete_existing=False
+    decoded_data, error_log_path, encoding="utf-8", delete_existing=False, import_run=None, dry_run=False,
+    resume=False, base_offset=0, lookup=None, batch_size=None
 ):
     """
     Import orders with comprehensive validation and error logging
     Includes option to delete existing orders before import
+    Row errors are also stored against import_run (pages.models.ImportRun) when given
+    dry_run resolves customers, products, stock and existing orders from state
+    loaded once up front and writes nothing
+    Each batch commits in one transaction together with its checkpoint on import_run;
+    resume=True continues that run's counters and row numbers (see resume_import)
+    decoded_data is the decoded file or a text stream of its lines (large uploads are never read whole)
+    lookup (pages.helper.ImportLookup) resolves customers and products imported earlier in the same
+    bundle from memory, anything not in it is still looked up in the database
+    batch_size rows are committed per transaction (default IMPORT_BATCH_SIZE)
     """
+    recorder = ImportErrorRecorder(import_run, "order")
+    profiler = ImportProfiler("Order import")
+    row_log = RowDebugLog(logger)
+    meter = ImportMeter("order", dry_run)
+    error_file = None
     try:
         # ====== DELETE EXISTING ORDERS IF REQUESTED ======
         orders_deleted = 0
-        if delete_existing:
+        if delete_existing and not dry_run:
             try:
                 # Get count before deletion
-                orders_deleted = Order.objects.count()
-
-                # Restore stock for all orders before deletion
-                for order in Order.objects.all():
-                    order.product.stock_quantity += order.quantity
-                    order.product.save()
+                orders_deleted = Order.objects.order_by().count()
+
+                # Restore stock for all orders before deletion, one ledger movement per product
+                restored = Order.objects.order_by().values("product_id").annotate(quantity=Sum("quantity"))
+                InventoryMovement.objects.bulk_create(
+                    (
+                        InventoryMovement(product_id=row["product_id"], delta=row["quantity"], reason="order_deleted")
+                        for row in restored.iterator()
+                    ),
+                    batch_size=1000,
+                )
 
-                # Delete all orders
-                deleted_info = Order.objects.all().delete()
+                # Delete all orders, no customer has any left to count
+                deleted_info = Order.objects.order_by().delete()
                 orders_deleted = deleted_info[0] if deleted_info else 0
+                CustomerStats.objects.all().delete()
 
-                logger.info(f"Deleted {orders_deleted} existing orders before import")
+                logger.info("Deleted %s existing orders before import", orders_deleted)
             except Exception as delete_error:
-                logger.error(f"Error deleting existing orders: {str(delete_error)}")
+                logger.error("Error deleting existing orders: %s", delete_error)
                 return 0, 0, [f"Error clearing existing orders: {str(delete_error)}"]
 
-        # Create StringIO object from decoded data
-        io_string = io.StringIO(decoded_data)
+        # ====== DRY RUN: bulk load lookup and stock state, nothing is written ======
+        if dry_run:
+            dry_run_customers = {c.email: c for c in Customer.objects.only("customer_id", "email")}
+            dry_run_products = {
+                p.sku: p for p in Product.objects.with_stock().only("product_id", "sku", "name", "stock_quantity")
+            }
+            for product in dry_run_products.values():
+                # tracked in memory from here on
+                product.stock_quantity = product.current_stock
+            existing_order_keys = set()
+            if delete_existing:
+                # stock the replaced orders would give back
+                orders_deleted = Order.objects.order_by().count()
+                restored = Order.objects.order_by().values("product_id").annotate(quantity=Sum("quantity"))
+                products_by_id = {p.pk: p for p in dry_run_products.values()}
+                for restored_row in restored:
+                    if restored_row["product_id"] in products_by_id:
+                        products_by_id[restored_row["product_id"]].stock_quantity += restored_row["quantity"]
+            else:
+                existing_order_keys = set(
+                    Order.objects.order_by()
+                    .values_list("customer_id", "product_id", "order_date", "quantity")
+                    .iterator(chunk_size=5000)
+                )
+            if lookup is not None:
+                # what the earlier (dry-run) stages of the bundle would have written
+                for email, customer in lookup.customers.items():
+                    dry_run_customers.setdefault(email, customer)
+                for sku, product in lookup.products.items():
+                    if sku in dry_run_products:
+                        dry_run_products[sku].stock_quantity = product.stock_quantity
+                    else:
+                        dry_run_products[sku] = product
+
+        profiler.switch("sniff")
+        # Line iterator that tracks the byte offset of each row for checkpoints
+        lines = OffsetTrackingLines(decoded_data, encoding, base_offset)
         # Try to detect dialect
-        sample = decoded_data[:1024]
+        sample = lines.sample()
         sniffer = csv.Sniffer()
 
         try:
             dialect = sniffer.sniff(sample)
             delimiter = dialect.delimiter
-            logger.info(f"Detected CSV delimiter: {repr(delimiter)}")
+            logger.info("Detected CSV delimiter: %r", delimiter)
         except:
             delimiter = ","
             logger.warning("Could not detect CSV delimiter, using comma")
 
-        reader = csv.reader(io_string, delimiter=delimiter, quotechar='"')
+        reader = csv.reader(lines, delimiter=delimiter, quotechar='"')
 
         # Read header
         try:
@@ -84,308 +150,350 @@ def import_orders_with_validation(
             return 0, 0, [error_msg]
 
        
-        # Map column indices with flexible column mapping
-        column_mapping = {}
+        # Match the header to the fields by name once, in any column order
         expected_columns = ["customer_email","product_sku","quantity","order_date","status","total_amount",]
-
-        # If no mapping found, assume standard order
-        if not column_mapping:
-            column_mapping = {
-                expected: i
-                for i, expected in enumerate(expected_columns[: len(header)])
-            }
-
-        logger.info(f"Order Column mapping: {column_mapping}")
+        project_row = RowProjection(header, expected_columns)
+        column_mapping = project_row.mapping
+        missing_columns = project_row.missing_required(OrderCSVForm)
+        if missing_columns:
+            error_msg = f"CSV header is missing required column(s): {', '.join(missing_columns)} (header: {header})"
+            if delete_existing and orders_deleted > 0:
+                error_msg += f" (NOTE: {orders_deleted} existing orders were already deleted!)"
+            return 0, 0, [error_msg]
+        header_warnings = project_row.warnings()
+        for warning in header_warnings:
+            logger.warning("Order CSV: %s", warning)
+
+        logger.info("Order Column mapping: %s", column_mapping)
+
+        # Open error log file, the row lines are written after each batch
+        error_file = open_error_log(error_log_path)
+        error_file.write(f"Order Import Error Log - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+        error_file.write("=" * 80 + "\n\n")
+        if dry_run:
+            error_file.write("DRY RUN - validation only, no data was written\n")
+        error_file.write(f"Encoding: {encoding}\n")
+        error_file.write(f"Delimiter: {repr(delimiter)}\n")
+        if delete_existing:
+            error_file.write(f"IMPORT MODE: REPLACE (Deleted {orders_deleted} existing orders)\n")
+        else:
+            error_file.write(f"IMPORT MODE: APPEND\n")
+        error_file.write(f"Header: {header}\n")
+        error_file.write(f"Column Mapping: {column_mapping}\n")
+        for warning in header_warnings:
+            error_file.write(f"Header warning: {warning}\n")
+        error_file.write("-" * 80 + "\n\n")
 
         success_count = 0
         error_count = 0
         error_details = []
-        error_log_content = []  # Store log lines in memory
-        imported_orders = []
+        error_log_content = []  # log lines of the current batch
+        # running totals for the summary, not a list of every imported order
+        order_counts = {"created": 0, "updated": 0}
+        product_counts = {}
         total_order_value = 0
-        
-        for row_num, row in enumerate(reader, start=2):
-                
-                row_errors = []
-
-                # Log raw row
-                error_log_content.append(f"Row {row_num}: {row}\n")
-
-                # Check for empty row
-                if not row or not any(cell and str(cell).strip() for cell in row):
-                    error_log_content.append(f"  [SKIPPED] Empty row\n\n")
-                    error_count += 1
-                    error_details.append(f"Row {row_num}: Empty row")
-                    continue
-
-                try:
-                    # Extract data based on column mapping
-                    data = {}
-                    for field, col_index in column_mapping.items():
-                        if col_index < len(row):
-                            value = row[col_index]
-                            if value is not None:
-                                data[field] = str(value).strip()
-                            else:
-                                data[field] = ""
-                        else:
-                            data[field] = ""
-
-                    # Ensure all fields are present
-                    for field in expected_columns:
-                        if field not in data:
-                            data[field] = ""
-
-                    # Parse numeric fields
-                    try:
-                        # Parse quantity
-                        if data.get("quantity"):
-                            data["quantity"] = parse_numeric_string(data["quantity"], "int")
-                        else:
-                            data["quantity"] = 0
-                    except ValueError as e:
-                        row_errors.append(f"Invalid quantity format: {str(e)}")
-
-                    try:
-                        # Parse total amount
-                        if data.get("total_amount"):
-                            data["total_amount"] = parse_numeric_string(data["total_amount"], "float")
-                        else:
-                            data["total_amount"] = 0.0
-                    except ValueError as e:
-                        row_errors.append(f"Invalid total amount format: {str(e)}")
-
-                    # If we already have errors from parsing, skip form validation
-                    if row_errors:
+        start_row = 2
+        if resume and import_run is not None:
+            success_count = import_run.success_count
+            error_count = import_run.error_count
+            start_row = import_run.checkpoint_row + 1 if import_run.checkpoint_row else 2
+
+        meter.start(success_count, error_count)
+        # "read" is decoding and CSV parsing, batched_rows pulls them a batch at a time
+        profiler.switch("read")
+        for batch in batched_rows(reader, start=start_row, batch_size=batch_size or settings.IMPORT_BATCH_SIZE):
+            profiler.switch("database")
+            # the batch and its checkpoint commit together, so a resumed import
+            # never re-applies an order (or its stock change) twice; customer
+            # counters are written once per customer per batch
+            with transaction.atomic(), CustomerStats.deferred():
+                for row_num, row in batch:
+                    row_log(row_num, "%s", row)
+                    row_errors = []
+
+                    # Log raw row
+                    error_log_content.append(f"Row {row_num}: {row}\n")
+
+                    # Check for empty row
+                    if not row or not any(cell and str(cell).strip() for cell in row):
+                        error_log_content.append(f"  [SKIPPED] Empty row\n\n")
                         error_count += 1
-                        for error in row_errors:
-                            error_details.append(f"Row {row_num}: {error}")
-                        error_log_content.append(f"  ❌ PRE-VALIDATION ERRORS:\n")
-                        for error in row_errors:
-                            error_log_content.append(f"     • {error}\n")
-                        error_log_content.append(f"     Raw data: {data}\n\n")
+                        error_details.append(f"Row {row_num}: Empty row")
+                        recorder.add(row_num, "empty_row", "Empty row", raw_data=row)
                         continue
 
-                    # Log extracted data
-                    error_log_content.append(f"  Extracted data: {data}\n")
-
-                    # Validate using form
-                    form = OrderCSVForm(data)
+                    try:
+                        profiler.switch("validate")
+                        # One call: the header was matched to the fields up front
+                        data = project_row(row)
 
-                    if form.is_valid():
-                        cleaned_data = form.cleaned_data
+                        # Parse numeric fields
                         try:
-                            # Get customer and product
-                            try:
-                                customer = Customer.objects.get(email=cleaned_data["customer_email"])
-                                
-                                print("form.is_valid customer", customer)
-                            except Customer.DoesNotExist:
-                                row_errors.append(f"Customer with email '{cleaned_data['customer_email']}' not found")
-                                raise ValueError(f"Customer not found")
-
-                            try:
-                                product = Product.objects.get(sku=cleaned_data["product_sku"])
-                                print("form.is_valid product", product)
-                            except Product.DoesNotExist:
-                                row_errors.append(
-                                    f"Product with SKU '{cleaned_data['product_sku']}' not found"
-                                )
-                                raise ValueError(f"Product not found")
-
-                            # Check stock availability
-                            if cleaned_data["quantity"] > product.stock_quantity:
-                                print("form.is_valid quantity", cleaned_data["quantity"])
-                                row_errors.append(f"Insufficient stock for '{product.name}'. "
-                                    f"Requested: {cleaned_data['quantity']}, Available: {product.stock_quantity}"
-                                )
-                                raise ValueError(f"Insufficient stock")
-
-                            # Check if order already exists (by customer, product, date, quantity)
-                            existing_order = Order.objects.filter(
-                                                                customer=customer,
-                                                                product=product,
-                                                                order_date=cleaned_data["order_date"],
-                                                                quantity=cleaned_data["quantity"],
-                                                            ).first()
-                            
-                            print("form.is_valid existing_order", existing_order)
-                            
-                            if existing_order:
-                                print("order exist row", row)
-                                # Update existing order
-                                existing_order.status = cleaned_data["status"]
-                                existing_order.total_amount = cleaned_data[
-                                    "total_amount"
-                                ]
-                                existing_order.save()
-
-                                error_log_content.append(f"  ✅ UPDATED existing order for {customer.email}\n")
-                                error_log_content.append(f"     Product: {product.name}, Quantity: {cleaned_data['quantity']}\n")
-                                error_log_content.append(f"     Total: {format_currency(cleaned_data['total_amount'])}\n\n")
-
-                                imported_orders.append(
-                                    {
-                                        "order_id": existing_order.order_id,
-                                        "customer": customer.email,
-                                        "product": product.sku,
-                                        "quantity": cleaned_data["quantity"],
-                                        "total": cleaned_data["total_amount"],
-                                        "action": "updated",
-                                    }
-                                )
+                            # Parse quantity
+                            if data.get("quantity"):
+                                data["quantity"] = parse_numeric_string(data["quantity"], "int")
                             else:
-                                print("order create row", row)
-                                # Create new order
-                                order = Order.objects.create(
-                                    customer=customer,
-                                    product=product,
-                                    quantity=cleaned_data["quantity"],
-                                    order_date=cleaned_data["order_date"],
-                                    status=cleaned_data["status"],
-                                    total_amount=cleaned_data["total_amount"],
-                                )
-
-                                error_log_content.append(f"  ✅ CREATED new order #{order.order_id} for {customer.email}\n")
-                                error_log_content.append(f"     Product: {product.name}, Quantity: {cleaned_data['quantity']}\n")
-                                error_log_content.append(f"     Total: {format_currency(cleaned_data['total_amount'])}\n\n")
-
-                                imported_orders.append(
-                                    {
-                                        "order_id": order.order_id,
-                                        "customer": customer.email,
-                                        "product": product.sku,
-                                        "quantity": cleaned_data["quantity"],
-                                        "total": cleaned_data["total_amount"],
-                                        "action": "created",
-                                    }
-                                )
-                                success_count += 1
-
-                            
-                            total_order_value += float(cleaned_data["total_amount"])
+                                data["quantity"] = 0
+                        except ValueError as e:
+                            row_errors.append(f"Invalid quantity format: {str(e)}")
+                            recorder.add(row_num, "invalid_number", f"Invalid quantity format: {str(e)}", field="quantity", raw_data=row)
 
+                        try:
+                            # Parse total amount
+                            if data.get("total_amount"):
+                                data["total_amount"] = parse_numeric_string(data["total_amount"], "float")
+                            else:
+                                data["total_amount"] = 0.0
                         except ValueError as e:
+                            row_errors.append(f"Invalid total amount format: {str(e)}")
+                            recorder.add(row_num, "invalid_number", f"Invalid total amount format: {str(e)}", field="total_amount", raw_data=row)
+
+                        # If we already have errors from parsing, skip form validation
+                        if row_errors:
                             error_count += 1
                             for error in row_errors:
-                                error_msg = f"Row {row_num}: {error}"
-                                error_details.append(error_msg)
-
-                            error_log_content.append(f"  ❌ VALIDATION ERROR: {str(e)}\n")
+                                error_details.append(f"Row {row_num}: {error}")
+                            error_log_content.append(f"  ❌ PRE-VALIDATION ERRORS:\n")
                             for error in row_errors:
                                 error_log_content.append(f"     • {error}\n")
-                            error_log_content.append(f"     Data: {cleaned_data}\n\n")
+                            error_log_content.append(f"     Raw data: {data}\n\n")
+                            continue
 
-                        except Exception as db_error:
-                            error_count += 1
-                            error_msg = (
-                                f"Row {row_num}: Database Error - {str(db_error)}"
-                            )
-                            error_details.append(error_msg)
-                            error_log_content.append(f"  ❌ DATABASE ERROR: {str(db_error)}\n")
-                            error_log_content.append(f"     Data: {cleaned_data}\n\n")
+                        # Log extracted data
+                        error_log_content.append(f"  Extracted data: {data}\n")
 
-                    else:
-                        # Collect all form errors
-                        error_count += 1
-                        for field, field_errors in form.errors.items():
-                            for error in field_errors:
+                        # Validate using form
+                        form = OrderCSVForm(data)
+                        is_valid = form.is_valid()
+                        profiler.switch("database")
+
+                        if is_valid:
+                            cleaned_data = form.cleaned_data
+                            try:
+                                # Get customer and product
+                                try:
+                                    if dry_run:
+                                        customer = dry_run_customers[cleaned_data["customer_email"]]
+                                    elif lookup is not None and cleaned_data["customer_email"] in lookup.customers:
+                                        customer = lookup.customers[cleaned_data["customer_email"]]
+                                    else:
+                                        customer = Customer.objects.get(email=cleaned_data["customer_email"])
+                                except (Customer.DoesNotExist, KeyError):
+                                    row_errors.append(f"Customer with email '{cleaned_data['customer_email']}' not found")
+                                    recorder.add(row_num, "customer_not_found", row_errors[-1], field="customer_email", raw_data=data)
+                                    raise ValueError(f"Customer not found")
+
+                                try:
+                                    if dry_run:
+                                        product = dry_run_products[cleaned_data["product_sku"]]
+                                    elif lookup is not None and cleaned_data["product_sku"] in lookup.products:
+                                        product = lookup.products[cleaned_data["product_sku"]]
+                                    else:
+                                        product = Product.objects.get(sku=cleaned_data["product_sku"])
+                                except (Product.DoesNotExist, KeyError):
+                                    row_errors.append(
+                                        f"Product with SKU '{cleaned_data['product_sku']}' not found"
+                                    )
+                                    recorder.add(row_num, "product_not_found", row_errors[-1], field="product_sku", raw_data=data)
+                                    raise ValueError(f"Product not found")
+
+                                # Check stock availability (dry run tracks it in memory, otherwise the ledger)
+                                available = product.stock_quantity if dry_run else product.available_stock()
+                                if cleaned_data["quantity"] > available:
+                                    row_log(row_num, "insufficient stock for %s (%s > %s)", product.sku, cleaned_data["quantity"], available)
+                                    row_errors.append(f"Insufficient stock for '{product.name}'. "
+                                        f"Requested: {cleaned_data['quantity']}, Available: {available}"
+                                    )
+                                    recorder.add(row_num, "insufficient_stock", row_errors[-1], field="quantity", raw_data=data)
+                                    raise ValueError(f"Insufficient stock")
+
+                                if dry_run:
+                                    order_key = (customer.pk, product.pk, cleaned_data["order_date"], cleaned_data["quantity"])
+                                    if order_key in existing_order_keys:
+                                        action = "updated"
+                                        error_log_content.append(f"  ✅ WOULD UPDATE existing order for {customer.email}\n")
+                                    else:
+                                        action = "created"
+                                        existing_order_keys.add(order_key)
+                                        product.stock_quantity -= cleaned_data["quantity"]  # in memory only
+                                        success_count += 1
+                                        error_log_content.append(f"  ✅ WOULD CREATE new order for {customer.email}\n")
+                                    error_log_content.append(f"     Product: {product.name}, Quantity: {cleaned_data['quantity']}\n")
+                                    error_log_content.append(f"     Total: {format_currency(cleaned_data['total_amount'])}\n\n")
+                                    order_counts[action] += 1
+                                    product_counts[product.sku] = product_counts.get(product.sku, 0) + cleaned_data["quantity"]
+                                    total_order_value += float(cleaned_data["total_amount"])
+                                    continue
+
+                                # Check if order already exists (by customer, product, date, quantity)
+                                existing_order = Order.objects.filter(
+                                                                    customer=customer,
+                                                                    product=product,
+                                                                    order_date=cleaned_data["order_date"],
+                                                                    quantity=cleaned_data["quantity"],
+                                                                ).first()
+
+                                if existing_order:
+                                    row_log(row_num, "updating order %s", existing_order.order_id)
+                                    # Update existing order
+                                    existing_order.status = cleaned_data["status"]
+                                    existing_order.total_amount = cleaned_data[
+                                        "total_amount"
+                                    ]
+                                    with transaction.atomic():  # savepoint, a failed row must not break the batch
+                                        existing_order.save()
+
+                                    error_log_content.append(f"  ✅ UPDATED existing order for {customer.email}\n")
+                                    error_log_content.append(f"     Product: {product.name}, Quantity: {cleaned_data['quantity']}\n")
+                                    error_log_content.append(f"     Total: {format_currency(cleaned_data['total_amount'])}\n\n")
+
+                                    order_counts["updated"] += 1
+                                    product_counts[product.sku] = product_counts.get(product.sku, 0) + cleaned_data["quantity"]
+                                else:
+                                    row_log(row_num, "creating order for %s, %s x %s", customer.email, cleaned_data["quantity"], product.sku)
+                                    # Create new order
+                                    with transaction.atomic():  # savepoint, a failed row must not break the batch
+                                        order = Order.objects.create(
+                                            customer=customer,
+                                            product=product,
+                                            quantity=cleaned_data["quantity"],
+                                            order_date=cleaned_data["order_date"],
+                                            status=cleaned_data["status"],
+                                            total_amount=cleaned_data["total_amount"],
+                                        )
+
+                                    error_log_content.append(f"  ✅ CREATED new order #{order.order_id} for {customer.email}\n")
+                                    error_log_content.append(f"     Product: {product.name}, Quantity: {cleaned_data['quantity']}\n")
+                                    error_log_content.append(f"     Total: {format_currency(cleaned_data['total_amount'])}\n\n")
+
+                                    order_counts["created"] += 1
+                                    product_counts[product.sku] = product_counts.get(product.sku, 0) + cleaned_data["quantity"]
+                                    success_count += 1
+
+                            
+                                total_order_value += float(cleaned_data["total_amount"])
+
+                            except ValueError as e:
+                                error_count += 1
+                                for error in row_errors:
+                                    error_msg = f"Row {row_num}: {error}"
+                                    error_details.append(error_msg)
+
+                                error_log_content.append(f"  ❌ VALIDATION ERROR: {str(e)}\n")
+                                for error in row_errors:
+                                    error_log_content.append(f"     • {error}\n")
+                                error_log_content.append(f"     Data: {cleaned_data}\n\n")
+
+                            except Exception as db_error:
+                                error_count += 1
                                 error_msg = (
-                                    f"Row {row_num}: {field.capitalize()} - {error}"
+                                    f"Row {row_num}: Database Error - {str(db_error)}"
                                 )
-                                row_errors.append(error_msg)
                                 error_details.append(error_msg)
+                                error_log_content.append(f"  ❌ DATABASE ERROR: {str(db_error)}\n")
+                                error_log_content.append(f"     Data: {cleaned_data}\n\n")
+                                recorder.add(row_num, "database", str(db_error), raw_data=data)
 
-                        # Write detailed errors to log file
-                        error_log_content.append(f"  ❌ FORM VALIDATION FAILED:\n")
-                        for field, field_errors in form.errors.items():
-                            for error in field_errors:
-                                error_log_content.append(f"     • {field}: {error}\n")
-                        error_log_content.append(f"     Raw data: {data}\n\n")
+                        else:
+                            # Collect all form errors
+                            error_count += 1
+                            for field, field_errors in form.errors.items():
+                                for error in field_errors:
+                                    error_msg = (
+                                        f"Row {row_num}: {field.capitalize()} - {error}"
+                                    )
+                                    row_errors.append(error_msg)
+                                    error_details.append(error_msg)
+
+                            # Write detailed errors to log file
+                            recorder.add_form_errors(row_num, form, raw_data=data)
+                            error_log_content.append(f"  ❌ FORM VALIDATION FAILED:\n")
+                            for field, field_errors in form.errors.items():
+                                for error in field_errors:
+                                    error_log_content.append(f"     • {field}: {error}\n")
+                            error_log_content.append(f"     Raw data: {data}\n\n")
+
+                    except Exception as e:
+                        error_count += 1
+                        error_msg = f"Row {row_num}: Processing Error - {str(e)}"
+                        error_details.append(error_msg)
+                        error_log_content.append(f"  ❌ PROCESSING ERROR: {str(e)}\n")
+                        error_log_content.append(f"     Raw row: {row}\n\n")
+                        recorder.add(row_num, "processing", str(e), raw_data=row)
+
+                recorder.flush()
+                save_import_checkpoint(import_run, lines.offset, row_num, success_count, error_count)
+            profiler.switch("error_log")
+            error_file.writelines(error_log_content)
+            error_log_content.clear()
+            meter.batch(len(batch), success_count, error_count)
+            profiler.switch("read")
 
-                except Exception as e:
-                    error_count += 1
-                    error_msg = f"Row {row_num}: Processing Error - {str(e)}"
-                    error_details.append(error_msg)
-                    error_log_content.append(f"  ❌ PROCESSING ERROR: {str(e)}\n")
-                    error_log_content.append(f"     Raw row: {row}\n\n")
+        profiler.switch("database")
+        recorder.flush()
 
         # Calculate statistics
         total_rows = row_num - 1 if "row_num" in locals() else 0
-        total_items = sum(order["quantity"] for order in imported_orders)
-        created_count = len([o for o in imported_orders if o["action"] == "created"])
-        updated_count = len([o for o in imported_orders if o["action"] == "updated"])
-
-        # Open error log file
-        with open(error_log_path, "w", encoding="utf-8") as error_file:
-            # Write import summary header
-            error_file.write(f"Order Import Error Log - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-            error_file.write("=" * 80 + "\n\n")
-            error_file.write(f"Encoding: {encoding}\n")
-            error_file.write(f"Delimiter: {repr(delimiter)}\n")
-            if delete_existing:
-                error_file.write(f"IMPORT MODE: REPLACE (Deleted {orders_deleted} existing orders)\n")
-            else:
-                error_file.write(f"IMPORT MODE: APPEND\n")
-            error_file.write(f"Header: {header}\n")
-            error_file.write(f"Column Mapping: {column_mapping}\n")
-            error_file.write("-" * 80 + "\n\n")
-
-            summary = f"Order Import Error Log - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
-            summary += "=" * 80 + "\n\n"
-            summary += f"IMPORT SUMMARY\n"
-            summary += f"{'-' * 40}\n"
-            summary += f"Encoding: {encoding}\n"
-            summary += f"Delimiter: {repr(delimiter)}\n"
+        total_items = sum(product_counts.values())
+        created_count = order_counts["created"]
+        updated_count = order_counts["updated"]
 
-            if delete_existing:
-                summary += f"Import Mode: REPLACE\n"
-                summary += f"Existing orders deleted: {orders_deleted}\n"
-            else:
-                summary += f"Import Mode: APPEND\n"
-
-            summary += f"\nPROCESSING RESULTS:\n"
-            summary += f"Total rows in CSV: {total_rows}\n"
-            summary += f"Successfully processed: {success_count}\n"
-            summary += f"Failed to process: {error_count}\n"
-            summary += (
-                f"Success rate: {(success_count / max(total_rows, 1) * 100):.1f}%\n\n"
-            )
-
-            summary += f"IMPORT DETAILS:\n"
-            summary += f"  • New orders created: {created_count}\n"
-            summary += f"  • Existing orders updated: {updated_count}\n"
-            summary += f"  • Total items ordered: {total_items}\n"
-            summary += f"  • Total order value: {format_currency(total_order_value)}\n"
-            summary += f"  • Average order value: {format_currency(total_order_value / max(success_count, 1))}\n"
-
-            if imported_orders:
-                # Find top products
-                product_counts = {}
-                for order in imported_orders:
-                    product_counts[order["product"]] = (
-                        product_counts.get(order["product"], 0) + order["quantity"]
-                    )
-
-                if product_counts:
-                    top_product = max(product_counts.items(), key=lambda x: x[1])
-                    summary += f"  • Most ordered product: {top_product[0]} ({top_product[1]} units)\n"
-
-            summary += "\n" + "-" * 80 + "\n\n"
-            
-            error_file.writelines(error_details)
-            error_file.writelines(error_log_content)
+        summary = "=" * 80 + "\n"
+        summary += f"IMPORT SUMMARY - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
+        summary += f"{'-' * 40}\n"
+        summary += f"Encoding: {encoding}\n"
+        summary += f"Delimiter: {repr(delimiter)}\n"
 
-            # error_file.write(summary + content[len(summary) :])
+        if delete_existing:
+            summary += f"Import Mode: REPLACE\n"
+            summary += f"Existing orders deleted: {orders_deleted}\n"
+        else:
+            summary += f"Import Mode: APPEND\n"
+
+        summary += f"\nPROCESSING RESULTS:\n"
+        summary += f"Total rows in CSV: {total_rows}\n"
+        summary += f"Successfully processed: {success_count}\n"
+        summary += f"Failed to process: {error_count}\n"
+        summary += (
+            f"Success rate: {(success_count / max(total_rows, 1) * 100):.1f}%\n\n"
+        )
+
+        summary += f"IMPORT DETAILS:\n"
+        summary += f"  • New orders created: {created_count}\n"
+        summary += f"  • Existing orders updated: {updated_count}\n"
+        summary += f"  • Total items ordered: {total_items}\n"
+        summary += f"  • Total order value: {format_currency(total_order_value)}\n"
+        summary += f"  • Average order value: {format_currency(total_order_value / max(success_count, 1))}\n"
+
+        if product_counts:
+            # Find top products
+            top_product = max(product_counts.items(), key=lambda x: x[1])
+            summary += f"  • Most ordered product: {top_product[0]} ({top_product[1]} units)\n"
+
+        # the rows are already in the log, the summary and profile go after them
+        profiler.switch("error_log")
+        error_file.write(summary)
+        profiler.finish()
+        error_file.write("=" * 80 + "\n")
+        error_file.write("IMPORT PROFILE\n")
+        error_file.writelines(profiler.lines())
 
         return success_count, error_count, error_details[:20]
 
     except Exception as e:
-        logger.error(f"Error in import_orders_with_validation: {str(e)}", exc_info=True)
-        with open(error_log_path, "w", encoding="utf-8") as f:
-            f.write(f"Fatal Error during order import: {str(e)}\n")
-            if delete_existing and orders_deleted > 0:
-                f.write(
-                    f"\nWARNING: {orders_deleted} existing orders were deleted but import failed!\n"
-                )
+        logger.error("Error in import_orders_with_validation: %s", e, exc_info=True)
+        # keep the rows logged so far, or create a minimal error log
+        if error_file is None:
+            error_file = open_error_log(error_log_path)
+        error_file.write(f"Fatal Error during order import: {str(e)}\n")
+        if delete_existing and orders_deleted > 0:
+            error_file.write(
+                f"\nWARNING: {orders_deleted} existing orders were deleted but import failed!\n"
+            )
         return 0, 0, [f"Fatal error: {str(e)}"]
+    finally:
+        # also closes the profile (and its tracemalloc use) on the early returns
+        profiler.finish()
+        meter.finish()
+        if error_file is not None:
+            error_file.close()
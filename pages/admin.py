@@ -1,3 +1,35 @@
 from django.contrib import admin
+from .models import ChunkedUpload, ImportRowError, ImportRun
 
 # Register your models here.
+
+
+class ImportRunAdmin(admin.ModelAdmin):
+    list_display = ("id", "model_type", "file_name", "status", "success_count", "error_count", "started_at", "finished_at")
+    list_display_links = ("id", "file_name")
+    list_filter = ("model_type", "status")
+    search_fields = ("file_name",)
+    list_per_page = 25
+
+
+class ImportRowErrorAdmin(admin.ModelAdmin):
+    list_display = ("id", "run", "model_type", "row_number", "field", "code", "message", "created_at")
+    list_filter = ("model_type", "code", "field")
+    search_fields = ("message",)
+    raw_id_fields = ("run",)
+    list_per_page = 25
+    # counting millions of rows for the paginator is the slow part of a changelist
+    show_full_result_count = False
+
+
+class ChunkedUploadAdmin(admin.ModelAdmin):
+    list_display = ("upload_id", "model_type", "file_name", "file_size", "status", "import_run", "created_at")
+    list_filter = ("model_type", "status")
+    search_fields = ("file_name", "file_sha256")
+    raw_id_fields = ("import_run",)
+    list_per_page = 25
+
+
+admin.site.register(ImportRun, ImportRunAdmin)
+admin.site.register(ImportRowError, ImportRowErrorAdmin)
+admin.site.register(ChunkedUpload, ChunkedUploadAdmin)
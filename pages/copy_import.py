@@ -0,0 +1,642 @@
+# PostgreSQL bulk import engine (manage.py import_data --engine copy)
+# ******************************************************************************************************************************************
+"""
+The CSV rows are streamed with COPY FROM STDIN into an unlogged staging table, checked with
+set-based SQL (formats, email / SKU joins, stock) and merged into customers_customer,
+products_product and orders_order in a few statements, all in one transaction.
+
+Valid files give the same result as the row by row importers, with these differences:
+- the first failing check of a row is reported, not every one of them
+- a key (email, SKU, order) repeated in the file is merged once, with its last row
+- the stock check runs over the new orders in file order and does not give back the stock
+  of a rejected order to the rows after it
+- merged customers and products get an empty row_hash, the next row by row import of
+  the same data recomputes it
+- there are no checkpoints, an interrupted import rolls back completely
+"""
+
+import csv
+import itertools
+import logging
+import uuid
+from datetime import datetime
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from customers.forms import CustomerCSVForm
+from customers.models import Customer, CustomerStats
+from orders.forms import OrderCSVForm
+from orders.models import Order
+from products.forms import ProductCSVForm
+from products.models import Product
+
+from .helper import ImportProfiler, RowProjection, open_error_log
+from .metrics import ImportMeter
+from .models import ImportRowError
+
+logger = logging.getLogger(__name__)
+
+# rows reported back to the caller, the error log and ImportRowError have all of them
+MAX_RETURNED_ERRORS = 100
+
+FIELDS = {
+    "customer": ["name", "email", "phone", "address"],
+    "product": ["name", "sku", "description", "price", "stock_quantity", "weight"],
+    "order": ["customer_email", "product_sku", "quantity", "order_date", "status", "total_amount"],
+}
+FORMS = {"customer": CustomerCSVForm, "product": ProductCSVForm, "order": OrderCSVForm}
+# normalised in Python while streaming, as the forms' clean_* methods do
+LOWERCASE_FIELDS = {"email", "customer_email", "status"}
+
+
+def copy_import_available():
+    return connection.vendor == "postgresql"
+
+
+def _number(column):
+    # what parse_numeric_string strips before converting
+    return f"regexp_replace({column}, '[$€£, ]', '', 'g')"
+
+
+def _is_number(column):
+    return f"{_number(column)} ~ '^([0-9]+\\.?[0-9]*|\\.[0-9]+)$'"
+
+
+def _whole_digits(column):
+    return f"length(ltrim(split_part({_number(column)}, '.', 1), '0'))"
+
+
+def _decimal_places(column):
+    return f"length(rtrim(split_part({_number(column)}, '.', 2), '0'))"
+
+
+def _decimal_rules(field, label, max_whole, places, minimum, maximum_message, required=True):
+    """Format and range checks for a decimal column, like parse_numeric_string + the form's DecimalField"""
+    rules = []
+    if required:
+        rules.append((field, "validation", f"{field} = ''", "'This field is required.'"))
+    present = f"{field} <> ''"
+    rules += [
+        (
+            field,
+            "validation",
+            f"{present} AND {_number(field)} ~ '^-'",
+            f"'Ensure this value is greater than or equal to {minimum}.'",
+        ),
+        (
+            field,
+            "invalid_number",
+            f"{present} AND NOT {_is_number(field)}",
+            f"'Invalid {label} format: ' || {field}",
+        ),
+        (field, "validation", f"{present} AND {_whole_digits(field)} > {max_whole}", f"'{maximum_message}'"),
+        (
+            field,
+            "validation",
+            f"{present} AND {_decimal_places(field)} > {places}",
+            f"'Ensure that there are no more than {places} decimal places.'",
+        ),
+    ]
+    if minimum:
+        rules.append(
+            (
+                field,
+                "validation",
+                f"CASE WHEN {present} THEN {_number(field)}::numeric < {minimum} ELSE false END",
+                f"'Ensure this value is greater than or equal to {minimum}.'",
+            )
+        )
+    return rules
+
+
+def _length_rules(field, minimum=None, maximum=None, required=True):
+    rules = []
+    if required:
+        rules.append((field, "validation", f"{field} = ''", "'This field is required.'"))
+    if minimum:
+        rules.append(
+            (
+                field,
+                "validation",
+                f"{field} <> '' AND length({field}) < {minimum}",
+                f"'Ensure this value has at least {minimum} characters (it has ' || length({field}) || ').'",
+            )
+        )
+    if maximum:
+        rules.append(
+            (
+                field,
+                "validation",
+                f"length({field}) > {maximum}",
+                f"'Ensure this value has at most {maximum} characters (it has ' || length({field}) || ').'",
+            )
+        )
+    return rules
+
+
+# (field, code, condition, message SQL) checked in order, the first one a row fails is its error
+EMPTY_ROW_RULE = ("", "empty_row", "raw = ''", "'Empty row'")
+PHONE_DIGITS = r"regexp_replace(phone, '[\s\-\+\(\)]', '', 'g')"
+RULES = {
+    "customer": [
+        EMPTY_ROW_RULE,
+        *_length_rules("name", minimum=2, maximum=100),
+        ("email", "validation", "email = ''", "'This field is required.'"),
+        (
+            "email",
+            "validation",
+            "email !~ '^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\\.[a-zA-Z]{2,}$'",
+            "'Invalid email format. Example: user@example.com'",
+        ),
+        *_length_rules("phone", maximum=15, required=False),
+        (
+            "phone",
+            "validation",
+            f"phone <> '' AND {PHONE_DIGITS} !~ '^[0-9]+$'",
+            "'Phone number can only contain digits and these separators: space, -, +, (, )'",
+        ),
+        (
+            "phone",
+            "validation",
+            f"phone <> '' AND length({PHONE_DIGITS}) NOT BETWEEN 7 AND 15",
+            "'Phone number must be 7-15 digits'",
+        ),
+    ],
+    "product": [
+        EMPTY_ROW_RULE,
+        *_length_rules("name", minimum=2, maximum=200),
+        *_length_rules("sku", maximum=50),
+        (
+            "sku",
+            "invalid_sku",
+            "sku <> '' AND sku !~ '^[a-zA-Z0-9_-]+$'",
+            "'SKU can only contain letters, numbers, hyphens (-), and underscores (_)'",
+        ),
+        *_length_rules("description", maximum=1000, required=False),
+        *_decimal_rules("price", "price", 8, 2, 0, "Price cannot exceed 99,999,999.99"),
+        # an empty stock is 0 and its decimals are dropped, like parse_numeric_string(..., "int")
+        *_decimal_rules("stock_quantity", "stock quantity", 10, 1000, 0, "Stock quantity is too large", required=False),
+        (
+            "stock_quantity",
+            "validation",
+            f"CASE WHEN stock_quantity <> '' THEN split_part({_number('stock_quantity')}, '.', 1)::numeric > 2147483647 "
+            "ELSE false END",
+            "'Stock quantity is too large'",
+        ),
+        *_decimal_rules("weight", "weight", 5, 3, 0, "Weight cannot exceed 99,999.999 kg", required=False),
+    ],
+    "order": [
+        EMPTY_ROW_RULE,
+        ("customer_email", "validation", "customer_email = ''", "'This field is required.'"),
+        (
+            "customer_email",
+            "validation",
+            "customer_email !~ '^[^@\\s]+@[^@\\s]+\\.[^@\\s]+$'",
+            "'Enter a valid email address.'",
+        ),
+        *_length_rules("product_sku", maximum=50),
+        # quantity decimals are dropped, like parse_numeric_string(..., "int")
+        ("quantity", "invalid_number", f"quantity <> '' AND NOT {_is_number('quantity')}", "'Invalid quantity format: ' || quantity"),
+        (
+            "quantity",
+            "validation",
+            f"quantity = '' OR split_part({_number('quantity')}, '.', 1) !~ '[1-9]'",
+            "'Ensure this value is greater than or equal to 1.'",
+        ),
+        (
+            "quantity",
+            "validation",
+            f"{_whole_digits('quantity')} > 5 OR split_part({_number('quantity')}, '.', 1)::numeric > 10000",
+            "'Quantity cannot exceed 10,000'",
+        ),
+        ("order_date", "validation", "order_date = ''", "'Order date is required'"),
+        (
+            "order_date",
+            "validation",
+            "pg_temp.import_parse_timestamp(order_date) IS NULL",
+            "'Invalid date format. Use formats like: YYYY-MM-DD HH:MM:SS, YYYY-MM-DD, DD/MM/YYYY'",
+        ),
+        (
+            "order_date",
+            "validation",
+            "pg_temp.import_parse_timestamp(order_date) > localtimestamp",
+            "'Order date cannot be in the future'",
+        ),
+        ("status", "validation", "status = ''", "'Order status is required'"),
+        (
+            "status",
+            "validation",
+            "status NOT IN ({statuses})".format(statuses=", ".join(f"'{s}'" for s, _ in Order.ORDER_STATUS_CHOICES)),
+            "'Invalid status ''' || status || '''. Must be one of: {statuses}'".format(
+                statuses=", ".join(s for s, _ in Order.ORDER_STATUS_CHOICES)
+            ),
+        ),
+        *_decimal_rules("total_amount", "total amount", 10, 2, "0.01", "Total amount cannot exceed 9,999,999,999.99"),
+        (
+            "total_amount",
+            "validation",
+            f"{_number('total_amount')}::numeric / split_part({_number('quantity')}, '.', 1)::numeric < 0.01",
+            "'Total amount seems too low for ' || quantity || ' items'",
+        ),
+        (
+            "customer_email",
+            "customer_not_found",
+            "NOT EXISTS (SELECT 1 FROM customers_customer c WHERE c.email = customer_email)",
+            "'Customer with email ''' || customer_email || ''' not found'",
+        ),
+        (
+            "product_sku",
+            "product_not_found",
+            "NOT EXISTS (SELECT 1 FROM products_product p WHERE p.sku = product_sku)",
+            "'Product with SKU ''' || product_sku || ''' not found'",
+        ),
+    ],
+}
+
+# the order form's date formats, tried in the same order (a pattern guards each to_timestamp call)
+PARSE_TIMESTAMP_FUNCTION = r"""
+CREATE OR REPLACE FUNCTION pg_temp.import_parse_timestamp(value text) RETURNS timestamp AS $$
+DECLARE
+    patterns text[] := ARRAY[
+        '^\d{4}-\d{1,2}-\d{1,2} \d{1,2}:\d{1,2}:\d{1,2}$', '^\d{4}-\d{1,2}-\d{1,2} \d{1,2}:\d{1,2}$',
+        '^\d{4}-\d{1,2}-\d{1,2}$', '^\d{1,2}/\d{1,2}/\d{4} \d{1,2}:\d{1,2}:\d{1,2}$', '^\d{1,2}/\d{1,2}/\d{4}$',
+        '^\d{1,2}/\d{1,2}/\d{4} \d{1,2}:\d{1,2}:\d{1,2}$', '^\d{1,2}/\d{1,2}/\d{4}$', '^\d{8}$'
+    ];
+    formats text[] := ARRAY[
+        'YYYY-MM-DD HH24:MI:SS', 'YYYY-MM-DD HH24:MI', 'YYYY-MM-DD', 'DD/MM/YYYY HH24:MI:SS', 'DD/MM/YYYY',
+        'MM/DD/YYYY HH24:MI:SS', 'MM/DD/YYYY', 'YYYYMMDD'
+    ];
+BEGIN
+    FOR i IN 1 .. array_length(formats, 1) LOOP
+        IF value ~ patterns[i] THEN
+            BEGIN
+                RETURN to_timestamp(value, formats[i])::timestamp;
+            EXCEPTION WHEN others THEN
+                -- e.g. 31/02/2024, try the next format
+            END;
+        END IF;
+    END LOOP;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql STABLE
+"""
+
+
+def _count(cursor, sql, params=None):
+    cursor.execute(sql, params)
+    return cursor.fetchone()[0]
+
+
+def _delete_existing(cursor, model_type):
+    """The replace import's delete, as the row by row importers do it"""
+    if model_type == "customer":
+        return Customer.objects.all().delete()[0]
+    if model_type == "product":
+        deleted = Product.objects.all().delete()[0]
+        CustomerStats.objects.all().delete()
+        return deleted
+    # the deleted orders give their stock back, one ledger movement per product
+    cursor.execute(
+        "INSERT INTO products_inventorymovement (product_id, delta, reason, created_at) "
+        "SELECT product_id, sum(quantity), 'order_deleted', now() FROM orders_order GROUP BY product_id"
+    )
+    cursor.execute("DELETE FROM orders_order")
+    deleted = cursor.rowcount
+    CustomerStats.objects.all().delete()
+    return deleted
+
+
+def _merge_customers(cursor, stage):
+    """Returns (created, unchanged)"""
+    valid = _count(cursor, f"SELECT count(DISTINCT email) FROM {stage} WHERE error_code IS NULL")
+    cursor.execute(
+        f"""
+        WITH merged AS (
+            INSERT INTO customers_customer (name, email, phone, address, created_at, updated_at, row_hash)
+            SELECT DISTINCT ON (email) name, email, NULLIF(phone, ''), NULLIF(address, ''), now(), now(), ''
+            FROM {stage} WHERE error_code IS NULL ORDER BY email, row_num DESC
+            ON CONFLICT (email) DO UPDATE SET
+                name = EXCLUDED.name, phone = EXCLUDED.phone, address = EXCLUDED.address,
+                updated_at = EXCLUDED.updated_at, row_hash = ''
+            WHERE (customers_customer.name, customers_customer.phone, customers_customer.address)
+                IS DISTINCT FROM (EXCLUDED.name, EXCLUDED.phone, EXCLUDED.address)
+            RETURNING (xmax = 0) AS created
+        )
+        SELECT count(*) FILTER (WHERE created), count(*) FROM merged
+        """
+    )
+    created, written = cursor.fetchone()
+    return created, valid - written
+
+
+def _merge_products(cursor, stage):
+    """Returns (created, unchanged); an imported stock is a new snapshot after the product's latest movement"""
+    valid = _count(cursor, f"SELECT count(DISTINCT sku) FROM {stage} WHERE error_code IS NULL")
+    cursor.execute(
+        f"""
+        WITH merged AS (
+            INSERT INTO products_product (
+                name, sku, description, price, stock_quantity, weight, created_at, updated_at, row_hash,
+                stock_movement_id
+            )
+            SELECT DISTINCT ON (sku)
+                name, sku, description, {_number('price')}::numeric(10, 2),
+                COALESCE(NULLIF(split_part({_number('stock_quantity')}, '.', 1), '')::integer, 0),
+                NULLIF({_number('weight')}, '')::numeric(8, 3), now(), now(), '', 0
+            FROM {stage} WHERE error_code IS NULL ORDER BY sku, row_num DESC
+            ON CONFLICT (sku) DO UPDATE SET
+                name = EXCLUDED.name, description = EXCLUDED.description, price = EXCLUDED.price,
+                stock_quantity = EXCLUDED.stock_quantity, weight = EXCLUDED.weight,
+                updated_at = EXCLUDED.updated_at, row_hash = '',
+                stock_movement_id = COALESCE(
+                    (SELECT max(m.id) FROM products_inventorymovement m
+                     WHERE m.product_id = products_product.product_id), 0
+                )
+            WHERE (products_product.name, products_product.description, products_product.price, products_product.weight)
+                IS DISTINCT FROM (EXCLUDED.name, EXCLUDED.description, EXCLUDED.price, EXCLUDED.weight)
+            -- compared with the current stock, as Product.available_stock() computes it
+            OR EXCLUDED.stock_quantity <> products_product.stock_quantity + COALESCE(
+                (SELECT sum(m.delta) FROM products_inventorymovement m
+                 WHERE m.product_id = products_product.product_id AND m.id > products_product.stock_movement_id), 0
+            )
+            RETURNING (xmax = 0) AS created
+        )
+        SELECT count(*) FILTER (WHERE created), count(*) FROM merged
+        """
+    )
+    created, written = cursor.fetchone()
+    return created, valid - written
+
+
+def _resolve_orders(cursor, stage, tz_name, replaced=False):
+    """
+    Typed, de-duplicated valid orders in {stage}_valid, matched against the existing orders;
+    new orders that the stock cannot cover are marked on the staging table and dropped.
+    replaced: a dry run of a replace import, the existing orders are about to be deleted
+    (nothing to match, their stock is given back)
+    """
+    cursor.execute(
+        f"""
+        CREATE UNLOGGED TABLE {stage}_valid AS
+        SELECT DISTINCT ON (c.customer_id, p.product_id, t.order_date, t.quantity)
+            t.row_num, c.customer_id, p.product_id, t.quantity, t.order_date, t.status, t.total_amount,
+            NULL::integer AS order_id
+        FROM (
+            SELECT s.row_num, s.customer_email, s.product_sku, s.status,
+                split_part({_number('s.quantity')}, '.', 1)::integer AS quantity,
+                pg_temp.import_parse_timestamp(s.order_date) AT TIME ZONE %s AS order_date,
+                {_number('s.total_amount')}::numeric(12, 2) AS total_amount
+            FROM {stage} s WHERE s.error_code IS NULL
+        ) t
+        JOIN customers_customer c ON c.email = t.customer_email
+        JOIN products_product p ON p.sku = t.product_sku
+        ORDER BY c.customer_id, p.product_id, t.order_date, t.quantity, t.row_num DESC
+        """,
+        [tz_name],
+    )
+    if not replaced:
+        cursor.execute(
+            f"""
+            UPDATE {stage}_valid v SET order_id = o.order_id FROM orders_order o
+            WHERE o.customer_id = v.customer_id AND o.product_id = v.product_id
+                AND o.order_date = v.order_date AND o.quantity = v.quantity
+            """
+        )
+    restored = "(SELECT sum(o.quantity) FROM orders_order o WHERE o.product_id = p.product_id)" if replaced else "0"
+    cursor.execute(
+        f"""
+        WITH stock AS (
+            SELECT p.product_id, p.name, p.stock_quantity + COALESCE(
+                (SELECT sum(m.delta) FROM products_inventorymovement m
+                 WHERE m.product_id = p.product_id AND m.id > p.stock_movement_id), 0
+            ) + COALESCE({restored}, 0) AS available
+            FROM products_product p
+            WHERE p.product_id IN (SELECT product_id FROM {stage}_valid WHERE order_id IS NULL)
+        ),
+        running AS (
+            SELECT v.row_num, v.quantity, s.name, s.available,
+                sum(v.quantity) OVER (PARTITION BY v.product_id ORDER BY v.row_num) AS needed
+            FROM {stage}_valid v JOIN stock s ON s.product_id = v.product_id
+            WHERE v.order_id IS NULL
+        )
+        UPDATE {stage} st SET
+            error_field = 'quantity', error_code = 'insufficient_stock',
+            error_message = 'Insufficient stock for ''' || r.name || '''. Requested: ' || r.quantity
+                || ', Available: ' || GREATEST(r.available - r.needed + r.quantity, 0)
+        FROM running r WHERE st.row_num = r.row_num AND r.needed > r.available
+        """
+    )
+    cursor.execute(
+        f"DELETE FROM {stage}_valid v USING {stage} st WHERE st.row_num = v.row_num AND st.error_code IS NOT NULL"
+    )
+
+
+def _merge_orders(cursor, stage):
+    """Returns (created, updated); new orders append their ledger movement, customer counters are recounted"""
+    cursor.execute(
+        f"""
+        UPDATE orders_order o SET status = v.status, total_amount = v.total_amount, updated_at = now()
+        FROM {stage}_valid v WHERE o.order_id = v.order_id
+        """
+    )
+    updated = cursor.rowcount
+    cursor.execute(
+        f"""
+        WITH created AS (
+            INSERT INTO orders_order (
+                customer_id, product_id, quantity, order_date, status, total_amount, created_at, updated_at
+            )
+            SELECT customer_id, product_id, quantity, order_date, status, total_amount, now(), now()
+            FROM {stage}_valid WHERE order_id IS NULL ORDER BY row_num
+            RETURNING order_id, product_id, quantity
+        )
+        INSERT INTO products_inventorymovement (product_id, delta, reason, order_id, created_at)
+        SELECT product_id, -quantity, 'order_created', order_id, now() FROM created
+        """
+    )
+    created = cursor.rowcount
+    # one grouped query for the customers the file touched (see CustomerStats.rebuild)
+    cursor.execute(
+        f"""
+        INSERT INTO customers_customerstats (customer_id, order_count, lifetime_spend, last_order_date)
+        SELECT customer_id, count(*), sum(total_amount), max(order_date) FROM orders_order
+        WHERE customer_id IN (SELECT DISTINCT customer_id FROM {stage}_valid)
+        GROUP BY customer_id
+        ON CONFLICT (customer_id) DO UPDATE SET
+            order_count = EXCLUDED.order_count, lifetime_spend = EXCLUDED.lifetime_spend,
+            last_order_date = EXCLUDED.last_order_date
+        """
+    )
+    return created, updated
+
+
+def copy_import(model_type, decoded_data, error_log_path, encoding="utf-8", delete_existing=False, import_run=None,
+                dry_run=False):
+    """
+    Import a customers, products or orders CSV through a COPY staging table (PostgreSQL only)
+    decoded_data is a text stream (or the decoded text) of the file
+    Returns (success_count, error_count, errors) like the row by row importers; dry_run
+    runs the whole merge (and the replace delete) and rolls it back
+    """
+    fields = FIELDS[model_type]
+    lines = iter(decoded_data.splitlines(keepends=True) if isinstance(decoded_data, str) else decoded_data)
+    head = list(itertools.islice(lines, 20))
+    try:
+        delimiter = csv.Sniffer().sniff("".join(head)).delimiter
+    except csv.Error:
+        delimiter = ","
+    reader = csv.reader(itertools.chain(head, lines), delimiter=delimiter)
+    header = next(reader, None)
+    if header is None:
+        return 0, 0, ["CSV file is empty or has no header"]
+    project_row = RowProjection(header, fields)
+    missing = project_row.missing_required(FORMS[model_type])
+    if missing:
+        return 0, 0, [f"Missing required column(s): {', '.join(missing)}"]
+
+    stage = f"import_stage_{uuid.uuid4().hex}"
+    tz_name = timezone.get_current_timezone_name()
+    deleted = created = unchanged = updated = 0
+    # "read" is decoding, CSV parsing and the COPY stream
+    profiler = ImportProfiler(f"{model_type.capitalize()} COPY import", phase="read")
+    meter = ImportMeter(model_type, dry_run)
+    try:
+        # the staging tables are created in the transaction, a failed import rolls them back too
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE UNLOGGED TABLE {stage} (row_num integer PRIMARY KEY, raw text, "
+                + ", ".join(f"{field} text" for field in fields)
+                + ", error_field text, error_code text, error_message text)"
+            )
+            with cursor.copy(f"COPY {stage} (row_num, raw, {', '.join(fields)}) FROM STDIN") as copy:
+                for row_num, row in enumerate(reader, start=2):
+                    data = project_row(row)
+                    for field in LOWERCASE_FIELDS.intersection(data):
+                        data[field] = data[field].lower()
+                    raw = delimiter.join(row) if any(cell.strip() for cell in row) else ""
+                    copy.write_row((row_num, raw, *(data[field] for field in fields)))
+            total_rows = _count(cursor, f"SELECT count(*) FROM {stage}")
+
+            if model_type == "order":
+                cursor.execute(PARSE_TIMESTAMP_FUNCTION)
+                # the timestamps are parsed and compared in the app's time zone
+                cursor.execute("SET LOCAL TIME ZONE %s", [tz_name])
+
+            # a dry run validates against the current data, like the row by row importers
+            profiler.switch("database")
+            if delete_existing and not dry_run:
+                deleted = _delete_existing(cursor, model_type)
+            profiler.switch("validate")
+            for field, code, condition, message in RULES[model_type]:
+                # CASE keeps PostgreSQL from evaluating a rule's casts on rows an earlier rule rejected
+                cursor.execute(
+                    f"UPDATE {stage} SET error_field = '{field}', error_code = '{code}', error_message = {message} "
+                    f"WHERE CASE WHEN error_code IS NULL THEN ({condition}) ELSE false END"
+                )
+            if model_type == "order":
+                _resolve_orders(cursor, stage, tz_name, replaced=delete_existing and dry_run)
+            error_count = _count(cursor, f"SELECT count(*) FROM {stage} WHERE error_code IS NOT NULL")
+
+            # the error marks above stay, only the writes are rolled back on a dry run
+            profiler.switch("database")
+            with transaction.atomic():
+                if delete_existing and dry_run:
+                    # the merge counts are those of the replace import
+                    deleted = _delete_existing(cursor, model_type)
+                if model_type == "customer":
+                    created, unchanged = _merge_customers(cursor, stage)
+                elif model_type == "product":
+                    created, unchanged = _merge_products(cursor, stage)
+                else:
+                    created, updated = _merge_orders(cursor, stage)
+                if dry_run:
+                    transaction.set_rollback(True)
+            meter.batch(total_rows, created, error_count, unchanged)
+
+            if import_run is not None:
+                cursor.execute(
+                    f"""
+                    INSERT INTO {ImportRowError._meta.db_table}
+                        (run_id, model_type, row_number, field, code, message, raw_data, created_at)
+                    SELECT %s, %s, row_num, error_field, error_code, error_message, raw, now()
+                    FROM {stage} WHERE error_code IS NOT NULL
+                    """,
+                    [import_run.pk, model_type],
+                )
+                import_run.unchanged_count = unchanged
+
+            profiler.switch("error_log")
+            errors = _write_error_log(
+                stage, error_log_path, model_type, header, project_row, delimiter, encoding, delete_existing,
+                dry_run, deleted, total_rows, created, updated, unchanged, error_count, profiler,
+            )
+            cursor.execute(f"DROP TABLE {stage}")
+            if model_type == "order":
+                cursor.execute(f"DROP TABLE {stage}_valid")
+    except Exception as e:
+        # like the row by row importers: a minimal error log and (0, 0, [message]), the run is marked failed
+        logger.error("Error in copy_import: %s", e, exc_info=True)
+        with open_error_log(error_log_path) as f:
+            f.write(f"Fatal Error during COPY import: {str(e)}\n")
+        return 0, 0, [f"Fatal error during COPY import: {str(e)}"]
+    finally:
+        profiler.finish()
+        meter.finish()
+
+    logger.info(
+        "COPY import of %s: %s rows, %s created, %s updated, %s unchanged, %s failed%s",
+        model_type, total_rows, created, updated, unchanged, error_count, " (dry run)" if dry_run else "",
+    )
+    return created, error_count, errors
+
+
+def _write_error_log(stage, error_log_path, model_type, header, project_row, delimiter, encoding, delete_existing,
+                     dry_run, deleted, total_rows, created, updated, unchanged, error_count, profiler):
+    """Write the run's error log from the staging table, returns the first MAX_RETURNED_ERRORS messages"""
+    errors = []
+    with open_error_log(error_log_path) as error_file:
+        error_file.write(
+            f"{model_type.capitalize()} Import Error Log (COPY engine) - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
+        )
+        error_file.write("=" * 80 + "\n\n")
+        if dry_run:
+            error_file.write("DRY RUN - validation only, no data was written\n")
+        error_file.write(f"Encoding: {encoding}\n")
+        error_file.write(f"Delimiter: {repr(delimiter)}\n")
+        if delete_existing:
+            error_file.write(f"IMPORT MODE: REPLACE (Deleted {deleted} existing {model_type} records)\n")
+        else:
+            error_file.write("IMPORT MODE: APPEND\n")
+        error_file.write(f"Header: {header}\n")
+        error_file.write(f"Column Mapping: {project_row.mapping}\n")
+        for warning in project_row.warnings():
+            error_file.write(f"Header warning: {warning}\n")
+        error_file.write("-" * 80 + "\n\n")
+
+        # server-side cursor, the invalid rows are streamed rather than loaded at once
+        with connection.chunked_cursor() as rows:
+            rows.execute(
+                f"SELECT row_num, error_field, error_message, raw FROM {stage} "
+                f"WHERE error_code IS NOT NULL ORDER BY row_num"
+            )
+            for row_num, field, message, raw in rows:
+                label = f"{field.capitalize()} - " if field else ""
+                error_file.write(f"Row {row_num}: ❌ {label}{message}\n     Raw data: {raw}\n\n")
+                if len(errors) < MAX_RETURNED_ERRORS:
+                    errors.append(f"Row {row_num}: {label}{message}")
+
+        error_file.write("=" * 80 + "\n")
+        error_file.write("IMPORT SUMMARY\n")
+        error_file.write(f"Total rows in CSV: {total_rows}\n")
+        error_file.write(f"Created: {created}\n")
+        if model_type == "order":
+            error_file.write(f"Existing orders updated: {updated}\n")
+        else:
+            error_file.write(f"Unchanged (skipped): {unchanged}\n")
+        error_file.write(f"Failed: {error_count}\n")
+        profiler.finish()
+        error_file.write("=" * 80 + "\n")
+        error_file.write("IMPORT PROFILE\n")
+        error_file.writelines(profiler.lines())
+    return errors
@@ -35,6 +35,19 @@ class CSVImportForm(forms.Form):
         widget=forms.RadioSelect(attrs={"class": "form-check-input pl-5"}),
         help_text="Choose whether to append or replace existing data",
     )
+
+    force = forms.BooleanField(
+        label="Re-run even if this file was already imported",
+        required=False,
+        widget=forms.CheckboxInput(attrs={"class": "form-check-input"}),
+    )
+
+    dry_run = forms.BooleanField(
+        label="Validate only (dry run)",
+        required=False,
+        widget=forms.CheckboxInput(attrs={"class": "form-check-input"}),
+        help_text="Run every check and produce the error log without writing any data",
+    )
     
     
     def clean_csv_file(self):
@@ -55,4 +68,27 @@ class CSVImportForm(forms.Form):
         if csv_file.size == 0:
             raise ValidationError("File is empty")
 
-        return csv_file
\ No newline at end of file
+        return csv_file
+
+
+class BundleImportForm(forms.Form):
+    bundle_file = forms.FileField(
+        label="Upload a bundle (.zip of customers, products and orders CSVs)",
+        widget=forms.FileInput(attrs={"class": "form-control", "accept": ".zip"}),
+    )
+
+    delete_option = forms.ChoiceField(
+        choices=CSVImportForm.DELETE_OPTIONS,
+        initial="append",
+        required=False,
+    )
+
+    dry_run = forms.BooleanField(required=False)
+
+    def clean_bundle_file(self):
+        bundle_file = self.cleaned_data["bundle_file"]
+        if not bundle_file.name.lower().endswith(".zip"):
+            raise ValidationError("Bundle must be a zip file (.zip)")
+        if bundle_file.size == 0:
+            raise ValidationError("File is empty")
+        return bundle_file
@@ -1,5 +1,36 @@
 # additional helper
 # ******************************************************************************************************************************************
+import asyncio
+import codecs
+import contextlib
+import functools
+import gzip
+import hashlib
+import io
+import itertools
+import logging
+import operator
+import os
+import shutil
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Q
+
+try:
+    import numpy as np
+except ImportError:  # optional, only parse_numeric_columns needs it
+    np = None
+
+HAS_NUMPY = np is not None
+
+logger = logging.getLogger(__name__)
+
+
 def parse_numeric_string(value_str, field_type="float"):
     """
     Parse numeric strings with error handling for currency and formatting
@@ -30,6 +61,50 @@ def parse_numeric_string(value_str, field_type="float"):
         raise ValueError(f"Invalid numeric value '{value_str}': {str(e)}")
 
 
+# what parse_numeric_string strips before converting
+NUMERIC_STRIP_CHARS = ("$", "€", "£", ",", " ")
+
+
+def parse_numeric_columns(columns, specs):
+    """
+    Vectorised parse_numeric_string for a batch of rows (needs NumPy)
+    columns: {field: [stripped cell, ...]}
+    specs: {field: (kind, max_whole_digits, max_decimal_places, value_when_empty)}, kind "float" or
+    "int" (digits after the point are dropped, like parse_numeric_string does)
+    Only plain unsigned decimals within the digit limits pass. Returns (values, ok): ok is a boolean
+    mask of the rows where every field passed and values holds their parsed Python numbers. Rows
+    outside the mask must go through the scalar path, which produces the exact error messages.
+    """
+    ok = None
+    values = {}
+    for field, (kind, max_whole, max_places, empty_value) in specs.items():
+        raw = np.array(columns[field], dtype=str)
+        cleaned = raw
+        for char in NUMERIC_STRIP_CHARS:
+            cleaned = np.char.replace(cleaned, char, "")
+        parts = np.char.partition(cleaned, ".")
+        whole, fraction = parts[:, 0], parts[:, 2]
+
+        # str.isdigit accepts non-ASCII digits, only let plain ASCII through
+        ascii_only = np.char.str_len(np.char.encode(cleaned, "utf-8")) == np.char.str_len(cleaned)
+        field_ok = ascii_only & np.char.isdigit(whole) & (np.char.isdigit(fraction) | (fraction == ""))
+        field_ok &= np.char.str_len(np.char.lstrip(whole, "0")) <= max_whole
+        if max_places is not None:
+            field_ok &= np.char.str_len(np.char.rstrip(fraction, "0")) <= max_places
+
+        empty = raw == ""
+        passed = np.flatnonzero(field_ok)
+        numbers = whole[passed].astype(np.int64) if kind == "int" else cleaned[passed].astype(np.float64)
+        column = [empty_value] * len(raw)
+        for index, number in zip(passed.tolist(), numbers.tolist()):
+            column[index] = number
+        values[field] = column
+
+        field_ok |= empty
+        ok = field_ok if ok is None else ok & field_ok
+    return values, ok
+
+
 def format_currency(value):
     """Format price for display in error messages"""
     try:
@@ -58,4 +133,697 @@ def generate_product_summary(products_data):
     }
 
 
+def _run_with_fresh_connections(func, *args, **kwargs):
+    # pool threads never see request_started/finished, so recycle stale or
+    # broken connections here (honours CONN_MAX_AGE and CONN_HEALTH_CHECKS)
+    close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+_thread_pools = {}
+_thread_pools_lock = threading.Lock()
+
+
+def _thread_pool(name):
+    with _thread_pools_lock:
+        if name not in _thread_pools:
+            workers = settings.ASYNC_POOL_WORKERS.get(name, 4)
+            _thread_pools[name] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"{name}-pool")
+        return _thread_pools[name]
+
+
+async def run_in_pool(pool_name, func, *args, **kwargs):
+    """
+    Run blocking (ORM / file) work from an async view on a named, bounded thread pool.
+    Callers queue when the pool is busy, so the number of threads and database
+    connections stays fixed however many clients are waiting.
+    """
+    loop = asyncio.get_running_loop()
+    call = functools.partial(_run_with_fresh_connections, func, *args, **kwargs)
+    return await loop.run_in_executor(_thread_pool(pool_name), call)
+
+
+def run_in_background(pool_name, func, *args, **kwargs):
+    """Start blocking work on a named pool from a sync view without waiting for it, returns the Future"""
+    return _thread_pool(pool_name).submit(_run_with_fresh_connections, func, *args, **kwargs)
+
+
+def row_fingerprint(*values):
+    """
+    Content hash of a record's imported fields, used to skip unchanged rows on re-import.
+    Callers must normalise values the same way on both sides (e.g. decimals to their scale).
+    """
+    joined = "\x1f".join("" if value is None else str(value) for value in values)
+    return hashlib.sha256(joined.encode("utf-8")).hexdigest()
+
+
+def batched_rows(reader, start=2, batch_size=500):
+    """Yield lists of (row_num, row) from a csv reader, batch_size rows at a time"""
+    rows = enumerate(reader, start=start)
+    while True:
+        batch = list(itertools.islice(rows, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def normalize_column_name(name):
+    """'Stock Quantity', ' stock-quantity', '\ufeffstock_quantity' -> 'stock_quantity'"""
+    return name.replace("\ufeff", "").strip().lower().replace(" ", "_").replace("-", "_")
+
+
+class RowProjection:
+    """
+    A CSV header matched to an importer's fields by name once and compiled into a single
+    itemgetter, so extracting a row is one call: projection(row) -> {field: stripped value}.
+    Fields without a column come back as "". A header that names none of the fields is
+    taken as the legacy positional layout (fields in their documented order).
+    """
+
+    def __init__(self, header, fields):
+        positions = {}
+        self.duplicates = []
+        self.unknown = []
+        for index, name in enumerate(header):
+            column = normalize_column_name(name)
+            if column in fields:
+                if column in positions:
+                    self.duplicates.append(name)
+                else:
+                    positions[column] = index
+            elif column:
+                self.unknown.append(name)
+
+        self.positional = not positions
+        if self.positional:
+            positions = {field: index for index, field in enumerate(fields[: len(header)])}
+            self.unknown = []
+
+        self.mapping = {field: positions[field] for field in fields if field in positions}
+        self.missing = [field for field in fields if field not in positions]
+        self._present = list(self.mapping)
+        indices = list(self.mapping.values())
+        if len(indices) == 1:
+            self._getter = lambda row, index=indices[0]: (row[index],)
+        else:
+            self._getter = operator.itemgetter(*indices)
+        self._width = max(indices) + 1
+        self._absent = dict.fromkeys(self.missing, "")
+
+    def __call__(self, row):
+        if len(row) < self._width:
+            row = row + [""] * (self._width - len(row))
+        data = dict(zip(self._present, map(str.strip, self._getter(row))))
+        if self._absent:
+            data.update(self._absent)
+        return data
+
+    def missing_required(self, form_class):
+        """Missing columns the importer's form cannot do without"""
+        return [field for field in self.missing if form_class.base_fields[field].required]
+
+    def warnings(self):
+        """Header problems worth reporting once instead of on every row"""
+        warnings = []
+        if self.positional:
+            warnings.append(f"Header names none of the expected columns, reading columns by position: {self.mapping}")
+        if self.missing:
+            warnings.append(f"Optional column(s) not in the file, left empty: {', '.join(self.missing)}")
+        if self.unknown:
+            warnings.append(f"Column(s) ignored: {', '.join(self.unknown)}")
+        if self.duplicates:
+            warnings.append(f"Duplicate column(s), the first one is used: {', '.join(self.duplicates)}")
+        return warnings
+
+
+class ImportLookup:
+    """
+    email -> Customer and SKU -> Product instances shared by the stages of a bundle import.
+    The customer and product importers fill it, the order importer resolves its foreign keys from it.
+    """
+
+    def __init__(self):
+        self.customers = {}
+        self.products = {}
+
+
+def _is_utf8_sig(encoding):
+    return encoding.lower().replace("_", "-") == "utf-8-sig"
+
+
+def _line_encoding(encoding):
+    return "utf-8" if _is_utf8_sig(encoding) else encoding
+
+
+class OffsetTrackingLines:
+    """
+    Line iterator for csv.reader that counts the encoded bytes consumed.
+    After the reader yields a row, ``offset`` is the byte position just past that
+    row in the original file, which is what import checkpoints store.
+    """
+
+    def __init__(self, text, encoding="utf-8", offset=0):
+        # text is the whole decoded file or any iterable of lines (e.g. a text file opened with newline="")
+        self.lines = iter(io.StringIO(text, newline="") if isinstance(text, str) else text)
+        # the BOM is only at the start of the file, count it there and not per line
+        if offset == 0 and _is_utf8_sig(encoding) and not (isinstance(text, str) and text.startswith("\ufeff")):
+            offset = 3
+        self.encoding = _line_encoding(encoding)
+        self.offset = offset
+        self._peeked = []
+
+    def sample(self, size=1024):
+        """First size characters for csv.Sniffer, without consuming them"""
+        while sum(len(line) for line in self._peeked) < size:
+            line = next(self.lines, None)
+            if line is None:
+                break
+            self._peeked.append(line)
+        return "".join(self._peeked)[:size]
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        line = self._peeked.pop(0) if self._peeked else next(self.lines)
+        self.offset += len(line.encode(self.encoding))
+        return line
+
+
+def save_import_checkpoint(import_run, offset, row_number, success_count, error_count, unchanged_count=0):
+    """
+    Record how far an import has committed. Call it inside the batch transaction so
+    the checkpoint and the rows it covers commit (or roll back) together.
+    """
+    if import_run is None:
+        return
+    import_run.checkpoint_offset = offset
+    import_run.checkpoint_row = row_number
+    import_run.success_count = success_count
+    import_run.error_count = error_count
+    import_run.unchanged_count = unchanged_count
+    import_run.save(
+        update_fields=["checkpoint_offset", "checkpoint_row", "success_count", "error_count", "unchanged_count"]
+    )
+
+
+def store_upload(uploaded_file, file_sha256):
+    """Keep a copy of the uploaded CSV (named by content hash) so an interrupted import can resume"""
+    os.makedirs(settings.IMPORT_UPLOAD_DIR, exist_ok=True)
+    path = os.path.join(settings.IMPORT_UPLOAD_DIR, f"{file_sha256}.csv")
+    if not os.path.exists(path):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            for chunk in uploaded_file.chunks():
+                f.write(chunk)
+        os.replace(tmp_path, path)
+        uploaded_file.seek(0)
+    return path
+
+
+# a stored upload this new may belong to a run that is still being created
+STORED_UPLOAD_GRACE_SECONDS = 3600
+
+
+def is_stored_upload(path):
+    """Whether path is a copy in IMPORT_UPLOAD_DIR, import_data runs point at the source file itself"""
+    return bool(path) and os.path.dirname(os.path.abspath(path)) == os.path.abspath(settings.IMPORT_UPLOAD_DIR)
+
+
+def stored_upload_in_use(path, exclude_run=None):
+    """Whether a run is reading the stored upload, or failed and can still be resumed from it"""
+    from pages.models import ImportRun
+
+    runs = ImportRun.objects.filter(Q(status="running") | Q(status="failed", dry_run=False), upload_path=path)
+    if exclude_run is not None:
+        runs = runs.exclude(pk=exclude_run.pk)
+    return runs.exists()
+
+
+def release_stored_upload(import_run):
+    """Delete the stored upload of a finished run unless another run still needs it, returns whether it did"""
+    path = import_run.upload_path
+    if not is_stored_upload(path) or stored_upload_in_use(path, exclude_run=import_run):
+        return False
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass  # the same content, released by another run
+    return True
+
+
+def prune_stored_uploads(max_age_days=None, dry_run=False):
+    """
+    Delete the stored uploads in IMPORT_UPLOAD_DIR that no run needs (see stored_upload_in_use),
+    and those older than max_age_days even so. Returns (deleted_paths, bytes_kept).
+    """
+    directory = settings.IMPORT_UPLOAD_DIR
+    if not os.path.isdir(directory):
+        return [], 0
+
+    now = time.time()
+    cutoff = now - max_age_days * 86400 if max_age_days is not None else None
+    deleted = []
+    kept = 0
+    with os.scandir(directory) as entries:
+        for entry in sorted(entries, key=lambda entry: entry.name):
+            if not entry.is_file():
+                continue  # chunks/, see prune_chunked_uploads
+            stat = entry.stat()
+            if stat.st_mtime > now - STORED_UPLOAD_GRACE_SECONDS:
+                kept += stat.st_size
+                continue
+            too_old = cutoff is not None and stat.st_mtime < cutoff
+            # store_upload's .tmp files are left by a process that died while copying
+            if not (too_old or entry.name.endswith(".tmp") or not stored_upload_in_use(entry.path)):
+                kept += stat.st_size
+                continue
+            if not dry_run:
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+            deleted.append(entry.path)
+    return deleted, kept
+
+
+@contextlib.contextmanager
+def open_stored_upload(path, encoding, offset=0):
+    """
+    Open a stored upload for the importers as a stream of text lines, starting at a checkpoint byte offset.
+    Yields (lines, base_offset): the header line followed by the rows after the checkpoint,
+    and the offset to start counting from so positions stay absolute.
+    """
+    with open(path, "rb") as f:
+        header = f.readline()
+        if offset <= len(header):
+            f.seek(0)
+            with io.TextIOWrapper(f, encoding=encoding, newline="") as text:
+                yield text, 0
+            return
+        header_text = header.decode(encoding)
+        f.seek(offset)
+        with io.TextIOWrapper(f, encoding=_line_encoding(encoding), newline="") as rest:
+            yield (
+                itertools.chain([header_text], rest),
+                offset - len(header_text.encode(_line_encoding(encoding))),
+            )
+
+
+def detect_encoding(open_binary, encodings, chunk_size=1024 * 1024):
+    """
+    First of encodings that decodes the whole file, read chunk_size bytes at a time
+    open_binary() returns a new binary file object for each attempt
+    """
+    for encoding in encodings:
+        decoder = codecs.getincrementaldecoder(encoding)()
+        try:
+            with open_binary() as f:
+                for chunk in iter(lambda: f.read(chunk_size), b""):
+                    decoder.decode(chunk)
+            decoder.decode(b"", final=True)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+    return None
+
+
+class ProgressReporter:
+    """
+    Progress of a command line import or export, shared by its worker threads.
+    Writes one line to ``stream`` (stderr) at most every ``interval`` seconds.
+    """
+
+    def __init__(self, stream, label, total=None, unit="bytes", interval=2.0):
+        self.stream = stream
+        self.label = label
+        self.total = total
+        self.unit = unit
+        self.interval = interval
+        self.done = 0
+        self.started = time.monotonic()
+        self.reported = self.started
+        self.lock = threading.Lock()
+
+    def _amount(self, value):
+        return f"{value / 1024 / 1024:.1f}MB" if self.unit == "bytes" else f"{value} {self.unit}"
+
+    def line(self):
+        elapsed = time.monotonic() - self.started
+        if self.total:
+            return (
+                f"{self.label}: {self.done * 100 / self.total:.0f}% "
+                f"({self._amount(self.done)} of {self._amount(self.total)}, {elapsed:.0f}s)"
+            )
+        return f"{self.label}: {self._amount(self.done)} ({elapsed:.0f}s)"
+
+    def advance(self, amount):
+        with self.lock:
+            self.done += amount
+            now = time.monotonic()
+            if now - self.reported < self.interval:
+                return
+            self.reported = now
+            self.stream.write(self.line())
+
+    def finish(self):
+        with self.lock:
+            self.stream.write(self.line())
+
+
+class ProgressFile(io.RawIOBase):
+    """Binary file wrapper that reports every read to ``advance(bytes)`` (wrap it in io.BufferedReader)"""
+
+    def __init__(self, raw, advance):
+        super().__init__()
+        self.raw = raw
+        self.advance = advance
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        count = self.raw.readinto(buffer)
+        if count:
+            self.advance(count)
+        return count
+
+
+def chunk_upload_dir(upload_id):
+    return os.path.join(settings.IMPORT_UPLOAD_DIR, "chunks", str(upload_id))
+
+
+def save_upload_chunk(upload_id, index, uploaded_chunk):
+    """Write one chunk of a chunked upload to its part file, re-sending a chunk replaces it"""
+    directory = chunk_upload_dir(upload_id)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{index:06d}.part")
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    size = 0
+    with open(tmp_path, "wb") as f:
+        for data in uploaded_chunk.chunks():
+            f.write(data)
+            size += len(data)
+    os.replace(tmp_path, path)
+    return size
+
+
+def received_upload_chunks(upload_id):
+    """{chunk index: size} of the part files received so far"""
+    directory = chunk_upload_dir(upload_id)
+    if not os.path.isdir(directory):
+        return {}
+    return {
+        int(name[: -len(".part")]): os.path.getsize(os.path.join(directory, name))
+        for name in os.listdir(directory)
+        if name.endswith(".part")
+    }
+
+
+def assemble_upload_chunks(upload_id, total_chunks, expected_sha256):
+    """
+    Concatenate the part files into IMPORT_UPLOAD_DIR/<sha256>.csv, hashing as it goes.
+    Returns (path, sha256). On a checksum mismatch nothing is kept and path is None.
+    """
+    directory = chunk_upload_dir(upload_id)
+    path = os.path.join(settings.IMPORT_UPLOAD_DIR, f"{expected_sha256}.csv")
+    tmp_path = os.path.join(directory, "assembled.tmp")
+    hasher = hashlib.sha256()
+    with open(tmp_path, "wb") as out:
+        for index in range(total_chunks):
+            with open(os.path.join(directory, f"{index:06d}.part"), "rb") as part:
+                for data in iter(lambda: part.read(1024 * 1024), b""):
+                    hasher.update(data)
+                    out.write(data)
+    sha256 = hasher.hexdigest()
+    if sha256 != expected_sha256:
+        os.remove(tmp_path)
+        return None, sha256
+    os.replace(tmp_path, path)
+    shutil.rmtree(directory, ignore_errors=True)
+    return path, sha256
+
+
+def prune_chunked_uploads(max_age_days, dry_run=False):
+    """
+    Delete chunked uploads that stopped receiving chunks more than max_age_days ago, their
+    ChunkedUpload row and part files, and part file directories without an upload in progress.
+    Returns the upload ids removed.
+    """
+    from pages.models import ChunkedUpload
+
+    now = time.time()
+    cutoff = now - max_age_days * 86400
+    uploading = {
+        str(upload_id): created_at.timestamp()
+        for upload_id, created_at in ChunkedUpload.objects.filter(status="uploading").values_list("upload_id", "created_at")
+    }
+    chunks_dir = os.path.join(settings.IMPORT_UPLOAD_DIR, "chunks")
+    directories = {}
+    if os.path.isdir(chunks_dir):
+        with os.scandir(chunks_dir) as entries:
+            directories = {entry.name: entry.stat().st_mtime for entry in entries if entry.is_dir()}
+
+    deleted = []
+    for upload_id in sorted(set(uploading) | set(directories)):
+        # a new part file touches the directory, a session without any only has its start time
+        last_activity = max(uploading.get(upload_id, 0), directories.get(upload_id, 0))
+        if upload_id in uploading:
+            if last_activity >= cutoff:
+                continue
+        elif last_activity > now - STORED_UPLOAD_GRACE_SECONDS:
+            continue  # being assembled, or its row was just created
+        if not dry_run:
+            shutil.rmtree(os.path.join(chunks_dir, upload_id), ignore_errors=True)
+            if upload_id in uploading:
+                ChunkedUpload.objects.filter(upload_id=upload_id, status="uploading").delete()
+        deleted.append(upload_id)
+    return deleted
+
+
+def open_error_log(path, mode="w"):
+    """Open an import error log for text writing/reading, gzip-compressed when the name ends in .gz"""
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def error_log_extension():
+    return ".txt.gz" if settings.ERROR_LOG_GZIP else ".txt"
+
+
+def compress_error_log(path):
+    """gzip a plain error log in place (path -> path.gz), returns the new path"""
+    gz_path = path + ".gz"
+    with open(path, "rb") as src, gzip.open(gz_path, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    shutil.copystat(path, gz_path)  # keep the mtime so retention still sees the real age
+    os.remove(path)
+    return gz_path
+
+
+def prune_error_logs(directory, max_age_days=None, max_total_bytes=None, dry_run=False):
+    """
+    Apply the error log retention policy.
+    Deletes logs older than max_age_days, then the oldest remaining logs until the
+    directory is under max_total_bytes. Returns (deleted_paths, bytes_kept).
+    """
+    if not os.path.isdir(directory):
+        return [], 0
+
+    logs = []
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.is_file() and entry.name.startswith("import_errors_"):
+                stat = entry.stat()
+                logs.append((stat.st_mtime, stat.st_size, entry.path))
+    logs.sort()  # oldest first
+
+    deleted = []
+    cutoff = time.time() - max_age_days * 86400 if max_age_days is not None else None
+    total = sum(size for _, size, _ in logs)
+    for mtime, size, path in logs:
+        too_old = cutoff is not None and mtime < cutoff
+        too_big = max_total_bytes is not None and total > max_total_bytes
+        if not (too_old or too_big):
+            continue
+        if not dry_run:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass  # already removed by a concurrent prune
+        deleted.append(path)
+        total -= size
+
+    return deleted, total
+
+
+class ImportErrorRecorder:
+    """
+    Buffer row errors for an ImportRun and write them with bulk_create.
+    With no run (importer called outside the upload view) every call is a no-op.
+    """
+
+    def __init__(self, import_run=None, model_type="", batch_size=1000):
+        self.import_run = import_run
+        self.model_type = model_type
+        self.batch_size = batch_size
+        self.pending = []
+
+    def add(self, row_number, code, message, field="", raw_data=""):
+        if self.import_run is None:
+            return
+        from pages.models import ImportRowError
+
+        self.pending.append(
+            ImportRowError(
+                run=self.import_run,
+                model_type=self.model_type,
+                row_number=row_number,
+                field=field,
+                code=code,
+                message=message,
+                raw_data=str(raw_data) if raw_data else "",
+            )
+        )
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def add_form_errors(self, row_number, form, raw_data=""):
+        for field, field_errors in form.errors.items():
+            for error in field_errors:
+                self.add(row_number, "validation", error, field=field, raw_data=raw_data)
+
+    def flush(self):
+        if self.pending:
+            from pages.models import ImportRowError
+
+            ImportRowError.objects.bulk_create(self.pending, batch_size=self.batch_size)
+            self.pending = []
+
+
+_tracing_lock = threading.Lock()
+_tracing_users = 0
+
+
+class ImportProfiler:
+    """
+    Wall time, CPU time of the importing thread and (with IMPORT_PROFILE_MEMORY) peak traced
+    memory per import phase. The importer calls switch(phase) where the work changes, the time
+    since the last switch is charged to the previous phase, so a phase entered once per row
+    costs two clock reads. tracemalloc has one process-wide peak: while other imports trace
+    too it is not reset, the peaks then include their allocations and the profile says so.
+    """
+
+    def __init__(self, label, phase="setup", trace_memory=None):
+        global _tracing_users
+        self.label = label
+        self.phases = {}
+        self.top_allocations = []
+        self.trace_memory = settings.IMPORT_PROFILE_MEMORY if trace_memory is None else trace_memory
+        # the peaks include allocations of other imports traced at the same time
+        self.memory_shared = False
+        if self.trace_memory:
+            with _tracing_lock:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                _tracing_users += 1
+            self._reset_peak()
+        self.phase = phase
+        self.started = self.wall = time.perf_counter()
+        # imports run on pool threads next to each other, process_time() would charge their CPU too
+        self.cpu = time.thread_time()
+
+    def switch(self, phase):
+        wall = time.perf_counter()
+        cpu = time.thread_time()
+        totals = self.phases.setdefault(self.phase, [0.0, 0.0, 0])
+        totals[0] += wall - self.wall
+        totals[1] += cpu - self.cpu
+        if self.trace_memory:
+            totals[2] = max(totals[2], tracemalloc.get_traced_memory()[1])
+            self._reset_peak()
+        self.phase, self.wall, self.cpu = phase, wall, cpu
+
+    def _reset_peak(self):
+        # resetting the peak under another import would lose that import's peak
+        with _tracing_lock:
+            if _tracing_users == 1:
+                tracemalloc.reset_peak()
+            else:
+                self.memory_shared = True
+
+    def finish(self):
+        """Close the current phase, take the top allocation sites and log the profile"""
+        global _tracing_users
+        if self.phase is None:
+            return
+        self.switch(None)
+        self.phases.pop(None, None)
+        self.elapsed = time.perf_counter() - self.started
+        if self.trace_memory:
+            snapshot = tracemalloc.take_snapshot().filter_traces(
+                [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, "<frozen importlib._bootstrap*>")]
+            )
+            self.top_allocations = snapshot.statistics("lineno")[: settings.IMPORT_PROFILE_TOP]
+            with _tracing_lock:
+                _tracing_users -= 1
+                if not _tracing_users:
+                    tracemalloc.stop()
+        self.log()
+
+    def lines(self):
+        """The profile as error log lines"""
+        memory = ""
+        if self.trace_memory:
+            memory = " / peak traced memory" + (", shared with concurrent imports" if self.memory_shared else "")
+        lines = [f"Phase timings (wall / thread CPU{memory}):\n"]
+        for phase, (wall, cpu, peak) in self.phases.items():
+            memory = f" {peak / 1024 / 1024:9.1f}MB" if self.trace_memory else ""
+            lines.append(f"  {phase:<12} {wall:9.3f}s {cpu:9.3f}s{memory}\n")
+        lines.append(f"  {'total':<12} {self.elapsed:9.3f}s\n")
+        if self.top_allocations:
+            lines.append("Top allocation sites (still allocated at the end):\n")
+            for stat in self.top_allocations:
+                frame = stat.traceback[0]
+                lines.append(f"  {frame.filename}:{frame.lineno}: {stat.size / 1024:.1f}KB in {stat.count} blocks\n")
+        return lines
+
+    def log(self):
+        if not logger.isEnabledFor(logging.INFO):
+            return
+        phases = ", ".join(
+            f"{phase} {wall:.3f}s wall/{cpu:.3f}s cpu" + (f"/{peak / 1024 / 1024:.1f}MB peak" if self.trace_memory else "")
+            for phase, (wall, cpu, peak) in self.phases.items()
+        )
+        shared = " (peaks shared with concurrent imports)" if self.memory_shared else ""
+        logger.info("%s profile: %.3fs total; %s%s", self.label, self.elapsed, phases, shared)
+        for stat in self.top_allocations:
+            frame = stat.traceback[0]
+            logger.info(
+                "%s allocations: %s:%s %.1fKB in %s blocks", self.label, frame.filename, frame.lineno, stat.size / 1024, stat.count
+            )
+
+
+class RowDebugLog:
+    """
+    Per-row debug logging for the import loops. Logs only when ``logger`` is enabled for
+    DEBUG, checked once per import, and then one row in every IMPORT_ROW_LOG_SAMPLE, so
+    with debug logging off a row costs one attribute check and no formatting.
+    """
+
+    def __init__(self, logger, every=None):
+        self.logger = logger
+        self.every = every or settings.IMPORT_ROW_LOG_SAMPLE
+        self.enabled = logger.isEnabledFor(logging.DEBUG)
+
+    def __call__(self, row_num, msg, *args):
+        """Log ``msg % args`` for the row when it is sampled, format it lazily"""
+        if self.enabled and row_num % self.every == 0:
+            self.logger.debug("Row %s: " + msg, row_num, *args)
+
+
 # ******************************************************************************************************************************************
@@ -0,0 +1,88 @@
+import random
+import time
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from pages.helper import HAS_NUMPY, parse_numeric_columns, parse_numeric_string
+from products.forms import ProductCSVForm
+from products.views import NUMERIC_COLUMNS
+
+VALID_VALUES = {
+    "price": ["19.99", "$1,299.00", "0.5", "250", "£12.10", "7"],
+    "stock_quantity": ["150", "1,200", "0", "12.7", "35"],
+    "weight": ["0.250", "1.5", "", "12", "3.125"],
+}
+INVALID_VALUES = {
+    "price": ["abc", "-5", "19.999", "1e3", "123456789.00"],
+    "stock_quantity": ["many", "-1", "12x"],
+    "weight": ["heavy", "-0.5", "1.2345", "123456"],
+}
+
+
+class Command(BaseCommand):
+    help = "Compare row by row and NumPy columnar parsing of the product price / stock / weight columns"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=100000)
+        parser.add_argument("--batch-size", type=int, default=settings.IMPORT_BATCH_SIZE)
+        parser.add_argument("--invalid-ratio", type=float, default=0.05, help="Share of cells with a bad value")
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **options):
+        if not HAS_NUMPY:
+            raise CommandError("NumPy is not installed")
+
+        rng = random.Random(options["seed"])
+        rows = [
+            {
+                field: rng.choice(INVALID_VALUES[field] if rng.random() < options["invalid_ratio"] else VALID_VALUES[field])
+                for field in NUMERIC_COLUMNS
+            }
+            for _ in range(options["rows"])
+        ]
+        batch_size = options["batch_size"]
+
+        started = time.perf_counter()
+        scalar = [self.parse_row(row) for row in rows]
+        scalar_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        columnar = []
+        for offset in range(0, len(rows), batch_size):
+            batch = rows[offset : offset + batch_size]
+            values, ok = parse_numeric_columns({field: [row[field] for row in batch] for field in NUMERIC_COLUMNS}, NUMERIC_COLUMNS)
+            columnar.extend(
+                {field: values[field][i] for field in NUMERIC_COLUMNS} if ok[i] else None for i in range(len(batch))
+            )
+        columnar_seconds = time.perf_counter() - started
+
+        # rows passed column-wise must parse to the same numbers row by row
+        mismatches = [
+            i for i, (row_values, column_values) in enumerate(zip(scalar, columnar))
+            if column_values is not None and row_values != column_values
+        ]
+        passed = sum(values is not None for values in columnar)
+        self.stdout.write(f"{len(rows)} rows, batches of {batch_size}")
+        self.stdout.write(f"Row by row: {scalar_seconds:.3f}s ({len(rows) / scalar_seconds:,.0f} rows/s)")
+        self.stdout.write(
+            f"Columnar:   {columnar_seconds:.3f}s ({len(rows) / columnar_seconds:,.0f} rows/s), "
+            f"{passed} rows passed, {len(rows) - passed} sent to the row by row path"
+        )
+        self.stdout.write(f"Speed-up: {scalar_seconds / columnar_seconds:.1f}x")
+        if mismatches:
+            raise CommandError(f"{len(mismatches)} rows parsed differently, first: {rows[mismatches[0]]}")
+        self.stdout.write(self.style.SUCCESS("Columnar results match the row by row path"))
+
+    def parse_row(self, row):
+        """What the product importer does per row: parse_numeric_string, then the form field checks"""
+        values = {}
+        for field, (kind, _, _, empty_value) in NUMERIC_COLUMNS.items():
+            try:
+                value = parse_numeric_string(row[field], kind) if row[field] else empty_value
+                ProductCSVForm.base_fields[field].clean(value)
+            except (ValueError, ValidationError):
+                return None
+            values[field] = value
+        return values
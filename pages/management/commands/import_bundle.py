@@ -0,0 +1,59 @@
+import os
+import zipfile
+
+from django.core.management.base import BaseCommand, CommandError
+
+from pages.views import bundle_members, import_bundle
+
+
+class Command(BaseCommand):
+    help = "Import a bundle of customers, products and orders CSVs (a .zip or a directory) in dependency order"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Zip file or directory holding customers*.csv, products*.csv and orders*.csv")
+        parser.add_argument("--replace", action="store_true", help="Delete all existing data of each type before importing it")
+        parser.add_argument("--dry-run", action="store_true", help="Validate every file without writing any data")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        if os.path.isdir(path):
+            entries = [
+                (name, os.path.getsize(os.path.join(path, name)))
+                for name in sorted(os.listdir(path))
+                if os.path.isfile(os.path.join(path, name))
+            ]
+            results = self.run(entries, lambda name: open(os.path.join(path, name), "rb"), options, path)
+        elif zipfile.is_zipfile(path):
+            with zipfile.ZipFile(path) as archive:
+                entries = [(info.filename, info.file_size) for info in archive.infolist() if not info.is_dir()]
+                results = self.run(entries, archive.open, options, path)
+        else:
+            raise CommandError(f"{path} is neither a directory nor a zip file")
+
+        failed = False
+        for model_type, import_run, errors in results:
+            for error in errors[:20]:
+                self.stderr.write(error)
+            self.stdout.write(
+                f"{model_type}: import #{import_run.pk} {import_run.status}, {import_run.success_count} successful, "
+                f"{import_run.error_count} failed, {import_run.unchanged_count} unchanged. "
+                f"Error log: {import_run.error_log_filename}"
+            )
+            failed = failed or import_run.status == "failed"
+        if failed:
+            raise CommandError("One or more bundle files could not be imported")
+        self.stdout.write(self.style.SUCCESS(f"Bundle {os.path.basename(os.path.normpath(path))} imported"))
+
+    def run(self, entries, open_binary, options, path):
+        members, problems = bundle_members(entries)
+        if problems:
+            raise CommandError("; ".join(problems))
+        for model_type, (name, size) in members.items():
+            self.stdout.write(f"Found {model_type} file {name} ({size} bytes)")
+        return import_bundle(
+            members,
+            open_binary,
+            delete_existing=options["replace"],
+            dry_run=options["dry_run"],
+            bundle_name=os.path.basename(os.path.normpath(path)),
+        )
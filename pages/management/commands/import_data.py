@@ -0,0 +1,237 @@
+import csv
+import hashlib
+import io
+import os
+import tempfile
+import uuid
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+
+from pages.copy_import import copy_import, copy_import_available
+from pages.helper import (
+    ProgressFile,
+    ProgressReporter,
+    detect_encoding,
+    error_log_extension,
+    normalize_column_name,
+)
+from pages.models import ImportRun
+from pages.views import IMPORT_ENCODINGS, IMPORTERS, find_clean_import, finish_import_run
+
+# rows with the same key always land in the same shard, so two workers never write the same record.
+# Orders go by product: the stock check of one SKU then runs in a single worker and parallel
+# shards cannot oversell it (customer counters are F() increments and safe to share)
+SHARD_KEYS = {
+    "customer": "email",
+    "product": "sku",
+    "order": "product_sku",
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Import a customers, products or orders CSV from the command line with the same importers as the "
+        "upload form. Progress goes to stderr. --workers > 1 and --engine copy need PostgreSQL, on SQLite "
+        "the file is imported by one worker with the row by row importer."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--model", required=True, choices=sorted(IMPORTERS), help="What the file holds")
+        parser.add_argument("--file", required=True, help="Path of the CSV file")
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=settings.IMPORT_BATCH_SIZE,
+            help="Rows committed per transaction (default: IMPORT_BATCH_SIZE)",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Split the file by key hash (email for customers, SKU for products and orders) and import the shards in parallel",
+        )
+        parser.add_argument(
+            "--mode",
+            choices=["append", "replace"],
+            default="append",
+            help="replace deletes all existing records of the type first",
+        )
+        parser.add_argument(
+            "--engine",
+            choices=["orm", "copy"],
+            default="orm",
+            help="copy streams the file into a staging table with COPY and validates and merges it with set-based SQL",
+        )
+        parser.add_argument("--dry-run", action="store_true", help="Validate the file without writing any data")
+        parser.add_argument("--force", action="store_true", help="Re-run even if this file was already imported")
+
+    def handle(self, *args, **options):
+        path = options["file"]
+        model_type = options["model"]
+        workers = options["workers"]
+        dry_run = options["dry_run"]
+        if not os.path.isfile(path):
+            raise CommandError(f"{path} does not exist")
+        if workers < 1 or options["batch_size"] < 1:
+            raise CommandError("--workers and --batch-size must be at least 1")
+        if options["engine"] == "copy" and not copy_import_available():
+            self.stderr.write(f"--engine copy needs PostgreSQL, using the row by row importer on {connection.vendor}")
+            options["engine"] = "orm"
+        if options["engine"] == "copy" and workers > 1:
+            raise CommandError("--engine copy loads the whole file in one transaction, use --workers 1")
+        if workers > 1 and connection.vendor == "sqlite":
+            # SQLite has a single writer, the shards would only queue on its lock
+            self.stderr.write("SQLite allows one writer, importing with --workers 1")
+            workers = 1
+
+        encoding = detect_encoding(lambda: open(path, "rb"), IMPORT_ENCODINGS)
+        if encoding is None:
+            raise CommandError(f"Unable to decode {path}. Please use UTF-8 encoding.")
+        hasher = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                hasher.update(chunk)
+        file_sha256 = hasher.hexdigest()
+
+        previous_run = None if (options["force"] or dry_run) else find_clean_import(file_sha256, model_type)
+        if previous_run is not None:
+            self.stdout.write(
+                f"This file was already imported cleanly as import #{previous_run.pk}, nothing was re-run "
+                f"(use --force to import it again)"
+            )
+            return
+
+        file_name = os.path.basename(path)
+        if workers == 1:
+            progress = ProgressReporter(self.stderr, f"{model_type} import", total=os.path.getsize(path))
+            results = [
+                self.import_file(
+                    model_type, path, encoding, file_name, file_sha256, options,
+                    delete_existing=options["mode"] == "replace",
+                    # resume_import continues from the file itself (the COPY engine has no checkpoints)
+                    upload_path="" if dry_run or options["engine"] == "copy" else os.path.abspath(path),
+                    progress=progress,
+                )
+            ]
+        else:
+            with tempfile.TemporaryDirectory(prefix="import_data_") as shard_dir:
+                shards = self.shard(path, encoding, model_type, workers, shard_dir)
+                progress = ProgressReporter(
+                    self.stderr, f"{model_type} import", total=sum(os.path.getsize(shard) for shard in shards)
+                )
+                results = self.import_shards(model_type, shards, file_name, file_sha256, options, progress)
+        progress.finish()
+
+        failed = False
+        for import_run, errors in results:
+            for error in errors[:20]:
+                self.stderr.write(error)
+            self.stdout.write(
+                f"{import_run.file_name}: import #{import_run.pk} {import_run.status}, "
+                f"{import_run.success_count} successful, {import_run.error_count} failed, "
+                f"{import_run.unchanged_count} unchanged. Error log: {import_run.error_log_filename}"
+            )
+            failed = failed or import_run.status == "failed"
+        if failed:
+            raise CommandError(f"{path} could not be imported")
+        self.stdout.write(self.style.SUCCESS(f"{'Dry run of' if dry_run else 'Imported'} {path}"))
+
+    def import_file(self, model_type, path, encoding, file_name, file_sha256, options, delete_existing,
+                    upload_path="", progress=None, suffix="", shard_group=None):
+        """Run the importer on one file, returns (import_run, errors)"""
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        error_log_filename = f"import_errors_{model_type}_{timestamp}_cli{suffix}{error_log_extension()}"
+        os.makedirs(settings.ERROR_LOG_DIR, exist_ok=True)
+        import_run = ImportRun.objects.create(
+            model_type=model_type,
+            file_name=file_name,
+            file_sha256=file_sha256,
+            file_size=os.path.getsize(path),
+            upload_path=upload_path,
+            encoding=encoding,
+            delete_existing=delete_existing,
+            dry_run=options["dry_run"],
+            error_log_filename=error_log_filename,
+            shard_group=shard_group,
+        )
+        with open(path, "rb") as raw:
+            binary = io.BufferedReader(ProgressFile(raw, progress.advance)) if progress else raw
+            with io.TextIOWrapper(binary, encoding=encoding, newline="") as lines:
+                error_log_path = os.path.join(settings.ERROR_LOG_DIR, error_log_filename)
+                if options.get("engine") == "copy":
+                    success_count, error_count, errors = copy_import(
+                        model_type, lines, error_log_path, encoding, delete_existing,
+                        import_run=import_run, dry_run=options["dry_run"],
+                    )
+                else:
+                    success_count, error_count, errors = IMPORTERS[model_type](
+                        lines,
+                        error_log_path,
+                        encoding,
+                        delete_existing,
+                        import_run=import_run,
+                        dry_run=options["dry_run"],
+                        batch_size=options["batch_size"],
+                    )
+        finish_import_run(import_run, success_count, error_count, errors)
+        return import_run, errors
+
+    def shard(self, path, encoding, model_type, workers, directory):
+        """Split the CSV into ``workers`` UTF-8 files by a hash of the record key, each with the header"""
+        with open(path, encoding=encoding, newline="") as f:
+            sample = f.read(64 * 1024)
+            f.seek(0)
+            try:
+                dialect = csv.Sniffer().sniff(sample)
+            except csv.Error:
+                dialect = csv.excel
+            reader = csv.reader(f, dialect)
+            header = next(reader, None)
+            key = SHARD_KEYS[model_type]
+            names = [normalize_column_name(column) for column in header or []]
+            if key not in names:
+                raise CommandError(f"--workers needs a '{key}' column in the header of {path}")
+            key_index = names.index(key)
+
+            paths = [os.path.join(directory, f"shard_{index + 1}.csv") for index in range(workers)]
+            files = [open(shard_path, "w", encoding="utf-8", newline="") for shard_path in paths]
+            try:
+                writers = [csv.writer(shard_file, dialect) for shard_file in files]
+                for writer in writers:
+                    writer.writerow(header)
+                for row in reader:
+                    value = row[key_index].strip().lower() if key_index < len(row) else ""
+                    writers[zlib.crc32(value.encode("utf-8")) % workers].writerow(row)
+            finally:
+                for shard_file in files:
+                    shard_file.close()
+        return paths
+
+    def import_shards(self, model_type, shards, file_name, file_sha256, options, progress):
+        # row numbers in each shard's error log count rows of that shard. The runs carry the hash of
+        # the whole file and one shard_group, find_clean_import needs all of them clean
+        shard_group = uuid.uuid4()
+
+        def run(index, delete_existing=False):
+            try:
+                return self.import_file(
+                    model_type, shards[index], "utf-8", f"{file_name} [shard {index + 1}/{len(shards)}]", file_sha256,
+                    options, delete_existing, progress=progress, suffix=f"_shard{index + 1}", shard_group=shard_group,
+                )
+            finally:
+                connections.close_all()
+
+        results = []
+        first = 0
+        with ThreadPoolExecutor(max_workers=len(shards), thread_name_prefix="import-data") as pool:
+            if options["mode"] == "replace":
+                # the replace delete has to finish before any other shard writes
+                results.append(pool.submit(run, 0, True).result())
+                first = 1
+            results.extend(pool.map(run, range(first, len(shards))))
+        return results
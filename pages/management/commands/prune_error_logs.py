@@ -0,0 +1,88 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from pages.helper import compress_error_log, prune_chunked_uploads, prune_error_logs, prune_stored_uploads
+
+
+class Command(BaseCommand):
+    help = (
+        "Apply the import error log retention policy (age and total size) and optionally gzip old logs, "
+        "then delete the stored uploads no import can resume from and abandoned chunked uploads"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--max-age-days",
+            type=int,
+            default=settings.ERROR_LOG_MAX_AGE_DAYS,
+            help="Delete logs older than this many days (default: ERROR_LOG_MAX_AGE_DAYS)",
+        )
+        parser.add_argument(
+            "--max-total-mb",
+            type=int,
+            default=settings.ERROR_LOG_MAX_TOTAL_MB,
+            help="Delete the oldest logs until the directory is below this size (default: ERROR_LOG_MAX_TOTAL_MB)",
+        )
+        parser.add_argument(
+            "--compress-after-days",
+            type=int,
+            default=None,
+            help="gzip plain .txt logs older than this many days before pruning",
+        )
+        parser.add_argument(
+            "--upload-max-age-days",
+            type=int,
+            default=settings.IMPORT_UPLOAD_MAX_AGE_DAYS,
+            help="Delete stored uploads older than this many days, failed runs can no longer resume, "
+            "and chunked uploads without a new chunk for as long (default: IMPORT_UPLOAD_MAX_AGE_DAYS)",
+        )
+        parser.add_argument("--dry-run", action="store_true", help="Only report what would be done")
+
+    def handle(self, *args, **options):
+        log_dir = settings.ERROR_LOG_DIR
+        dry_run = options["dry_run"]
+
+        if options["compress_after_days"] is not None and os.path.isdir(log_dir):
+            cutoff = time.time() - options["compress_after_days"] * 86400
+            compressed = 0
+            for name in sorted(os.listdir(log_dir)):
+                path = os.path.join(log_dir, name)
+                if name.startswith("import_errors_") and name.endswith(".txt") and os.path.getmtime(path) < cutoff:
+                    if not dry_run:
+                        compress_error_log(path)
+                    compressed += 1
+            self.stdout.write(f"Compressed {compressed} log(s)")
+
+        deleted, bytes_kept = prune_error_logs(
+            log_dir,
+            max_age_days=options["max_age_days"],
+            max_total_bytes=options["max_total_mb"] * 1024 * 1024,
+            dry_run=dry_run,
+        )
+        for path in deleted:
+            self.stdout.write(f"{'Would delete' if dry_run else 'Deleted'} {os.path.basename(path)}")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{len(deleted)} log(s) {'to delete' if dry_run else 'deleted'}, "
+                f"{bytes_kept / 1024 / 1024:.1f}MB kept in {log_dir}"
+            )
+        )
+
+        abandoned = prune_chunked_uploads(options["upload_max_age_days"], dry_run=dry_run)
+        for upload_id in abandoned:
+            self.stdout.write(f"{'Would delete' if dry_run else 'Deleted'} chunked upload {upload_id}")
+
+        deleted, bytes_kept = prune_stored_uploads(max_age_days=options["upload_max_age_days"], dry_run=dry_run)
+        for path in deleted:
+            self.stdout.write(f"{'Would delete' if dry_run else 'Deleted'} {os.path.basename(path)}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{len(abandoned)} chunked upload(s) and {len(deleted)} stored upload(s) "
+                f"{'to delete' if dry_run else 'deleted'}, "
+                f"{bytes_kept / 1024 / 1024:.1f}MB kept in {settings.IMPORT_UPLOAD_DIR}"
+            )
+        )
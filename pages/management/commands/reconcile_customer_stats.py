@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from customers.models import CustomerStats
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per-customer order counters (CustomerStats) from the orders table"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--customer",
+            type=int,
+            action="append",
+            dest="customer_ids",
+            help="Only rebuild this customer id (repeatable, default: all customers)",
+        )
+
+    def handle(self, *args, **options):
+        written = CustomerStats.rebuild(options["customer_ids"])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt order counters for {written} customer(s)"))
@@ -0,0 +1,65 @@
+import os
+from datetime import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from pages.helper import error_log_extension, open_stored_upload
+from pages.models import ImportRun
+from pages.views import IMPORTERS, finish_import_run
+
+
+class Command(BaseCommand):
+    help = "Resume an interrupted CSV import from its last committed checkpoint"
+
+    def add_arguments(self, parser):
+        parser.add_argument("run_id", type=int, help="ImportRun id (see the admin or /import-errors/)")
+
+    def handle(self, *args, **options):
+        try:
+            import_run = ImportRun.objects.get(pk=options["run_id"])
+        except ImportRun.DoesNotExist:
+            raise CommandError(f"Import #{options['run_id']} does not exist")
+
+        if import_run.status == "completed":
+            raise CommandError(f"Import #{import_run.pk} already completed")
+        if import_run.dry_run:
+            raise CommandError(f"Import #{import_run.pk} was a dry run, upload the file again instead")
+        if not import_run.upload_path or not os.path.exists(import_run.upload_path):
+            raise CommandError(f"The stored upload for import #{import_run.pk} is missing")
+
+        encoding = import_run.encoding or "utf-8"
+        self.stdout.write(
+            f"Resuming import #{import_run.pk} ({import_run.model_type}) after row {import_run.checkpoint_row} "
+            f"at byte {import_run.checkpoint_offset}"
+        )
+
+        os.makedirs(settings.ERROR_LOG_DIR, exist_ok=True)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        error_log_filename = f"import_errors_{import_run.model_type}_{timestamp}_resume{error_log_extension()}"
+        import_run.status = "running"
+        import_run.error_log_filename = error_log_filename
+        import_run.save(update_fields=["status", "error_log_filename"])
+
+        # the original run already cleared the table if it was a replace import
+        with open_stored_upload(import_run.upload_path, encoding, import_run.checkpoint_offset) as (lines, base_offset):
+            success_count, error_count, errors = IMPORTERS[import_run.model_type](
+                lines,
+                os.path.join(settings.ERROR_LOG_DIR, error_log_filename),
+                encoding,
+                False,
+                import_run=import_run,
+                resume=True,
+                base_offset=base_offset,
+            )
+        finish_import_run(import_run, success_count, error_count, errors)
+
+        for error in errors:
+            self.stderr.write(error)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Import #{import_run.pk} {import_run.status}: {import_run.success_count} successful, "
+                f"{import_run.error_count} failed. "
+                f"Error log: {error_log_filename}"
+            )
+        )
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = "Fold the inventory ledger into the product stock snapshots (run periodically, e.g. from cron)"
+
+    def handle(self, *args, **options):
+        updated, upto = Product.objects.snapshot_stock()
+        self.stdout.write(self.style.SUCCESS(f"Updated the stock snapshot of {updated} product(s) up to movement {upto}"))
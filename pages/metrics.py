@@ -0,0 +1,310 @@
+# Import / export metrics in the Prometheus text format (pages.views.metrics)
+# ******************************************************************************************************************************************
+"""
+Counters and histograms shared by every worker process without an external service.
+
+Each process adds to its own memory-mapped file in METRICS_DIR (<pid>.db, an append-only
+list of sample key + float64 value), so a write is an in-memory add under a thread lock.
+/metrics sums the files of all processes, the files of exited workers keep counting
+towards the totals so the counters never go backwards. Clear METRICS_DIR on a deploy
+to start from zero.
+"""
+
+import bisect
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_HEADER = struct.Struct("<I4x")  # bytes in use, the entries follow
+_LENGTH = struct.Struct("<I")
+_VALUE = struct.Struct("<d")
+_INITIAL_SIZE = 64 * 1024
+
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, float("inf"))
+
+
+def _entries(buffer):
+    """(key, value offset) of every sample in a metrics file's bytes"""
+    used = _HEADER.unpack_from(buffer, 0)[0] if len(buffer) >= _HEADER.size else 0
+    position = _HEADER.size
+    while position < used:
+        length = _LENGTH.unpack_from(buffer, position)[0]
+        key = bytes(buffer[position + _LENGTH.size : position + _LENGTH.size + length]).decode("utf-8")
+        value_position = position + _LENGTH.size + length
+        value_position += -value_position % 8
+        yield key, value_position
+        position = value_position + _VALUE.size
+
+
+class _ProcessFile:
+    """This process's samples, memory-mapped; other processes only ever read it"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.file = open(path, "a+b")
+        if os.fstat(self.file.fileno()).st_size < _INITIAL_SIZE:
+            self.file.truncate(_INITIAL_SIZE)
+        self.map = mmap.mmap(self.file.fileno(), 0)
+        # a restarted worker with the same pid continues the file
+        self.positions = dict(_entries(self.map))
+        self.used = max(_HEADER.unpack_from(self.map, 0)[0], _HEADER.size)
+
+    def add(self, key, amount):
+        with self.lock:
+            position = self.positions.get(key)
+            if position is None:
+                position = self._append(key)
+            _VALUE.pack_into(self.map, position, _VALUE.unpack_from(self.map, position)[0] + amount)
+
+    def _append(self, key):
+        encoded = key.encode("utf-8")
+        value_position = self.used + _LENGTH.size + len(encoded)
+        value_position += -value_position % 8
+        end = value_position + _VALUE.size
+        if end > len(self.map):
+            size = len(self.map)
+            while size < end:
+                size *= 2
+            self.map.close()
+            self.file.truncate(size)
+            self.map = mmap.mmap(self.file.fileno(), 0)
+        _LENGTH.pack_into(self.map, self.used, len(encoded))
+        self.map[self.used + _LENGTH.size : self.used + _LENGTH.size + len(encoded)] = encoded
+        _VALUE.pack_into(self.map, value_position, 0.0)
+        # readers only look up to the header, so the entry is complete before it is published
+        _HEADER.pack_into(self.map, 0, end)
+        self.used = end
+        self.positions[key] = value_position
+        return value_position
+
+
+_process_file = None
+_process_pid = None
+_process_lock = threading.Lock()
+
+
+def _metrics_dir():
+    return settings.METRICS_DIR
+
+
+def _file():
+    """The current process's file, opened again after a fork"""
+    global _process_file, _process_pid
+    pid = os.getpid()
+    if _process_pid != pid:
+        with _process_lock:
+            if _process_pid != pid:
+                try:
+                    os.makedirs(_metrics_dir(), exist_ok=True)
+                    _process_file = _ProcessFile(os.path.join(_metrics_dir(), f"{pid}.db"))
+                except OSError as e:
+                    # metrics must never fail an import or an export
+                    logger.warning("Metrics disabled in process %s: %s", pid, e)
+                    _process_file = None
+                _process_pid = pid
+    return _process_file
+
+
+def _key(name, labels):
+    return json.dumps([name, labels], separators=(",", ":"))
+
+
+def _add(name, labels, amount):
+    process_file = _file()
+    if process_file is not None:
+        process_file.add(_key(name, labels), amount)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+REGISTRY = []
+
+
+class _Metric:
+    kind = ""
+    suffix = ""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        REGISTRY.append(self)
+
+    def _labels(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes the labels {', '.join(self.labelnames)}")
+        return [[name, str(labels[name])] for name in self.labelnames]
+
+    def expose(self, samples):
+        name = self.name + self.suffix
+        lines = [f"# HELP {name} {self.documentation}", f"# TYPE {name} {self.kind}"]
+        return lines + self._sample_lines(samples)
+
+
+class Counter(_Metric):
+    kind = "counter"
+    suffix = "_total"
+
+    def inc(self, amount=1, **labels):
+        if amount < 0:
+            raise ValueError("Counters only go up")
+        _add(f"{self.name}_total", self._labels(labels), amount)
+
+    def _sample_lines(self, samples):
+        name = f"{self.name}_total"
+        return [
+            f"{name}{_format_labels(labels)} {_format_value(value)}" for labels, value in sorted(samples[name].items())
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DURATION_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        if self.buckets[-1] != float("inf"):
+            self.buckets += (float("inf"),)
+
+    def observe(self, value, **labels):
+        labels = self._labels(labels)
+        # one bucket per observation, /metrics makes them cumulative
+        le = self.buckets[bisect.bisect_left(self.buckets, value)]
+        _add(f"{self.name}_bucket", labels + [["le", _format_value(le)]], 1)
+        _add(f"{self.name}_sum", labels, value)
+        _add(f"{self.name}_count", labels, 1)
+
+    def _sample_lines(self, samples):
+        buckets = defaultdict(dict)
+        for labels, value in samples[f"{self.name}_bucket"].items():
+            buckets[labels[:-1]][labels[-1][1]] = value
+        lines = []
+        for labels, counts in sorted(buckets.items()):
+            total = 0
+            for le in self.buckets:
+                total += counts.get(_format_value(le), 0)
+                le_labels = labels + (("le", _format_value(le)),)
+                lines.append(f"{self.name}_bucket{_format_labels(le_labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(samples[f'{self.name}_sum'][labels])}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {_format_value(samples[f'{self.name}_count'][labels])}")
+        return lines
+
+
+def collect():
+    """{sample name: {labels: value}} summed over the files of every process"""
+    samples = defaultdict(lambda: defaultdict(float))
+    directory = _metrics_dir()
+    if not os.path.isdir(directory):
+        return samples
+    for file_name in os.listdir(directory):
+        if not file_name.endswith(".db"):
+            continue
+        try:
+            with open(os.path.join(directory, file_name), "rb") as f:
+                data = f.read()
+        except OSError:
+            continue  # removed while we listed the directory
+        for key, position in _entries(data):
+            name, labels = json.loads(key)
+            samples[name][tuple(tuple(label) for label in labels)] += _VALUE.unpack_from(data, position)[0]
+    return samples
+
+
+def render():
+    """Every registered metric in the Prometheus text exposition format"""
+    samples = collect()
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.expose(samples))
+    return "\n".join(lines) + "\n"
+
+
+IMPORT_ROWS_READ = Counter("csv_import_rows_read", "CSV rows read by the importers", ["model"])
+IMPORT_ROWS = Counter(
+    "csv_import_rows", "Imported CSV rows by result (success = created, failed, unchanged)", ["model", "result"]
+)
+IMPORT_DURATION = Histogram("csv_import_duration_seconds", "Wall time of an importer run", ["model"])
+IMPORTS = Counter("csv_imports", "Finished import runs by status (dry runs are not counted)", ["model", "status"])
+EXPORT_ROWS = Counter("csv_export_rows", "Rows streamed by the export URLs", ["export", "format"])
+EXPORT_BYTES = Counter("csv_export_bytes", "Bytes streamed by the export URLs", ["export", "format"])
+EXPORT_DURATION = Histogram(
+    "csv_export_duration_seconds", "Wall time of an export stream, first to last chunk", ["export", "format"]
+)
+
+
+class ImportMeter:
+    """
+    Feeds one importer run into the import metrics: batch() after each committed batch
+    with the importer's running totals (only their growth is counted), finish() once.
+    A dry run writes nothing and is not counted.
+    """
+
+    def __init__(self, model_type, dry_run=False):
+        self.model_type = model_type
+        self.totals = {"success": 0, "failed": 0, "unchanged": 0}
+        self.dry_run = dry_run
+        self.started = time.perf_counter()
+        self.finished = False
+
+    def start(self, success_count=0, error_count=0, unchanged_count=0):
+        """The totals a resumed run starts from, they were counted by the first attempt"""
+        self.totals = {"success": success_count, "failed": error_count, "unchanged": unchanged_count}
+
+    def batch(self, rows, success_count, error_count, unchanged_count=0):
+        if self.dry_run:
+            return
+        IMPORT_ROWS_READ.inc(rows, model=self.model_type)
+        for result, total in (("success", success_count), ("failed", error_count), ("unchanged", unchanged_count)):
+            if total > self.totals[result]:
+                IMPORT_ROWS.inc(total - self.totals[result], model=self.model_type, result=result)
+                self.totals[result] = total
+
+    def finish(self):
+        if self.finished or self.dry_run:
+            return
+        self.finished = True
+        IMPORT_DURATION.observe(time.perf_counter() - self.started, model=self.model_type)
+
+
+class ExportMeter:
+    """Counts the rows and bytes of one export stream, sent() hands the chunk back as bytes"""
+
+    def __init__(self, export, export_format):
+        self.labels = {"export": export, "format": export_format}
+        self.started = time.perf_counter()
+
+    def sent(self, chunk, rows=0):
+        if isinstance(chunk, str):
+            chunk = chunk.encode("utf-8")
+        if rows:
+            EXPORT_ROWS.inc(rows, **self.labels)
+        if chunk:
+            EXPORT_BYTES.inc(len(chunk), **self.labels)
+        return chunk
+
+    def finish(self):
+        EXPORT_DURATION.observe(time.perf_counter() - self.started, **self.labels)
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_type', models.CharField(choices=[('customer', 'Customer'), ('product', 'Product'), ('order', 'Order')], max_length=20)),
+                ('file_name', models.CharField(blank=True, max_length=255)),
+                ('encoding', models.CharField(blank=True, max_length=20)),
+                ('delete_existing', models.BooleanField(default=False)),
+                ('status', models.CharField(choices=[('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed')], default='running', max_length=20)),
+                ('success_count', models.IntegerField(default=0)),
+                ('error_count', models.IntegerField(default=0)),
+                ('error_log_filename', models.CharField(blank=True, max_length=255)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['-started_at'],
+                'indexes': [models.Index(fields=['model_type', 'started_at'], name='pages_impor_model_t_1526a6_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ImportRowError',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_type', models.CharField(choices=[('customer', 'Customer'), ('product', 'Product'), ('order', 'Order')], max_length=20)),
+                ('row_number', models.IntegerField()),
+                ('field', models.CharField(blank=True, max_length=50)),
+                ('code', models.CharField(choices=[('empty_row', 'Empty row'), ('validation', 'Validation failed'), ('invalid_number', 'Invalid numeric format'), ('invalid_sku', 'Invalid SKU format'), ('customer_not_found', 'Customer not found'), ('product_not_found', 'Product not found'), ('insufficient_stock', 'Insufficient stock'), ('database', 'Database error'), ('processing', 'Processing error')], max_length=30)),
+                ('message', models.TextField()),
+                ('raw_data', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='row_errors', to='pages.importrun')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['run', 'id'], name='pages_impor_run_id_b692aa_idx'), models.Index(fields=['model_type', 'code', 'id'], name='pages_impor_model_t_c42977_idx'), models.Index(fields=['model_type', 'field', 'id'], name='pages_impor_model_t_ddaaf1_idx'), models.Index(fields=['code', 'created_at'], name='pages_impor_code_25540a_idx')],
+            },
+        ),
+    ]
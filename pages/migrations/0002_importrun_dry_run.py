@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pages', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importrun',
+            name='dry_run',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pages', '0002_importrun_dry_run'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importrun',
+            name='unchanged_count',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pages', '0003_importrun_unchanged_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importrun',
+            name='file_sha256',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='importrun',
+            name='file_size',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pages', '0004_importrun_file_sha256_importrun_file_size'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importrun',
+            name='checkpoint_offset',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='importrun',
+            name='checkpoint_row',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='importrun',
+            name='upload_path',
+            field=models.CharField(blank=True, max_length=500),
+        ),
+    ]
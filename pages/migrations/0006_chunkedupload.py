@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:25
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pages', '0005_importrun_checkpoint_offset_importrun_checkpoint_row_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChunkedUpload',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('upload_id', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('model_type', models.CharField(choices=[('customer', 'Customer'), ('product', 'Product'), ('order', 'Order')], max_length=20)),
+                ('file_name', models.CharField(max_length=255)),
+                ('file_size', models.BigIntegerField()),
+                ('file_sha256', models.CharField(db_index=True, max_length=64)),
+                ('chunk_size', models.IntegerField()),
+                ('delete_existing', models.BooleanField(default=False)),
+                ('dry_run', models.BooleanField(default=False)),
+                ('force', models.BooleanField(default=False)),
+                ('status', models.CharField(choices=[('uploading', 'Uploading'), ('complete', 'Complete')], default='uploading', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('import_run', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='pages.importrun')),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pages', '0006_chunkedupload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importrun',
+            name='shard_group',
+            field=models.UUIDField(blank=True, db_index=True, null=True),
+        ),
+    ]
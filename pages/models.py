@@ -1,13 +1,124 @@
 # models.py
-# from django.db import models
-# from django.core.validators import MinLengthValidator
-# from django.core.exceptions import ValidationError
+import uuid
 
+from django.db import models
 
 
+class ImportRun(models.Model):
+    """One CSV import, the row level failures are stored in ImportRowError"""
 
+    MODEL_CHOICES = [
+        ("customer", "Customer"),
+        ("product", "Product"),
+        ("order", "Order"),
+    ]
+    STATUS_CHOICES = [
+        ("running", "Running"),
+        ("completed", "Completed"),
+        ("failed", "Failed"),
+    ]
 
+    model_type = models.CharField(max_length=20, choices=MODEL_CHOICES)
+    file_name = models.CharField(max_length=255, blank=True)
+    file_sha256 = models.CharField(max_length=64, blank=True, db_index=True)
+    file_size = models.BigIntegerField(default=0)
+    encoding = models.CharField(max_length=20, blank=True)
+    delete_existing = models.BooleanField(default=False)
+    dry_run = models.BooleanField(default=False)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="running")
+    success_count = models.IntegerField(default=0)
+    error_count = models.IntegerField(default=0)
+    # rows whose fingerprint matched the stored record and were not written
+    unchanged_count = models.IntegerField(default=0)
+    error_log_filename = models.CharField(max_length=255, blank=True)
+    # stored copy of the upload and how far it has been committed, for resume_import
+    upload_path = models.CharField(max_length=500, blank=True)
+    checkpoint_offset = models.BigIntegerField(default=0)
+    checkpoint_row = models.IntegerField(default=0)
+    # shared by the shard runs of one `import_data --workers N`, the file is only imported once all of them are
+    shard_group = models.UUIDField(null=True, blank=True, db_index=True)
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
 
+    class Meta:
+        ordering = ["-started_at"]
+        indexes = [
+            models.Index(fields=["model_type", "started_at"]),
+        ]
 
+    def __str__(self):
+        return f"Import #{self.pk} - {self.model_type} - {self.file_name}"
 
 
+class ChunkedUpload(models.Model):
+    """
+    A large CSV sent in numbered chunks (pages.views.chunked_upload_*). The part files
+    on disk are the record of which chunks arrived, so a client can resume after a disconnect.
+    """
+
+    STATUS_CHOICES = [
+        ("uploading", "Uploading"),
+        ("complete", "Complete"),
+    ]
+
+    upload_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    model_type = models.CharField(max_length=20, choices=ImportRun.MODEL_CHOICES)
+    file_name = models.CharField(max_length=255)
+    file_size = models.BigIntegerField()
+    file_sha256 = models.CharField(max_length=64, db_index=True)
+    chunk_size = models.IntegerField()
+    delete_existing = models.BooleanField(default=False)
+    dry_run = models.BooleanField(default=False)
+    force = models.BooleanField(default=False)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="uploading")
+    import_run = models.ForeignKey(ImportRun, null=True, blank=True, on_delete=models.SET_NULL)
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    @property
+    def total_chunks(self):
+        return -(-self.file_size // self.chunk_size)
+
+    def expected_chunk_size(self, index):
+        if index == self.total_chunks - 1:
+            return self.file_size - self.chunk_size * index
+        return self.chunk_size
+
+    def __str__(self):
+        return f"Upload {self.upload_id} - {self.model_type} - {self.file_name}"
+
+
+class ImportRowError(models.Model):
+    CODE_CHOICES = [
+        ("empty_row", "Empty row"),
+        ("validation", "Validation failed"),
+        ("invalid_number", "Invalid numeric format"),
+        ("invalid_sku", "Invalid SKU format"),
+        ("customer_not_found", "Customer not found"),
+        ("product_not_found", "Product not found"),
+        ("insufficient_stock", "Insufficient stock"),
+        ("database", "Database error"),
+        ("processing", "Processing error"),
+    ]
+
+    run = models.ForeignKey(ImportRun, on_delete=models.CASCADE, related_name="row_errors")
+    # copied from the run so errors can be filtered by model without a join
+    model_type = models.CharField(max_length=20, choices=ImportRun.MODEL_CHOICES)
+    row_number = models.IntegerField()
+    field = models.CharField(max_length=50, blank=True)
+    code = models.CharField(max_length=30, choices=CODE_CHOICES)
+    message = models.TextField()
+    raw_data = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        # every access path pages on id (see pages.views.import_errors)
+        indexes = [
+            models.Index(fields=["run", "id"]),
+            models.Index(fields=["model_type", "code", "id"]),
+            models.Index(fields=["model_type", "field", "id"]),
+            models.Index(fields=["code", "created_at"]),
+        ]
+
+    def __str__(self):
+        return f"Row {self.row_number}: {self.message}"
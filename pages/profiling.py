@@ -0,0 +1,268 @@
+# On-demand request profiling for staff (pages.views.request_profiles)
+# ******************************************************************************************************************************************
+"""
+A staff user adds ?profile=cprofile|sample (or an X-Profile header) to any request,
+e.g. the import form POST, an export URL or an admin page, and the view runs profiled:
+
+- sample: a thread samples the request thread's stack every PROFILE_SAMPLE_INTERVAL
+  seconds, cheap enough for production
+- cprofile: cProfile traces every call, together with the sampler
+
+Both write <name>.prof (pstats, for snakeviz / python -m pstats; built from the samples
+in sample mode) and <name>.collapsed (one "frame;frame;frame count" line per stack, for
+flamegraph.pl / speedscope) to PROFILES_DIR. A streamed response (the exports) is
+profiled until its last chunk is sent. One request is profiled at a time per process.
+"""
+
+import collections
+import cProfile
+import logging
+import marshal
+import os
+import re
+import sys
+import threading
+import time
+from datetime import datetime
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+PROFILE_MODES = ("cprofile", "sample")
+PROFILE_EXTENSIONS = (".prof", ".collapsed")
+
+# cProfile cannot run twice at once, and two sampled requests would only slow each other down
+_active = threading.Lock()
+
+
+def _frame_label(code):
+    filename = code.co_filename
+    if filename.startswith(str(settings.BASE_DIR)):
+        filename = os.path.relpath(filename, settings.BASE_DIR)
+    return filename, code.co_firstlineno, code.co_name
+
+
+class StackSampler(threading.Thread):
+    """Counts the stacks of one thread (root first) every ``interval`` seconds"""
+
+    def __init__(self, thread_id, interval):
+        super().__init__(name="request-profiler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.stacks[tuple(reversed(stack))] += 1
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+    def collapsed(self):
+        """Brendan Gregg's collapsed stack format"""
+        return "".join(
+            ";".join(f"{name} ({filename}:{line})" for filename, line, name in stack) + f" {count}\n"
+            for stack, count in self.stacks.most_common()
+        )
+
+    def pstats(self):
+        """The samples as pstats data: a sample is ``interval`` seconds of the functions on its stack"""
+        stats = {}
+        for stack, count in self.stacks.items():
+            seconds = count * self.interval
+            seen = set()
+            for depth, function in enumerate(stack):
+                cc, nc, tt, ct, callers = stats.setdefault(function, (0, 0, 0.0, 0.0, {}))
+                if depth == len(stack) - 1:
+                    tt += seconds
+                # recursion counts once for the cumulative time
+                if function not in seen:
+                    seen.add(function)
+                    ct += seconds
+                    cc += count
+                nc += count
+                if depth:
+                    caller = stack[depth - 1]
+                    c_nc, c_cc, c_tt, c_ct = callers.get(caller, (0, 0, 0.0, 0.0))
+                    callers[caller] = (c_nc + count, c_cc + count, c_tt, c_ct + seconds)
+                stats[function] = (cc, nc, tt, ct, callers)
+        return stats
+
+
+class ProfileSession:
+    """One profiled request: start(), run(func) as often as needed, then save()"""
+
+    def __init__(self, request, mode):
+        self.mode = mode
+        self.name = "_".join(
+            [
+                datetime.now().strftime("%Y%m%d_%H%M%S_%f"),
+                request.method.lower(),
+                re.sub(r"[^A-Za-z0-9]+", "-", request.path).strip("-")[:60] or "root",
+                mode,
+            ]
+        )
+        self.profile = cProfile.Profile() if mode == "cprofile" else None
+        self.sampler = StackSampler(threading.get_ident(), settings.PROFILE_SAMPLE_INTERVAL)
+        self.started = time.perf_counter()
+
+    def start(self):
+        self.sampler.start()
+
+    def run(self, func, *args):
+        if self.profile is None:
+            return func(*args)
+        self.profile.enable()
+        try:
+            return func(*args)
+        finally:
+            self.profile.disable()
+
+    def save(self):
+        """Write the .prof and .collapsed files, returns the base name"""
+        self.sampler.stop()
+        os.makedirs(settings.PROFILES_DIR, exist_ok=True)
+        path = os.path.join(settings.PROFILES_DIR, self.name)
+        if self.profile is not None:
+            self.profile.dump_stats(path + ".prof")
+        elif self.sampler.stacks:
+            # pstats will not load an empty profile, a request shorter than one interval has only the .collapsed file
+            with open(path + ".prof", "wb") as f:
+                marshal.dump(self.sampler.pstats(), f)
+        with open(path + ".collapsed", "w", encoding="utf-8") as f:
+            f.write(self.sampler.collapsed())
+        logger.info(
+            "Profiled request saved as %s (%.3fs, %s samples)",
+            self.name, time.perf_counter() - self.started, sum(self.sampler.stacks.values()),
+        )
+        prune_profiles(settings.PROFILES_DIR, settings.PROFILES_KEEP)
+        return self.name
+
+
+def list_profiles(directory):
+    """Saved profiles, newest first: [{"name", "files": {extension: size}, "modified"}]"""
+    if not os.path.isdir(directory):
+        return []
+    profiles = {}
+    for entry in os.scandir(directory):
+        name, extension = os.path.splitext(entry.name)
+        if extension in PROFILE_EXTENSIONS and entry.is_file():
+            stat = entry.stat()
+            profile = profiles.setdefault(name, {"name": name, "files": {}, "modified": stat.st_mtime})
+            profile["files"][extension] = stat.st_size
+            profile["modified"] = max(profile["modified"], stat.st_mtime)
+    return sorted(profiles.values(), key=lambda profile: profile["modified"], reverse=True)
+
+
+def prune_profiles(directory, keep):
+    for profile in list_profiles(directory)[keep:]:
+        for extension in profile["files"]:
+            try:
+                os.remove(os.path.join(directory, profile["name"] + extension))
+            except OSError:
+                pass
+
+
+def profile_path(filename):
+    """Path of a saved profile file, None for anything that is not one"""
+    if os.path.basename(filename) != filename or os.path.splitext(filename)[1] not in PROFILE_EXTENSIONS:
+        return None
+    file_path = os.path.join(settings.PROFILES_DIR, filename)
+    return file_path if os.path.isfile(file_path) else None
+
+
+def requested_profile_mode(request):
+    mode = request.GET.get("profile") or request.headers.get("X-Profile")
+    if not mode:
+        return None
+    mode = mode.lower()
+    if mode not in PROFILE_MODES:
+        return None
+    user = getattr(request, "user", None)
+    if user is None or not user.is_active or not user.is_staff:
+        return None
+    return mode
+
+
+class RequestProfilerMiddleware:
+    """Profiles the request when a staff user asks for it (see the module docstring), needs AuthenticationMiddleware first"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        mode = requested_profile_mode(request)
+        if mode is None:
+            return self.get_response(request)
+        if not _active.acquire(blocking=False):
+            response = self.get_response(request)
+            response["X-Profile"] = "busy"
+            return response
+
+        session = ProfileSession(request, mode)
+        session.start()
+        try:
+            response = session.run(self.get_response, request)
+        except BaseException:
+            self._finish(session)
+            raise
+        response["X-Profile"] = session.name
+        if response.streaming and not response.is_async:
+            response.streaming_content = _ProfiledStream(session, response.streaming_content, self._finish)
+        else:
+            # an async stream is produced on the event loop and its pools, not on this thread
+            self._finish(session)
+        return response
+
+    @staticmethod
+    def _finish(session):
+        try:
+            session.save()
+        except OSError as e:
+            logger.error("Could not save the request profile %s: %s", session.name, e)
+        finally:
+            _active.release()
+
+
+class _ProfiledStream:
+    """
+    Streaming content that profiles producing each chunk. The response closes it after the
+    last chunk or a disconnect, also when no chunk was ever asked for (a generator's finally
+    would not run then, and the profiler lock would never be released)
+    """
+
+    def __init__(self, session, content, finish):
+        self.session = session
+        self.iterator = iter(content)
+        self.finish = finish
+        self.finished = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return self.session.run(next, self.iterator)
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self):
+        if self.finished:
+            return
+        self.finished = True
+        try:
+            close = getattr(self.iterator, "close", None)
+            if close is not None:
+                close()
+        finally:
+            self.finish(self.session)
@@ -1,3 +1,1196 @@
-from django.test import TestCase
+import csv
+import hashlib
+import io
+import json
+import logging
+import os
+import runpy
+import sqlite3
+import tempfile
+import time
+import tracemalloc
+import uuid
+import zipfile
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.utils import ConnectionHandler
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from config.db_routers import REPLICA_ALIAS, ReplicaRouter, reporting_db, reporting_reads
+from config.log_queue import QueueListenerHandler
+from customers.forms import CustomerCSVForm
+from customers.models import Customer
+from customers.views import import_customers_with_validation
+from orders.models import Order
+from products.models import InventoryMovement, Product
+from products.views import import_products_with_validation
+
+from . import metrics, views
+from .copy_import import copy_import
+from .helper import (
+    HAS_NUMPY,
+    ImportProfiler,
+    OffsetTrackingLines,
+    RowDebugLog,
+    RowProjection,
+    open_stored_upload,
+    parse_numeric_columns,
+    parse_numeric_string,
+    prune_chunked_uploads,
+    prune_error_logs,
+    prune_stored_uploads,
+    release_stored_upload,
+    save_import_checkpoint,
+)
+from .management.commands.import_data import Command as ImportDataCommand
+from .models import ChunkedUpload, ImportRowError, ImportRun
+from .views import find_clean_import, finish_import_run
+
+HAS_REPLICA = REPLICA_ALIAS in settings.DATABASES
+
+CUSTOMERS_CSV = "name,email,phone,address\nJohn William,john@example.com,123-456-7890,1 Main Street\nNo Email,,,\n"
+
+
+class ReplicaRouterTests(TestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        self.router = ReplicaRouter()
+
+    def test_reads_use_default_outside_reporting(self):
+        self.assertEqual(self.router.db_for_read(Customer), "default")
+
+    def test_writes_always_use_default(self):
+        with reporting_reads():
+            self.assertEqual(self.router.db_for_write(Customer), "default")
+
+    @skipUnless(not HAS_REPLICA, "replica alias is configured")
+    def test_reporting_falls_back_to_default(self):
+        self.assertEqual(reporting_db(), "default")
+        with reporting_reads() as alias:
+            self.assertEqual(alias, "default")
+            self.assertEqual(self.router.db_for_read(Customer), "default")
+
+    def test_reporting_alias_is_chosen_once_per_block(self):
+        with mock.patch("config.db_routers.reporting_db", return_value="default") as choose:
+            with reporting_reads() as alias:
+                for _ in range(3):
+                    self.assertEqual(self.router.db_for_read(Customer), alias)
+                with reporting_reads() as nested:
+                    self.assertEqual(nested, alias)
+        self.assertEqual(choose.call_count, 1)
+        self.assertEqual(self.router.db_for_read(Customer), "default")
+
+    @skipUnless(HAS_REPLICA, "set DB_REPLICA_NAME to test against a second database")
+    def test_reporting_reads_use_replica(self):
+        Customer.objects.using(REPLICA_ALIAS).create(name="Replica Only", email="replica@example.com")
+        with reporting_reads() as alias:
+            self.assertEqual(alias, REPLICA_ALIAS)
+            self.assertTrue(Customer.objects.filter(email="replica@example.com").exists())
+        self.assertFalse(Customer.objects.filter(email="replica@example.com").exists())
+
+
+class CsvImportViewTests(TestCase):
+    def setUp(self):
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        self.upload_dir = os.path.join(directory, "uploads")
+        self.enterContext(
+            override_settings(
+                IMPORT_UPLOAD_DIR=self.upload_dir,
+                ERROR_LOG_DIR=os.path.join(directory, "logs"),
+            )
+        )
+
+    def post(self, data, **fields):
+        upload = SimpleUploadedFile("customers.csv", data, content_type="text/csv")
+        return self.client.post(
+            reverse("pages:import_csv"), {"csv_file": upload, "model_type": "customer", "delete_option": "append", **fields}
+        )
+
+    def test_latin1_file_is_streamed_from_a_temporary_upload(self):
+        data = "name,email,phone,address\nJosé Núñez,jose@example.com,,1 Main Street\n".encode("latin-1")
+        with override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=0):
+            response = self.post(data)
+        self.assertContains(response, "Successfully imported 1 customer records")
+        self.assertEqual(Customer.objects.get(email="jose@example.com").name, "José Núñez")
+        self.assertEqual(ImportRun.objects.get().encoding, "latin-1")
+
+    def test_in_memory_upload_with_errors(self):
+        response = self.post(CUSTOMERS_CSV.encode("utf-8"))
+        self.assertContains(response, "1 successful and 1 failed records")
+        run = ImportRun.objects.get()
+        self.assertEqual((run.success_count, run.error_count, run.encoding), (1, 1, "utf-8"))
+        # a completed run has nothing to resume, its stored upload is deleted
+        self.assertEqual(os.listdir(self.upload_dir), [])
+
+    def test_failed_run_keeps_its_stored_upload(self):
+        self.post(b"name,phone\nJohn William,123\n")
+        run = ImportRun.objects.get()
+        self.assertEqual(run.status, "failed")
+        self.assertTrue(os.path.exists(run.upload_path))
+
+
+class BundleImportViewTests(TestCase):
+    def test_member_names_are_escaped_in_messages(self):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w") as archive:
+            archive.writestr(
+                "customers<img src=x onerror=alert(1)>.csv",
+                CUSTOMERS_CSV,
+            )
+        upload = SimpleUploadedFile("bundle.zip", buffer.getvalue(), content_type="application/zip")
+        with override_settings(ERROR_LOG_DIR=tempfile.mkdtemp()):
+            response = self.client.post(reverse("pages:import_bundle"), {"bundle_file": upload, "delete_option": "append"})
+        self.assertContains(response, "customers&lt;img src=x onerror=alert(1)&gt;.csv")
+        self.assertNotContains(response, "<img src=x")
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        self.enterContext(override_settings(METRICS_DIR=self.enterContext(tempfile.TemporaryDirectory())))
+        # the process file is opened once per pid, open it again in the test directory
+        metrics._process_pid = None
+        self.addCleanup(setattr, metrics, "_process_pid", None)
+
+    def sample(self, name, **labels):
+        return metrics.collect()[name][tuple(labels.items())]
+
+    def test_render_counters_and_cumulative_buckets(self):
+        labels = {"export": "customer", "format": "csv"}
+        metrics.EXPORT_ROWS.inc(3, **labels)
+        metrics.EXPORT_ROWS.inc(2, **labels)
+        metrics.EXPORT_DURATION.observe(0.5, **labels)
+        metrics.EXPORT_DURATION.observe(4, **labels)
+
+        text = metrics.render()
+
+        self.assertIn("# TYPE csv_export_rows_total counter\n", text)
+        self.assertIn('csv_export_rows_total{export="customer",format="csv"} 5.0\n', text)
+        self.assertIn('csv_export_duration_seconds_bucket{export="customer",format="csv",le="0.25"} 0.0\n', text)
+        self.assertIn('csv_export_duration_seconds_bucket{export="customer",format="csv",le="0.5"} 1.0\n', text)
+        self.assertIn('csv_export_duration_seconds_bucket{export="customer",format="csv",le="5.0"} 2.0\n', text)
+        self.assertIn('csv_export_duration_seconds_bucket{export="customer",format="csv",le="+Inf"} 2.0\n', text)
+        self.assertIn('csv_export_duration_seconds_sum{export="customer",format="csv"} 4.5\n', text)
+        self.assertIn('csv_export_duration_seconds_count{export="customer",format="csv"} 2.0\n', text)
+
+    def test_label_values_are_escaped(self):
+        metrics.EXPORT_ROWS.inc(1, export='a"b\\c\nd', format="csv")
+        self.assertIn('csv_export_rows_total{export="a\\"b\\\\c\\nd",format="csv"} 1.0\n', metrics.render())
+
+    def test_wrong_labels_are_rejected(self):
+        with self.assertRaises(ValueError):
+            metrics.EXPORT_ROWS.inc(1, export="customer")
+
+    def test_dry_runs_are_not_counted(self):
+        for dry_run in (True, False):
+            run = ImportRun.objects.create(model_type="customer", file_name="customers.csv", dry_run=dry_run)
+            result = import_customers_with_validation(
+                io.StringIO(CUSTOMERS_CSV), os.path.join(settings.METRICS_DIR, "errors.txt"), import_run=run, dry_run=dry_run
+            )
+            finish_import_run(run, *result)
+
+        self.assertEqual(self.sample("csv_imports_total", model="customer", status="completed"), 1)
+        self.assertEqual(self.sample("csv_import_rows_read_total", model="customer"), 2)
+        self.assertEqual(self.sample("csv_import_rows_total", model="customer", result="success"), 1)
+        self.assertEqual(self.sample("csv_import_rows_total", model="customer", result="failed"), 1)
+        self.assertEqual(self.sample("csv_import_duration_seconds_count", model="customer"), 1)
+
+    @override_settings(METRICS_TOKEN="s3cret")
+    def test_view_needs_the_token(self):
+        url = reverse("pages:metrics")
+        self.assertEqual(self.client.get(url).status_code, 401)
+        response = self.client.get(url, HTTP_AUTHORIZATION="Bearer s3cret")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("# TYPE csv_imports_total counter", response.content.decode())
+
+
+@skipUnless(connection.vendor == "postgresql", "the COPY engine needs PostgreSQL")
+class CopyImportTests(TestCase):
+    def setUp(self):
+        self.directory = self.enterContext(tempfile.TemporaryDirectory())
+
+    def copy(self, model_type, csv_text, **kwargs):
+        run = ImportRun.objects.create(model_type=model_type, dry_run=kwargs.get("dry_run", False))
+        error_log_path = os.path.join(self.directory, f"{run.pk}.txt")
+        result = copy_import(model_type, io.StringIO(csv_text), error_log_path, import_run=run, **kwargs)
+        finish_import_run(run, *result)
+        return result, run
+
+    def test_append_customers(self):
+        (created, failed, errors), run = self.copy("customer", CUSTOMERS_CSV)
+        self.assertEqual((created, failed, run.status), (1, 1, "completed"))
+        self.assertEqual(len(errors), 1)
+        self.assertTrue(errors[0].startswith("Row 3: Email - "))
+        self.assertTrue(Customer.objects.filter(email="john@example.com").exists())
+        self.assertEqual(list(ImportRowError.objects.filter(run=run).values_list("row_number", flat=True)), [3])
+
+        (created, failed, errors), run = self.copy("customer", CUSTOMERS_CSV)
+        self.assertEqual((created, failed, run.unchanged_count), (0, 1, 1))
+
+    def test_replace_products(self):
+        Product.objects.create(name="Old Widget", sku="OLD-1", price=1, stock_quantity=1)
+        Product.objects.create(name="Widget", sku="W-1", price=1, stock_quantity=1)
+        csv_text = "name,sku,description,price,stock_quantity,weight\nWidget,W-1,,10.00,5,\nGadget,G-1,,\"$1,000.50\",7,0.5\n"
+
+        (created, failed, errors), run = self.copy("product", csv_text, delete_existing=True)
+
+        self.assertEqual((created, failed, errors), (2, 0, []))
+        self.assertEqual(
+            sorted(Product.objects.values_list("sku", "price", "stock_quantity")),
+            [("G-1", Decimal("1000.50"), 7), ("W-1", Decimal("10.00"), 5)],
+        )
+
+    def test_orders_with_errors(self):
+        customer = Customer.objects.create(name="Order Tester", email="orders@example.com")
+        product = Product.objects.create(name="Widget", sku="W-1", price=10, stock_quantity=5)
+        csv_text = (
+            "customer_email,product_sku,quantity,order_date,status,total_amount\n"
+            "Orders@Example.com,W-1,3,2024-02-14 09:30:00,Delivered,30.00\n"
+            "orders@example.com,W-1,3,2024-02-15,pending,30.00\n"
+            "nobody@example.com,W-1,1,2024-02-16,pending,10.00\n"
+            "orders@example.com,W-1,1,2099-01-01,pending,10.00\n"
+        )
+
+        (created, failed, errors), run = self.copy("order", csv_text)
+
+        self.assertEqual((created, failed), (1, 3))
+        self.assertEqual(
+            dict(ImportRowError.objects.filter(run=run).values_list("row_number", "code")),
+            {3: "insufficient_stock", 4: "customer_not_found", 5: "validation"},
+        )
+        order = Order.objects.get()
+        self.assertEqual((order.customer, order.quantity, order.status), (customer, 3, "delivered"))
+        self.assertEqual(product.available_stock(), 2)
+        self.assertEqual(customer.stats.order_count, 1)
+
+        # the same file again updates the existing order instead of adding one
+        (created, failed, errors), run = self.copy("order", csv_text)
+        self.assertEqual((created, Order.objects.count()), (0, 1))
+        self.assertEqual(InventoryMovement.objects.count(), 1)
+
+    def test_dry_run_writes_nothing(self):
+        (created, failed, errors), run = self.copy("customer", CUSTOMERS_CSV, dry_run=True)
+        self.assertEqual((created, failed), (1, 1))
+        self.assertFalse(Customer.objects.exists())
+        # the row errors of a dry run are kept
+        self.assertEqual(ImportRowError.objects.filter(run=run).count(), 1)
+
+    def test_dry_run_replace_counts_as_if_deleted(self):
+        Customer.objects.create(name="John William", email="john@example.com", phone="123-456-7890", address="1 Main Street")
+        Customer.objects.create(name="Someone Else", email="else@example.com")
+
+        (created, failed, errors), run = self.copy("customer", CUSTOMERS_CSV, delete_existing=True, dry_run=True)
+
+        self.assertEqual((created, failed, run.unchanged_count), (1, 1, 0))
+        self.assertEqual(Customer.objects.count(), 2)
+
+    def test_fatal_error_fails_the_run(self):
+        # an SKU longer than the column passes no rule that would catch it, the INSERT fails
+        with mock.patch.dict("pages.copy_import.RULES", {"product": []}):
+            (created, failed, errors), run = self.copy(
+                "product", f"name,sku,description,price,stock_quantity,weight\nWidget,{'W' * 60},,1,1,\n"
+            )
+        self.assertEqual((created, failed, run.status), (0, 0, "failed"))
+        self.assertIn("value too long", errors[0])
+        self.assertFalse(Product.objects.exists())
+
+
+class ChunkedUploadTests(TestCase):
+    def setUp(self):
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(
+            override_settings(
+                IMPORT_UPLOAD_DIR=os.path.join(directory, "uploads"),
+                ERROR_LOG_DIR=os.path.join(directory, "logs"),
+                IMPORT_CHUNK_SIZE=32,
+            )
+        )
+        # run the background import inline, the pool thread would not see the test transaction
+        self.background = self.enterContext(
+            mock.patch("pages.views.run_in_background", side_effect=lambda pool, func, *args: func(*args))
+        )
+        self.data = CUSTOMERS_CSV.encode("utf-8")
+
+    def start(self, data=None):
+        data = self.data if data is None else data
+        response = self.client.post(
+            reverse("pages:chunked_upload_start"),
+            {"model_type": "customer", "file_name": "customers.csv", "file_size": len(data),
+             "sha256": hashlib.sha256(data).hexdigest()},
+        )
+        self.assertEqual(response.status_code, 201)
+        return response.json()
+
+    def send(self, state, data=None):
+        data = self.data if data is None else data
+        for index in range(state["total_chunks"]):
+            chunk = data[index * 32 : (index + 1) * 32]
+            response = self.client.post(
+                reverse("pages:chunked_upload_chunk", args=[state["upload_id"], index]),
+                {"chunk": SimpleUploadedFile("chunk", chunk)},
+            )
+            self.assertEqual(response.status_code, 200)
+
+    def complete(self, state):
+        return self.client.post(reverse("pages:chunked_upload_complete", args=[state["upload_id"]]))
+
+    def test_complete_imports_in_the_background(self):
+        state = self.start()
+        self.assertEqual(state["missing"], list(range(state["total_chunks"])))
+        self.assertEqual(self.complete(state).status_code, 400)
+
+        self.send(state)
+        response = self.complete(state)
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(self.background.call_count, 1)
+        status = self.client.get(response.json()["status_url"]).json()
+        self.assertEqual(status["status"], "complete")
+        self.assertEqual(status["received"], list(range(state["total_chunks"])))
+        self.assertEqual(status["missing"], [])
+        self.assertEqual(
+            (status["import_status"], status["success_count"], status["error_count"]), ("completed", 1, 1)
+        )
+        self.assertTrue(Customer.objects.filter(email="john@example.com").exists())
+        self.assertFalse(os.path.exists(ImportRun.objects.get().upload_path))
+
+    def test_second_complete_is_rejected(self):
+        state = self.start()
+        self.send(state)
+        self.assertEqual(self.complete(state).status_code, 202)
+        self.assertEqual(self.complete(state).status_code, 409)
+        self.assertEqual(self.background.call_count, 1)
+
+    def test_complete_loses_the_claim_to_a_concurrent_call(self):
+        state = self.start()
+        self.send(state)
+        # another request claims the upload between this one's status check and its claim
+        upload_state = views._chunked_upload_state
+
+        def claimed_meanwhile(upload):
+            ChunkedUpload.objects.filter(upload_id=state["upload_id"]).update(status="complete")
+            return upload_state(upload)
+
+        with mock.patch("pages.views._chunked_upload_state", side_effect=claimed_meanwhile):
+            response = self.complete(state)
+        self.assertEqual(response.status_code, 409)
+        self.background.assert_not_called()
+
+    def test_undecodable_file_records_a_failed_run(self):
+        state = self.start()
+        self.send(state)
+        with mock.patch("pages.views.detect_encoding", return_value=None):
+            response = self.complete(state)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["error"], "Unable to decode the file. Please use UTF-8 encoding.")
+        status = self.client.get(reverse("pages:chunked_upload_status", args=[state["upload_id"]])).json()
+        self.assertEqual((status["status"], status["import_status"]), ("complete", "failed"))
+        self.assertEqual(ImportRun.objects.get().upload_path, "")
+        self.assertEqual(self.complete(state).status_code, 409)
+        self.background.assert_not_called()
+
+    def test_checksum_mismatch_reopens_the_upload(self):
+        state = self.start()
+        self.send(state, self.data.replace(b"John", b"Jack"))
+
+        response = self.complete(state)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Checksum mismatch", response.json()["error"])
+        self.assertEqual(ChunkedUpload.objects.get(upload_id=state["upload_id"]).status, "uploading")
+        self.send(state)
+        self.assertEqual(self.complete(state).status_code, 202)
+
+
+class StoredUploadRetentionTests(TestCase):
+    def setUp(self):
+        self.directory = self.enterContext(tempfile.TemporaryDirectory())
+        self.upload_dir = os.path.join(self.directory, "uploads")
+        os.makedirs(os.path.join(self.upload_dir, "chunks"))
+        self.enterContext(override_settings(IMPORT_UPLOAD_DIR=self.upload_dir, ERROR_LOG_DIR=os.path.join(self.directory, "logs")))
+
+    def stored(self, name, age_hours=2, directory=None):
+        path = os.path.join(directory or self.upload_dir, name)
+        with open(path, "wb") as f:
+            f.write(b"x" * 100)
+        mtime = time.time() - age_hours * 3600
+        os.utime(path, (mtime, mtime))
+        return path
+
+    def test_release_keeps_uploads_other_runs_need(self):
+        path = self.stored("shared.csv")
+        first = ImportRun.objects.create(model_type="customer", upload_path=path, status="completed")
+        second = ImportRun.objects.create(model_type="customer", upload_path=path, status="failed")
+        self.assertFalse(release_stored_upload(first))
+        second.status = "completed"
+        second.save()
+        self.assertTrue(release_stored_upload(first))
+        self.assertFalse(os.path.exists(path))
+
+        # import_data points the run at the source file, which is never deleted
+        source = self.stored("source.csv", directory=self.directory)
+        self.assertFalse(release_stored_upload(ImportRun(model_type="customer", upload_path=source, status="completed")))
+        self.assertTrue(os.path.exists(source))
+
+    def test_prune_deletes_what_no_run_can_resume(self):
+        completed = self.stored("completed.csv")
+        ImportRun.objects.create(model_type="customer", upload_path=completed, status="completed")
+        failed = self.stored("failed.csv")
+        ImportRun.objects.create(model_type="customer", upload_path=failed, status="failed")
+        failed_dry_run = self.stored("dry-run.csv")
+        ImportRun.objects.create(model_type="customer", upload_path=failed_dry_run, status="failed", dry_run=True)
+        running = self.stored("running.csv")
+        ImportRun.objects.create(model_type="customer", upload_path=running)
+        expired = self.stored("expired.csv", age_hours=24 * 10)
+        ImportRun.objects.create(model_type="customer", upload_path=expired, status="failed")
+        unclaimed = self.stored("unclaimed.csv", age_hours=0)
+        partial = self.stored("copy.csv.1234.tmp")
+
+        self.assertEqual(
+            prune_stored_uploads(max_age_days=7, dry_run=True), ([completed, partial, failed_dry_run, expired], 300)
+        )
+        self.assertTrue(os.path.exists(completed))
+
+        stdout = io.StringIO()
+        call_command("prune_error_logs", "--upload-max-age-days", "7", stdout=stdout)
+        self.assertIn("0 chunked upload(s) and 4 stored upload(s) deleted, 0.0MB kept", stdout.getvalue())
+        self.assertEqual(
+            sorted(os.listdir(self.upload_dir)), ["chunks", os.path.basename(failed), os.path.basename(running), os.path.basename(unclaimed)]
+        )
+
+    def chunk_dir(self, upload_id, age_hours):
+        directory = os.path.join(self.upload_dir, "chunks", str(upload_id))
+        os.makedirs(directory)
+        self.stored("000000.part", age_hours=age_hours, directory=directory)
+        mtime = time.time() - age_hours * 3600
+        os.utime(directory, (mtime, mtime))
+
+    def test_prune_abandoned_chunked_uploads(self):
+        def upload(age_days, status="uploading"):
+            upload = ChunkedUpload.objects.create(
+                model_type="customer", file_name="customers.csv", file_size=100, file_sha256="0" * 64,
+                chunk_size=32, status=status,
+            )
+            ChunkedUpload.objects.filter(pk=upload.pk).update(created_at=timezone.now() - timedelta(days=age_days))
+            return upload
+
+        abandoned = upload(10)
+        self.chunk_dir(abandoned.upload_id, age_hours=24 * 9)
+        never_sent = upload(10)
+        # started long ago, a chunk arrived an hour ago
+        active = upload(10)
+        self.chunk_dir(active.upload_id, age_hours=1)
+        complete = upload(10, status="complete")
+        orphan, fresh_orphan = uuid.uuid4(), uuid.uuid4()
+        self.chunk_dir(orphan, age_hours=2)
+        self.chunk_dir(fresh_orphan, age_hours=0)
+
+        expected = sorted(str(upload_id) for upload_id in (abandoned.upload_id, never_sent.upload_id, orphan))
+        self.assertEqual(prune_chunked_uploads(7, dry_run=True), expected)
+        self.assertEqual(ChunkedUpload.objects.count(), 4)
+
+        stdout = io.StringIO()
+        call_command("prune_error_logs", stdout=stdout)
+        self.assertIn("3 chunked upload(s) and 0 stored upload(s) deleted", stdout.getvalue())
+        self.assertEqual(
+            sorted(ChunkedUpload.objects.values_list("pk", flat=True)), sorted([active.pk, complete.pk])
+        )
+        self.assertEqual(
+            sorted(os.listdir(os.path.join(self.upload_dir, "chunks"))), sorted([str(active.upload_id), str(fresh_orphan)])
+        )
+
+
+class ImportDataShardTests(TestCase):
+    def test_orders_of_one_product_land_in_one_shard(self):
+        rows = [
+            f"customer{index}@example.com,{sku},1,2024-01-01 10:00:00,pending,10.00"
+            for index in range(20)
+            for sku in ("SKU-A", "sku-b ", "SKU-C")
+        ]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "orders.csv")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("customer_email,product_sku,quantity,order_date,status,total_amount\n" + "\n".join(rows) + "\n")
+            shards = ImportDataCommand().shard(path, "utf-8", "order", 4, directory)
+            skus_per_shard = []
+            for shard in shards:
+                with open(shard, encoding="utf-8") as f:
+                    next(f)
+                    skus_per_shard.append({line.split(",")[1].strip().lower() for line in f})
+        self.assertEqual(sorted(sku for skus in skus_per_shard for sku in skus), ["sku-a", "sku-b", "sku-c"])
+
+    def test_shard_runs_count_as_clean_only_together(self):
+        group = uuid.uuid4()
+        runs = [
+            ImportRun.objects.create(model_type="order", file_sha256="abc", shard_group=group, status=status, error_count=errors)
+            for status, errors in [("completed", 0), ("completed", 2)]
+        ]
+        self.assertIsNone(find_clean_import("abc", "order"))
+
+        ImportRun.objects.filter(pk=runs[1].pk).update(error_count=0)
+        self.assertIn(find_clean_import("abc", "order"), runs)
+
+        ImportRun.objects.create(model_type="order", file_sha256="abc", shard_group=group, status="running")
+        self.assertIsNone(find_clean_import("abc", "order"))
+
+
+class ErrorLogDownloadTests(TestCase):
+    def setUp(self):
+        self.directory = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(ERROR_LOG_DIR=self.directory))
+
+    def write_log(self, name, size, age_days=0):
+        path = os.path.join(self.directory, name)
+        with open(path, "wb") as f:
+            f.write(bytes(range(256)) * (size // 256) + bytes(size % 256))
+        mtime = time.time() - age_days * 86400
+        os.utime(path, (mtime, mtime))
+        return path
+
+    def test_parse_range(self):
+        self.assertIsNone(views._parse_range(None, 100))
+        self.assertEqual(views._parse_range("bytes=0-9", 100), (0, 9))
+        self.assertEqual(views._parse_range("bytes=90-", 100), (90, 99))
+        # suffix ranges are the last N bytes, all of a shorter file
+        self.assertEqual(views._parse_range("bytes=-10", 100), (90, 99))
+        self.assertEqual(views._parse_range("bytes=-500", 100), (0, 99))
+        # an end past EOF is clipped, a start past EOF cannot be served
+        self.assertEqual(views._parse_range("bytes=50-999", 100), (50, 99))
+        with self.assertRaises(ValueError):
+            views._parse_range("bytes=100-", 100)
+        with self.assertRaises(ValueError):
+            views._parse_range("bytes=20-10", 100)
+        # multiple ranges and malformed headers get the whole file
+        self.assertIsNone(views._parse_range("bytes=0-9,20-29", 100))
+        self.assertIsNone(views._parse_range("bytes=a-b", 100))
+        self.assertIsNone(views._parse_range("items=0-9", 100))
+
+    def test_download_ranges(self):
+        path = self.write_log("import_errors_customer_1.txt", 1000)
+        with open(path, "rb") as f:
+            data = f.read()
+        url = reverse("pages:download_error_log", args=["import_errors_customer_1.txt"])
+
+        response = self.client.get(url, headers={"Range": "bytes=-100"})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], "bytes 900-999/1000")
+        self.assertEqual(b"".join(response.streaming_content), data[900:])
+
+        response = self.client.get(url, headers={"Range": "bytes=1000-"})
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], "bytes */1000")
+
+        response = self.client.get(url, headers={"Range": "bytes=0-9,20-29"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), data)
+
+        self.assertEqual(self.client.get(reverse("pages:download_error_log", args=["settings.py"])).status_code, 404)
+
+    def test_prune_error_logs(self):
+        old = self.write_log("import_errors_customer_old.txt", 100, age_days=40)
+        older_big = self.write_log("import_errors_order_big.txt.gz", 3000, age_days=5)
+        new = self.write_log("import_errors_product_new.txt", 500)
+        other = self.write_log("notes.txt", 100, age_days=400)
+
+        self.assertEqual(prune_error_logs(self.directory, max_age_days=30, dry_run=True), ([old], 3500))
+        self.assertTrue(os.path.exists(old))
+
+        self.assertEqual(prune_error_logs(self.directory, max_age_days=30, max_total_bytes=1000), ([old, older_big], 500))
+        self.assertEqual(sorted(os.listdir(self.directory)), [os.path.basename(new), os.path.basename(other)])
+        self.assertEqual(prune_error_logs(os.path.join(self.directory, "missing")), ([], 0))
+
+
+class ImportErrorsViewTests(TestCase):
+    def setUp(self):
+        self.run = ImportRun.objects.create(model_type="customer")
+        other = ImportRun.objects.create(model_type="product")
+        for row_number in range(2, 7):
+            ImportRowError.objects.create(run=self.run, model_type="customer", row_number=row_number, field="email", code="validation", message="Enter a valid email address.")
+        ImportRowError.objects.create(run=self.run, model_type="customer", row_number=7, code="empty_row", message="Empty row")
+        ImportRowError.objects.create(run=other, model_type="product", row_number=2, field="price", code="invalid_number", message="Invalid price")
+
+    def get(self, **params):
+        return self.client.get(reverse("pages:import_errors"), params)
+
+    def test_filters(self):
+        rows = self.get(run=self.run.pk, code="validation").json()["results"]
+        self.assertEqual([row["row_number"] for row in rows], [6, 5, 4, 3, 2])
+        self.assertEqual(self.get(model_type="product", field="price").json()["results"][0]["message"], "Invalid price")
+        self.assertEqual(self.get(since="2999-01-01T00:00:00").json()["results"], [])
+        self.assertEqual(len(self.get(until="2999-01-01T00:00:00").json()["results"]), 7)
+
+    def test_keyset_pages(self):
+        seen = []
+        page = self.get(run=self.run.pk, limit=4).json()
+        while True:
+            seen.extend(row["row_number"] for row in page["results"])
+            if page["next_after"] is None:
+                break
+            page = self.get(run=self.run.pk, limit=4, after=page["next_after"]).json()
+        self.assertEqual(seen, [7, 6, 5, 4, 3, 2])
+
+    def test_bad_parameters(self):
+        self.assertEqual(self.get(run="x").status_code, 400)
+        self.assertEqual(self.get(limit="ten").status_code, 400)
+        self.assertEqual(self.get(since="yesterday").status_code, 400)
+
+
+class ResumeOffsetTests(TestCase):
+    # one CSV row each, the quoted address spans two lines
+    LINES = [
+        "name,email,phone,address\r\n",
+        "Zoë Brontë,zoe@example.com,,1 Rue Été\r\n",
+        'Ann Lee,ann@example.com,,"2 Main Street\r\nFlat 3"\r\n',
+        "Bob Ray,bob@example.com,,4 Main Street\r\n",
+    ]
+
+    def setUp(self):
+        self.directory = self.enterContext(tempfile.TemporaryDirectory())
+
+    def write(self, encoding, lines=LINES):
+        path = os.path.join(self.directory, f"{encoding}.csv")
+        with open(path, "wb") as f:
+            f.write("".join(lines).encode(encoding))
+        return path
+
+    def expected_offsets(self, encoding, lines=LINES):
+        # the byte position after each row, the header included
+        offset = 3 if encoding == "utf-8-sig" else 0  # the BOM
+        offsets = []
+        for line in lines:
+            offset += len(line.encode("utf-8" if encoding == "utf-8-sig" else encoding))
+            offsets.append(offset)
+        return offsets
+
+    def read(self, lines, encoding, offset=0):
+        tracker = OffsetTrackingLines(lines, encoding, offset)
+        return [(row, tracker.offset) for row in csv.reader(tracker)]
+
+    def test_offsets_count_encoded_bytes(self):
+        for encoding in ("utf-8", "utf-8-sig", "latin-1"):
+            with self.subTest(encoding=encoding), open(self.write(encoding), encoding=encoding, newline="") as f:
+                rows = self.read(f, encoding)
+            self.assertEqual([offset for _, offset in rows], self.expected_offsets(encoding))
+            self.assertEqual(rows[2][0][3], "2 Main Street\r\nFlat 3")
+
+    def test_stored_upload_resumes_at_each_checkpoint(self):
+        for encoding in ("utf-8", "utf-8-sig", "latin-1"):
+            path = self.write(encoding)
+            with open(path, encoding=encoding, newline="") as f:
+                full = self.read(f, encoding)
+            for index, (_, checkpoint) in enumerate(full):
+                with self.subTest(encoding=encoding, checkpoint=checkpoint):
+                    with open_stored_upload(path, encoding, checkpoint) as (lines, base_offset):
+                        resumed = self.read(lines, encoding, base_offset)
+                    self.assertEqual(resumed[0][0], full[0][0])
+                    self.assertEqual(resumed[1:], full[index + 1:])
+
+    def test_import_resumes_after_the_last_committed_batch(self):
+        # the importers sniff the delimiter, which CRLF and a quoted line break can fool
+        lines = [line.replace("\r\n", "\n") for line in self.LINES]
+        path = self.write("utf-8", lines)
+        run = ImportRun.objects.create(model_type="customer", upload_path=path, encoding="utf-8")
+        error_log_path = os.path.join(self.directory, "errors.txt")
+        calls = []
+
+        def crash_in_second_batch(*args):
+            calls.append(args)
+            save_import_checkpoint(*args)
+            if len(calls) == 2:
+                # the batch and its checkpoint roll back, the instance keeps the new counters
+                raise RuntimeError("worker killed")
+
+        with open(path, encoding="utf-8", newline="") as f, self.assertLogs("customers.views", "ERROR"):
+            with mock.patch("customers.views.save_import_checkpoint", side_effect=crash_in_second_batch):
+                result = import_customers_with_validation(f, error_log_path, import_run=run, batch_size=1)
+        self.assertEqual(result, (0, 0, ["Fatal error: worker killed"]))
+        finish_import_run(run, *result)
+        run.refresh_from_db()
+        self.assertEqual(
+            (run.status, run.checkpoint_row, run.checkpoint_offset, run.success_count),
+            ("failed", 2, self.expected_offsets("utf-8", lines)[1], 1),
+        )
+
+        stdout = io.StringIO()
+        with override_settings(ERROR_LOG_DIR=self.directory):
+            call_command("resume_import", run.pk, stdout=stdout)
+        run.refresh_from_db()
+        self.assertIn(f"Import #{run.pk} completed: 3 successful, 0 failed.", stdout.getvalue())
+        self.assertEqual((run.status, run.success_count), ("completed", 3))
+        self.assertEqual(run.checkpoint_offset, self.expected_offsets("utf-8", lines)[-1])
+        self.assertEqual(
+            sorted(Customer.objects.values_list("email", flat=True)), ["ann@example.com", "bob@example.com", "zoe@example.com"]
+        )
+
+
+class RowProjectionTests(TestCase):
+    FIELDS = ["name", "email", "phone", "address"]
+
+    def test_columns_are_matched_by_name(self):
+        project = RowProjection(["\ufeffE-Mail", " Name ", "Notes", "name", "Phone"], ["name", "e_mail", "phone", "address"])
+        self.assertEqual(project.mapping, {"name": 1, "e_mail": 0, "phone": 4})
+        self.assertEqual(project.missing, ["address"])
+        self.assertEqual((project.unknown, project.duplicates), (["Notes"], ["name"]))
+        self.assertEqual(
+            project([" a@example.com ", " Ann ", "x", "Other", ""]),
+            {"name": "Ann", "e_mail": "a@example.com", "phone": "", "address": ""},
+        )
+        self.assertEqual(len(project.warnings()), 3)
+
+    def test_short_rows_are_padded(self):
+        project = RowProjection(["email", "name", "address"], self.FIELDS)
+        self.assertEqual(project(["a@example.com"]), {"email": "a@example.com", "name": "", "address": "", "phone": ""})
+
+    def test_single_column(self):
+        project = RowProjection(["email"], self.FIELDS)
+        self.assertEqual(project(["a@example.com", "extra"])["email"], "a@example.com")
+
+    def test_unnamed_header_is_read_by_position(self):
+        project = RowProjection(["Full name", "Mail", "Tel"], self.FIELDS)
+        self.assertTrue(project.positional)
+        self.assertEqual(project.mapping, {"name": 0, "email": 1, "phone": 2})
+        self.assertEqual(project.unknown, [])
+        self.assertIn("reading columns by position", project.warnings()[0])
+
+    def test_missing_required(self):
+        self.assertEqual(RowProjection(["name", "phone"], self.FIELDS).missing_required(CustomerCSVForm), ["email"])
+        self.assertEqual(RowProjection(["email"], self.FIELDS).missing_required(CustomerCSVForm), ["name"])
+
+
+@skipUnless(HAS_NUMPY, "parse_numeric_columns needs NumPy")
+class NumericColumnsTests(TestCase):
+    # value -> whether the columnar check passes it for a price (8 whole digits, 2 places)
+    PRICES = {
+        "10": True,
+        "10.50": True,
+        "$1,234.50": True,
+        "€ 3": True,
+        "007.10": True,
+        "12.": True,
+        "99999999.990": True,
+        "": True,
+        "1.999": False,  # too many places, the form reports it
+        "123456789": False,  # too many whole digits
+        "-5": False,
+        "1e3": False,
+        ".5": False,
+        "١٢": False,  # non-ASCII digits
+        "abc": False,
+        "1.2.3": False,
+    }
+
+    def test_passed_values_match_parse_numeric_string(self):
+        raw = list(self.PRICES)
+        values, ok = parse_numeric_columns({"price": raw}, {"price": ("float", 8, 2, None)})
+        self.assertEqual(dict(zip(raw, ok.tolist())), self.PRICES)
+        for value, number, passed in zip(raw, values["price"], ok.tolist()):
+            if passed:
+                self.assertEqual(number, parse_numeric_string(value, "float"), value)
+
+    def test_int_fields_drop_the_fraction(self):
+        raw = ["12", "12.9", "1,000", "", "0012"]
+        values, ok = parse_numeric_columns({"qty": raw}, {"qty": ("int", 9, None, 0)})
+        self.assertTrue(ok.all())
+        self.assertEqual(values["qty"], [parse_numeric_string(value, "int") for value in raw])
+
+    def test_a_row_passes_only_when_every_field_does(self):
+        columns = {"price": ["1.00", "2.00", "x"], "stock": ["1", "y", "3"]}
+        values, ok = parse_numeric_columns(columns, {"price": ("float", 8, 2, 0.0), "stock": ("int", 9, None, 0)})
+        self.assertEqual(ok.tolist(), [True, False, False])
+        self.assertEqual((values["price"][0], values["stock"][0]), (1.0, 1))
+
+    def test_product_import_matches_the_row_by_row_path(self):
+        rows = "".join(
+            f"Item {index},SKU-{index},,{price},{stock},{weight}\n"
+            for index, (price, stock, weight) in enumerate(
+                [("10.00", "5", ""), ('"$1,234.5"', "3.7", "0.250"), ("1.999", "1", ""), ("abc", "1", ""),
+                 ("5", "-2", ""), ("7", "2", "1e3"), ("", "", ""), ("3", "1", "123456.5")]
+            )
+        )
+        csv_text = "name,sku,description,price,stock_quantity,weight\n" + rows
+        results = {}
+        for columnar in (False, True):
+            with self.subTest(columnar=columnar), override_settings(IMPORT_COLUMNAR_NUMERICS=columnar):
+                with tempfile.TemporaryDirectory() as directory:
+                    counts = import_products_with_validation(io.StringIO(csv_text), os.path.join(directory, "errors.txt"))[:2]
+                results[columnar] = (counts, list(Product.objects.order_by("sku").values_list("sku", "price", "stock_quantity", "weight")))
+                Product.objects.all().delete()
+        self.assertEqual(results[False][0], (4, 4))
+        self.assertEqual(results[True], results[False])
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customers = [
+            Customer.objects.create(name="Zoë Brontë", email="zoe@example.com", phone="555-0100"),
+            Customer.objects.create(name="Ann Lee", email="ann@example.com", address="2 Main Street"),
+        ]
+        cls.widget = Product.objects.create(name="Widget", sku="W-1", price=Decimal("10.50"), stock_quantity=20, weight=Decimal("0.250"))
+        cls.gadget = Product.objects.create(name="Gadget", sku="G-1", price=Decimal("3.00"), stock_quantity=5)
+        cls.orders = [
+            Order.objects.create(
+                customer=cls.customers[index % 2], product=cls.widget if index % 3 else cls.gadget, quantity=1,
+                order_date=f"2024-01-{index + 1:02d}T10:00:00Z", status="pending" if index % 2 else "delivered",
+                total_amount=Decimal("10.50") if index % 3 else Decimal("3.00"),
+            )
+            for index in range(5)
+        ]
+
+    def export(self, model_type, **params):
+        response = self.client.get(reverse("pages:export_csv", args=[model_type]), params)
+        content = b"".join(response.streaming_content) if response.streaming else response.content
+        return response, content
+
+    def test_jsonl_has_typed_values(self):
+        response, content = self.export("product", format="jsonl")
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        self.assertEqual(response["Content-Disposition"], 'attachment; filename="products.jsonl"')
+        lines = content.decode("utf-8").splitlines()
+        # decimals are exact JSON numbers, not floats
+        self.assertIn('"price": 10.50, "stock_quantity": 17, "weight": 0.250}', lines[0])
+        records = [json.loads(line, parse_float=Decimal) for line in lines]
+        self.assertEqual(
+            records,
+            [
+                {"name": "Widget", "sku": "W-1", "description": None, "price": Decimal("10.50"), "stock_quantity": 17, "weight": Decimal("0.250")},
+                {"name": "Gadget", "sku": "G-1", "description": None, "price": Decimal("3.00"), "stock_quantity": 3, "weight": None},
+            ],
+        )
+        self.assertIn("Zoë Brontë", self.export("customer", format="jsonl")[1].decode("utf-8"))
+
+    @skipUnless(views.pa is not None, "the Parquet export needs pyarrow")
+    def test_parquet_row_groups_and_types(self):
+        with override_settings(EXPORT_PARQUET_ROW_GROUP_SIZE=2):
+            response, content = self.export("order", format="parquet")
+        self.assertEqual(response["Content-Disposition"], 'attachment; filename="orders.parquet"')
+        parquet = views.pq.ParquetFile(io.BytesIO(content))
+        self.assertEqual(parquet.metadata.num_row_groups, 3)
+        table = parquet.read()
+        self.assertEqual(str(table.schema.field("total_amount").type), "decimal128(12, 2)")
+        self.assertEqual(table.column("product_sku").to_pylist(), ["G-1", "W-1", "W-1", "G-1", "W-1"])
+        self.assertEqual(table.column("total_amount").to_pylist()[0], Decimal("3.00"))
+        self.assertEqual(table.column("order_date").to_pylist()[4].isoformat(), "2024-01-05T10:00:00+00:00")
+
+    def order_rows(self, **params):
+        response, content = self.export("order", **params)
+        self.assertEqual(response.status_code, 200, content)
+        rows = list(csv.reader(io.StringIO(content.decode("utf-8"))))
+        self.assertEqual(rows[0][0], "customer_email")
+        return response, [row[3][:10] for row in rows[1:]]  # the order dates identify the orders
+
+    def test_order_filters(self):
+        self.assertEqual(self.order_rows(date_from="2024-01-02", date_to="2024-01-04")[1], ["2024-01-02", "2024-01-03", "2024-01-04"])
+        self.assertEqual(self.order_rows(date_from="2024-01-04T10:00:00Z")[1], ["2024-01-04", "2024-01-05"])
+        self.assertEqual(self.order_rows(status="pending, shipped")[1], ["2024-01-02", "2024-01-04"])
+        self.assertEqual(self.order_rows(customer=" ANN@example.com")[1], ["2024-01-02", "2024-01-04"])
+        self.assertEqual(self.order_rows(sku="G-1", status="delivered")[1], ["2024-01-01"])
+        for params in ({"status": "lost"}, {"date_from": "last week"}, {"after": "x"}, {"limit": "0"}):
+            with self.subTest(params=params):
+                self.assertEqual(self.export("order", **params)[0].status_code, 400)
+
+    def test_keyset_pages_cover_the_export_once(self):
+        dates = []
+        params = {"limit": 2}
+        while True:
+            response, page = self.order_rows(**params)
+            dates.extend(page)
+            if "X-Next-After" not in response:
+                self.assertNotIn("Link", response)
+                break
+            self.assertEqual(len(page), 2)
+            self.assertIn(f"after={response['X-Next-After']}", response["Link"])
+            params["after"] = response["X-Next-After"]
+        self.assertEqual(dates, self.order_rows()[1])
+        self.assertEqual(len(dates), 5)
+
+    def test_keyset_after_is_exclusive(self):
+        pks = sorted(order.pk for order in self.orders)
+        self.assertEqual(self.order_rows(after=pks[2])[1], ["2024-01-04", "2024-01-05"])
+        self.assertEqual(self.order_rows(after=pks[-1])[1], [])
+
+    def customer_changes(self, **params):
+        response, content = self.export("customer", **params)
+        self.assertEqual(response.status_code, 200, content)
+        emails = [row[1] for row in list(csv.reader(io.StringIO(content.decode("utf-8"))))[1:]]
+        return emails, {"since": response["X-Next-Since"], "since_id": response["X-Next-Since-Id"]}
+
+    def test_since_exports_changes_after_the_watermark(self):
+        base = timezone.now() - timedelta(hours=1)
+        extra = Customer.objects.create(name="Bob Ray", email="bob@example.com")
+        zoe, ann = self.customers
+        # ann and bob changed at the same moment, the pk breaks the tie
+        Customer.objects.filter(pk=zoe.pk).update(updated_at=base)
+        Customer.objects.filter(pk__in=[ann.pk, extra.pk]).update(updated_at=base + timedelta(minutes=5))
+        just_now = Customer.objects.create(name="Cy Young", email="cy@example.com")  # inside the lag
+
+        emails, watermark = self.customer_changes(since=(base - timedelta(minutes=1)).isoformat())
+        self.assertEqual(emails, ["zoe@example.com", "ann@example.com", "bob@example.com"])
+        self.assertEqual(watermark["since_id"], str(extra.pk))
+
+        self.assertEqual(self.customer_changes(since=base.isoformat(), since_id=zoe.pk)[0], ["ann@example.com", "bob@example.com"])
+        self.assertEqual(
+            self.customer_changes(since=(base + timedelta(minutes=5)).isoformat(), since_id=ann.pk)[0], ["bob@example.com"]
+        )
+        # nothing new: the same watermark comes back
+        self.assertEqual(self.customer_changes(**watermark), ([], watermark))
+
+        # a later change, including the row that was inside the lag, shows up after the watermark
+        Customer.objects.filter(pk__in=[zoe.pk, just_now.pk]).update(updated_at=base + timedelta(minutes=10))
+        emails, watermark = self.customer_changes(**watermark)
+        self.assertEqual(emails, ["zoe@example.com", "cy@example.com"])
+
+    def test_since_pages_follow_the_watermark(self):
+        base = timezone.now() - timedelta(hours=1)
+        for index, customer in enumerate(self.customers):
+            Customer.objects.filter(pk=customer.pk).update(updated_at=base + timedelta(minutes=index))
+        response, content = self.export("customer", since=(base - timedelta(minutes=1)).isoformat(), limit=1)
+        self.assertIn("zoe@example.com", content.decode("utf-8"))
+        self.assertIn("since_id=", response["Link"])
+        emails, _ = self.customer_changes(since=response["X-Next-Since"], since_id=response["X-Next-Since-Id"], limit=1)
+        self.assertEqual(emails, ["ann@example.com"])
+        self.assertEqual(self.export("customer", since="not a date")[0].status_code, 400)
+
+    def test_unknown_format(self):
+        response, content = self.export("order", format="xlsx")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(b"use one of: csv, jsonl, parquet", content)
+
+
+class SQLiteProfileTests(TestCase):
+    def sqlite_settings(self, **env):
+        path = os.path.join(self.enterContext(tempfile.TemporaryDirectory()), "bench.sqlite3")
+        environ = {"DB_ENGINE": "sqlite", "DB_NAME": path, **env}
+        with mock.patch.dict(os.environ, environ):
+            return runpy.run_path(os.path.join(settings.BASE_DIR, "config", "settings.py"))["DATABASES"]["default"]
+
+    def test_pragmas_apply_to_new_connections(self):
+        database = self.sqlite_settings(DB_SQLITE_CACHE_MB="8", DB_SQLITE_MMAP_MB="16", DB_SQLITE_TIMEOUT="5")
+        self.assertEqual(database["ENGINE"], "django.db.backends.sqlite3")
+        self.assertEqual(database["OPTIONS"]["timeout"], 5)
+
+        sqlite = ConnectionHandler({"default": database})["default"]
+        self.addCleanup(sqlite.close)
+        with sqlite.cursor() as cursor:
+            pragmas = {}
+            for pragma in ("journal_mode", "synchronous", "cache_size", "mmap_size", "temp_store"):
+                cursor.execute(f"PRAGMA {pragma}")
+                pragmas[pragma] = cursor.fetchone()[0]
+        self.assertEqual(
+            pragmas,
+            {"journal_mode": "wal", "synchronous": 1, "cache_size": -8 * 1024, "mmap_size": 16 * 1024 * 1024, "temp_store": 2},
+        )
+
+        # IMMEDIATE: the write lock is taken when the transaction starts, not at its first write
+        sqlite.set_autocommit(False, force_begin_transaction_with_broken_autocommit=True)  # what atomic() does
+        other = sqlite3.connect(database["NAME"], timeout=0)
+        self.addCleanup(other.close)
+        with self.assertRaisesMessage(sqlite3.OperationalError, "database is locked"):
+            other.execute("BEGIN IMMEDIATE")
+        sqlite.rollback()
+        sqlite.set_autocommit(True)
+        other.execute("BEGIN IMMEDIATE")
+        other.rollback()
+
+    def test_postgresql_stays_the_default(self):
+        with mock.patch.dict(os.environ, {"DB_ENGINE": "postgresql"}):
+            database = runpy.run_path(os.path.join(settings.BASE_DIR, "config", "settings.py"))["DATABASES"]["default"]
+        self.assertEqual(database["ENGINE"], "django.db.backends.postgresql")
+
+
+class ImportProfilerTests(TestCase):
+    def test_time_is_charged_to_the_phase_being_left(self):
+        wall = iter([0.0, 1.0, 1.5, 4.0, 4.25, 10.0, 10.0])
+        cpu = iter([0.0, 0.5, 1.0, 1.0, 1.25, 2.0])
+        with mock.patch("pages.helper.time.perf_counter", side_effect=lambda: next(wall)), \
+                mock.patch("pages.helper.time.thread_time", side_effect=lambda: next(cpu)):
+            profiler = ImportProfiler("Test import", trace_memory=False)
+            profiler.switch("read")  # setup 0 -> 1
+            profiler.switch("database")  # read 1 -> 1.5
+            profiler.switch("read")  # database 1.5 -> 4
+            profiler.switch("database")  # read 4 -> 4.25
+            profiler.finish()  # database 4.25 -> 10, then the total
+            profiler.finish()  # already finished, no clock reads
+
+        self.assertEqual(
+            profiler.phases,
+            {"setup": [1.0, 0.5, 0], "read": [0.75, 0.75, 0], "database": [8.25, 0.75, 0]},
+        )
+        self.assertEqual(profiler.elapsed, 10.0)
+        lines = profiler.lines()
+        self.assertEqual(lines[0], "Phase timings (wall / thread CPU):\n")
+        self.assertEqual(lines[-1], f"  {'total':<12} {10.0:9.3f}s\n")
+
+    def test_memory_tracing_is_shared_and_stopped_by_the_last_profiler(self):
+        if tracemalloc.is_tracing():
+            self.skipTest("tracemalloc was already started outside the profiler")
+        first = ImportProfiler("First", trace_memory=True)
+        second = ImportProfiler("Second", trace_memory=True)
+        first.switch("allocate")
+        data = [str(index) * 10 for index in range(20000)]
+        first.switch("after")
+        first.finish()
+        self.assertTrue(tracemalloc.is_tracing())
+        second.finish()
+        self.assertFalse(tracemalloc.is_tracing())
+
+        self.assertGreater(first.phases["allocate"][2], 1024 * 1024)
+        # neither reset the process-wide peak under the other
+        self.assertTrue(first.memory_shared and second.memory_shared)
+        self.assertIn("peak traced memory, shared with concurrent imports", first.lines()[0])
+        self.assertIn("Top allocation sites (still allocated at the end):\n", first.lines())
+        del data
+
+    def test_a_single_profiler_resets_the_peak_per_phase(self):
+        if tracemalloc.is_tracing():
+            self.skipTest("tracemalloc was already started outside the profiler")
+        profiler = ImportProfiler("Alone", trace_memory=True)
+        profiler.switch("allocate")
+        data = [str(index) * 10 for index in range(20000)]
+        del data
+        profiler.switch("small")
+        profiler.finish()
+        self.assertFalse(profiler.memory_shared)
+        self.assertLess(profiler.phases["small"][2], profiler.phases["allocate"][2])
+        self.assertEqual(profiler.lines()[0], "Phase timings (wall / thread CPU / peak traced memory):\n")
+
+    def test_finish_logs_the_profile(self):
+        profiler = ImportProfiler("Logged import", trace_memory=False)
+        profiler.switch("read")
+        with self.assertLogs("pages.helper", "INFO") as logs:
+            profiler.finish()
+        self.assertRegex(logs.output[0], r"Logged import profile: [0-9.]+s total; setup .*, read ")
+
+
+class RequestProfilerTests(TestCase):
+    def setUp(self):
+        self.profiles_dir = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(PROFILES_DIR=self.profiles_dir))
+        User = get_user_model()
+        self.staff = User.objects.create_user("staff", password="secret", is_staff=True)
+        self.user = User.objects.create_user("user", password="secret")
+
+    def test_only_staff_requests_are_profiled(self):
+        url = reverse("pages:request_profiles") + "?profile=cprofile"
+        self.assertNotIn("X-Profile", self.client.get(url))
+        self.client.force_login(self.user)
+        self.assertNotIn("X-Profile", self.client.get(url))
+        self.assertEqual(os.listdir(self.profiles_dir), [])
+
+        self.client.force_login(self.staff)
+        self.assertNotIn("X-Profile", self.client.get(reverse("pages:request_profiles") + "?profile=unknown"))
+        name = self.client.get(url)["X-Profile"]
+        self.assertEqual(sorted(os.listdir(self.profiles_dir)), [name + ".collapsed", name + ".prof"])
+        self.assertTrue(name.endswith("_get_profiles_cprofile"))
+        listed = self.client.get(reverse("pages:request_profiles"), headers={"X-Profile": "sample"}).json()["results"]
+        self.assertEqual([profile["name"] for profile in listed], [name])
+
+    def test_profile_downloads_are_staff_only(self):
+        self.client.force_login(self.staff)
+        name = self.client.get(reverse("pages:request_profiles") + "?profile=cprofile")["X-Profile"]
+        url = reverse("pages:download_request_profile", args=[name + ".collapsed"])
+
+        self.client.force_login(self.user)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 302)
+        self.assertIn("/admin/login/", response["Location"])
+
+        self.client.force_login(self.staff)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/plain; charset=utf-8")
+        with open(os.path.join(self.profiles_dir, name + ".collapsed"), "rb") as f:
+            self.assertEqual(b"".join(response.streaming_content), f.read())
+        for filename in [name + ".txt", "missing.prof"]:
+            self.assertEqual(self.client.get(reverse("pages:download_request_profile", args=[filename])).status_code, 404)
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(self.format(record))
+
+
+class QueueListenerHandlerTests(TestCase):
+    def setUp(self):
+        self.target = ListHandler()
+        self.handler = QueueListenerHandler([self.target])
+        self.addCleanup(self.handler.close)
+
+    @staticmethod
+    def record(msg, *args, level=logging.INFO):
+        return logging.LogRecord("pages.tests", level, __file__, 0, msg, args, None)
+
+    def test_records_are_formatted_by_the_listener(self):
+        record = self.record("imported %s rows", 3)
+        prepared = self.handler.prepare(record)
+        self.assertIs(prepared, record)
+        self.assertEqual((prepared.msg, prepared.args), ("imported %s rows", (3,)))
+
+        self.handler.handle(record)
+        self.handler.handle(self.record("done"))
+        # close() stops the listener after it has written everything queued
+        self.handler.close()
+        self.assertEqual(self.target.messages, ["imported 3 rows", "done"])
+        self.assertIsNone(self.handler._listener)
+        self.handler.close()
+
+    def test_target_handler_levels_are_respected(self):
+        self.target.setLevel(logging.WARNING)
+        self.handler.handle(self.record("debug", level=logging.DEBUG))
+        self.handler.handle(self.record("warning", level=logging.WARNING))
+        self.handler.close()
+        self.assertEqual(self.target.messages, ["warning"])
+
+    def test_a_forked_process_starts_its_own_listener(self):
+        inherited = self.handler._listener
+        # the listener thread does not survive a fork
+        inherited.stop()
+        self.handler._pid = -1
+
+        self.handler.handle(self.record("from the worker"))
+        self.assertIsNot(self.handler._listener, inherited)
+        self.assertEqual(self.handler._pid, os.getpid())
+        self.handler.close()
+        self.assertEqual(self.target.messages, ["from the worker"])
+
+
+class Unformattable:
+    def __str__(self):
+        raise AssertionError("formatted")
+
+
+class RowDebugLogTests(TestCase):
+    def setUp(self):
+        self.logger = logging.getLogger("pages.tests.rows")
+        self.addCleanup(self.logger.setLevel, self.logger.level)
+
+    def test_logs_every_nth_row_when_debug_is_enabled(self):
+        self.logger.setLevel(logging.DEBUG)
+        row_log = RowDebugLog(self.logger, every=2)
+        with self.assertLogs(self.logger, "DEBUG") as logs:
+            for row_num in range(1, 6):
+                row_log(row_num, "imported %s", f"sku-{row_num}")
+        self.assertEqual([record.getMessage() for record in logs.records], ["Row 2: imported sku-2", "Row 4: imported sku-4"])
+
+    @override_settings(IMPORT_ROW_LOG_SAMPLE=1)
+    def test_nothing_is_formatted_when_debug_is_off(self):
+        self.logger.setLevel(logging.INFO)
+        row_log = RowDebugLog(self.logger)
+        self.assertEqual((row_log.enabled, row_log.every), (False, 1))
+        with mock.patch.object(self.logger, "debug") as debug:
+            row_log(1, "imported %s", Unformattable())
+        debug.assert_not_called()
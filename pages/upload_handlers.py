@@ -0,0 +1,29 @@
+# upload_handlers.py
+import hashlib
+
+from django.core.files.uploadhandler import FileUploadHandler
+
+
+class HashingUploadHandler(FileUploadHandler):
+    """
+    Compute the SHA-256 of every uploaded file while it streams in.
+
+    It only observes the chunks and passes them on unchanged, the next handler in
+    FILE_UPLOAD_HANDLERS still builds the UploadedFile. Digests are kept on
+    ``request.upload_hashes`` keyed by form field name.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.hasher = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.hasher.update(raw_data)
+        return raw_data
+
+    def file_complete(self, file_size):
+        if self.request is not None:
+            if not hasattr(self.request, "upload_hashes"):
+                self.request.upload_hashes = {}
+            self.request.upload_hashes[self.field_name] = self.hasher.hexdigest()
+        return None
@@ -6,6 +6,20 @@ app_name = "pages"
 
 urlpatterns = [
     path("", views.import_csv, name="import_csv"),
+    # async variants for ASGI deployments (config.asgi)
+    path("async/", views.import_csv_async, name="import_csv_async"),
+    path("async/export/<str:model_type>", views.export_csv_async, name="export_csv_async"),
+    path("async/download-error-log/<str:filename>/", views.download_error_log_async, name="download_error_log_async",),
+    path("import-errors/", views.import_errors, name="import_errors"),
+    path("bundle/", views.import_bundle_upload, name="import_bundle"),
+    path("uploads/", views.chunked_upload_start, name="chunked_upload_start"),
+    path("uploads/<uuid:upload_id>/", views.chunked_upload_status, name="chunked_upload_status"),
+    path("uploads/<uuid:upload_id>/chunks/<int:index>/", views.chunked_upload_chunk, name="chunked_upload_chunk"),
+    path("uploads/<uuid:upload_id>/complete/", views.chunked_upload_complete, name="chunked_upload_complete"),
+    # before the export catch-all below
+    path("metrics", views.metrics, name="metrics"),
+    path("profiles/", views.request_profiles, name="request_profiles"),
+    path("profiles/<str:filename>", views.download_request_profile, name="download_request_profile"),
     path("<str:model_type>", views.export_csv, name="export_csv"),
     path("download-error-log/<str:filename>/", views.download_error_log, name="download_error_log",),
 ]
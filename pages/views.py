@@ -1,8 +1,14 @@
 # views.py
 from django.shortcuts import render, redirect
 from django.utils.safestring import mark_safe
-from django.http import HttpResponse
+from django.utils.html import format_html
+from django.http import FileResponse, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from django.contrib import messages
+from django.contrib.admin.views.decorators import staff_member_required
+from django.urls import reverse
 #from django.db import transaction
 from customers.models import Customer
 from customers.views import import_customers_with_validation
@@ -13,15 +19,44 @@ from products.views import import_products_with_validation
 from orders.models import Order
 from orders.views import import_orders_with_validation
 
-from .forms import CSVImportForm#, OrderCSVForm  # , CustomerCSVForm,ProductCSVForm,
+from .models import ChunkedUpload, ImportRowError, ImportRun
+from .forms import BundleImportForm, CSVImportForm#, OrderCSVForm  # , CustomerCSVForm,ProductCSVForm,
 
 from django.conf import settings
+from config.db_routers import reporting_db
+from . import metrics as import_metrics
+from .profiling import list_profiles, profile_path
+from .helper import (
+    ImportLookup,
+    assemble_upload_chunks,
+    detect_encoding,
+    error_log_extension,
+    open_stored_upload,
+    received_upload_chunks,
+    release_stored_upload,
+    run_in_background,
+    run_in_pool,
+    save_upload_chunk,
+    store_upload,
+)
+import contextlib
 import os
 import csv
+import hashlib
+import hmac
 import io
-from datetime import datetime
+import zipfile
+import json
+from decimal import Decimal
+from datetime import datetime, time, timedelta
 import logging
 
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional, only the Parquet export needs it
+    pa = pq = None
+
 logger = logging.getLogger(__name__)
 
 
@@ -34,6 +69,8 @@ def import_csv(request):
             model_type = form.cleaned_data["model_type"]
             delete_option = form.cleaned_data.get("delete_option", "append")
             delete_existing = delete_option == "replace"
+            dry_run = form.cleaned_data.get("dry_run", False)
+            force = form.cleaned_data.get("force", False)
 
             # Validate file type
             if not csv_file.name.endswith(".csv"):
@@ -47,75 +84,101 @@ def import_csv(request):
                 if file_size == 0:
                     messages.error(request, "Uploaded file is empty")
                     return render(request, "csv_import.html", {"form": form})
+
+                # ====== SAME FILE ALREADY IMPORTED? ======
+                file_sha256 = uploaded_file_sha256(request, "csv_file")
+                previous_run = None if (force or dry_run) else find_clean_import(file_sha256, model_type)
+                if previous_run is not None:
+                    messages.success(
+                        request,
+                        f"♻️ This file was already imported cleanly on "
+                        f"{timezone.localtime(previous_run.started_at).strftime('%Y-%m-%d %H:%M:%S')} "
+                        f"(import #{previous_run.pk}): {previous_run.success_count} {model_type} records created, "
+                        f"{previous_run.unchanged_count} unchanged. Nothing was re-run, tick the re-run option to import it again.",
+                    )
+                    return render(request, "pages/index.html", {"form": form})
                 
-                # Decode and read CSV
-                data_set = csv_file.read().decode("UTF-8")
-                #io_string = io.StringIO(data_set)
-                
-                
-                # Try multiple encodings
-                encodings_to_try = ["utf-8","utf-8-sig","latin-1","iso-8859-1","cp1252",]
-                decoded_data = None
-                encoding_used = None
-                
-                for encoding in encodings_to_try:
-                    try:
-                        csv_file.seek(0)  # Reset file pointer
-                        decoded_data = csv_file.read().decode(encoding)
-                        encoding_used = encoding
-                        logger.info(f"Successfully decoded with {encoding}")
-                        break
-                    except UnicodeDecodeError as e:
-                        logger.warning(f"Failed to decode with {encoding}: {str(e)}")
-                        continue
-
-                if decoded_data is None:
+                # Try multiple encodings, reading the upload a chunk at a time
+                encoding_used = detect_encoding(lambda: _upload_binary(csv_file), IMPORT_ENCODINGS)
+                if encoding_used is None:
                     messages.error(
                         request, "Unable to decode the file. Please use UTF-8 encoding."
                     )
                     return render(request, "pages/index.html", {"form": form})
 
                 # Create error log directory if it doesn't exist
-                error_log_dir = os.path.join(settings.BASE_DIR, "error_logs")
+                error_log_dir = settings.ERROR_LOG_DIR
                 os.makedirs(error_log_dir, exist_ok=True)
 
                 # Generate error log filename with timestamp
                 timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                error_log_filename = f"import_errors_{model_type}_{timestamp}.txt"
+                error_log_filename = f"import_errors_{model_type}_{timestamp}{error_log_extension()}"
                 error_log_path = os.path.join(error_log_dir, error_log_filename)
 
                 success_count = 0
                 error_count = 0
                 errors = []
 
-                # Process based on model type
-                if model_type == "customer":
-                    success_count, error_count, errors = (
-                        import_customers_with_validation(decoded_data, error_log_path, encoding_used, delete_existing)
-                    )
-                    #success_count, error_count, errors = import_customers_with_validation(io_string, error_log_path)
-                elif model_type == "product":
-                    success_count, error_count, errors = (
-                        import_products_with_validation(decoded_data, error_log_path, encoding_used, delete_existing)
-                    )
-                    #success_count, error_count, errors = import_products(io_string)
-                elif model_type == "order":
-                    success_count, error_count, errors = import_orders_with_validation(decoded_data, error_log_path, encoding_used, delete_existing)
-                    #success_count, error_count, errors = import_orders(io_string)
+                import_run = ImportRun.objects.create(
+                    model_type=model_type,
+                    file_name=csv_file.name,
+                    file_sha256=file_sha256,
+                    file_size=file_size,
+                    # keep the raw upload so `manage.py resume_import` can pick up after a crash
+                    upload_path="" if dry_run else store_upload(csv_file, file_sha256),
+                    encoding=encoding_used,
+                    delete_existing=delete_existing,
+                    dry_run=dry_run,
+                    error_log_filename=error_log_filename,
+                )
+
+                # Process based on model type, streaming the spooled upload as text lines
+                csv_file.seek(0)
+                decoded_data = io.TextIOWrapper(csv_file.file, encoding=encoding_used, newline="")
+                try:
+                    if model_type == "customer":
+                        success_count, error_count, errors = (
+                            import_customers_with_validation(decoded_data, error_log_path, encoding_used, delete_existing, import_run=import_run, dry_run=dry_run)
+                        )
+                    elif model_type == "product":
+                        success_count, error_count, errors = (
+                            import_products_with_validation(decoded_data, error_log_path, encoding_used, delete_existing, import_run=import_run, dry_run=dry_run)
+                        )
+                    elif model_type == "order":
+                        success_count, error_count, errors = import_orders_with_validation(decoded_data, error_log_path, encoding_used, delete_existing, import_run=import_run, dry_run=dry_run)
+                finally:
+                    # closing the wrapper would close (and delete) Django's temporary upload file
+                    decoded_data.detach()
+
+                finish_import_run(import_run, success_count, error_count, errors)
+                if import_run.status == "failed":
+                    # nothing was imported, e.g. the header is missing a required column
+                    for error in errors:
+                        messages.error(request, f"❌ {error}")
+                    return render(request, "pages/index.html", {"form": form})
 
                 # Prepare response message
-                if error_count == 0:
-                    messages.success(
+                if import_run.unchanged_count:
+                    messages.info(request, f"⏭️ {import_run.unchanged_count} unchanged {model_type} records were skipped.")
+                if dry_run:
+                    messages.info(
                         request,
-                        f"✅ Successfully imported {success_count} {model_type} records!",
+                        f"🔍 Dry run: {success_count} {model_type} records would be imported and {error_count} would fail. "
+                        f"No data was written.",
                     )
+                if error_count == 0:
+                    if not dry_run:
+                        messages.success(
+                            request,
+                            f"✅ Successfully imported {success_count} {model_type} records!",
+                        )
                 else:
                     messages.warning(
                         request,
-                        f"⚠️ Import completed with {success_count} successful and {error_count} failed records. "
+                        f"⚠️ {'Dry run' if dry_run else 'Import'} completed with {success_count} successful and {error_count} failed records. "
                         f"Error log saved to: {error_log_filename}",
                     )
-                    print("error_log_filename->", error_log_filename)
+                    logger.debug("Error log saved to %s", error_log_filename)
                     # Provide download link for error log
                     error_log_url = f"/download-error-log/{error_log_filename}/"
                     messages.info(
@@ -133,102 +196,1154 @@ def import_csv(request):
 
     return render(request, "pages/index.html", {"form": form})
 
-def download_error_log(request, filename):
+IMPORT_ENCODINGS = ["utf-8", "utf-8-sig", "latin-1", "iso-8859-1", "cp1252"]
+
+
+def _upload_binary(uploaded_file):
+    """An uploaded file's binary file from the start, for a with block that must leave it open"""
+    uploaded_file.seek(0)
+    return contextlib.nullcontext(uploaded_file.file)
+
+IMPORTERS = {
+    "customer": import_customers_with_validation,
+    "product": import_products_with_validation,
+    "order": import_orders_with_validation,
+}
+
+
+# ====== BUNDLE IMPORTS ======
+# customers, products and orders CSVs imported together; orders need the other two
+BUNDLE_STAGES = ["customer", "product", "order"]
+
+
+def bundle_members(entries):
     """
-    View to download error log files
+    Pick the CSV for each stage from a bundle's (file name, size) entries by file name prefix,
+    e.g. customers.csv, products_2024.csv, orders.csv
+    Returns ({model_type: (name, size)}, problems)
     """
-    error_log_dir = os.path.join(settings.BASE_DIR, "error_logs")
-    file_path = os.path.join(error_log_dir, filename)
+    members = {}
+    problems = []
+    for name, size in entries:
+        base = os.path.basename(name).lower()
+        # skip non CSVs and archive metadata such as __MACOSX/._orders.csv
+        if not base.endswith(".csv") or base.startswith("."):
+            continue
+        for model_type in BUNDLE_STAGES:
+            if base.startswith(model_type):
+                if model_type in members:
+                    problems.append(f"More than one {model_type} file in the bundle: {members[model_type][0]}, {name}")
+                else:
+                    members[model_type] = (name, size)
+                break
+    if not members and not problems:
+        problems.append("The bundle has no customers, products or orders CSV file")
+    return members, problems
 
-    if os.path.exists(file_path):
-        with open(file_path, "rb") as f:
-            response = HttpResponse(f.read(), content_type="text/plain")
-            response["Content-Disposition"] = f'attachment; filename="{filename}"'
-            return response
+
+def import_bundle(members, open_binary, delete_existing=False, dry_run=False, bundle_name=""):
+    """
+    Import a bundle's CSVs in dependency order (customers, products, then orders), one ImportRun each
+    The stages share one ImportLookup so orders resolve customers and products without querying them again
+    open_binary(name) returns a binary file object for a member, which is read as a stream
+    Returns [(model_type, import_run, errors)]
+    """
+    lookup = ImportLookup()
+    results = []
+    os.makedirs(settings.ERROR_LOG_DIR, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+
+    for model_type in BUNDLE_STAGES:
+        if model_type not in members:
+            continue
+        name, size = members[model_type]
+        encoding = detect_encoding(lambda: open_binary(name), IMPORT_ENCODINGS)
+        error_log_filename = f"import_errors_{model_type}_{timestamp}_bundle{error_log_extension()}"
+        import_run = ImportRun.objects.create(
+            model_type=model_type,
+            file_name=f"{bundle_name}/{name}" if bundle_name else name,
+            file_size=size,
+            encoding=encoding or "",
+            delete_existing=delete_existing,
+            dry_run=dry_run,
+            error_log_filename=error_log_filename,
+        )
+        if encoding is None:
+            errors = [f"Unable to decode {name}. Please use UTF-8 encoding."]
+            finish_import_run(import_run, 0, 0, errors)
+            results.append((model_type, import_run, errors))
+            continue
+
+        with io.TextIOWrapper(open_binary(name), encoding=encoding, newline="") as lines:
+            success_count, error_count, errors = IMPORTERS[model_type](
+                lines,
+                os.path.join(settings.ERROR_LOG_DIR, error_log_filename),
+                encoding,
+                delete_existing,
+                import_run=import_run,
+                dry_run=dry_run,
+                lookup=lookup,
+            )
+        finish_import_run(import_run, success_count, error_count, errors)
+        results.append((model_type, import_run, errors))
+        logger.info(f"Bundle stage {model_type} ({name}): {success_count} successful, {error_count} failed")
+
+    return results
+
+
+def import_bundle_upload(request):
+    """Import a zip of customers, products and orders CSVs in dependency order"""
+    if request.method == "POST":
+        bundle_form = BundleImportForm(request.POST, request.FILES)
+        if bundle_form.is_valid():
+            bundle_file = bundle_form.cleaned_data["bundle_file"]
+            delete_existing = bundle_form.cleaned_data.get("delete_option") == "replace"
+            dry_run = bundle_form.cleaned_data.get("dry_run", False)
+            try:
+                with zipfile.ZipFile(bundle_file) as archive:
+                    members, problems = bundle_members(
+                        (info.filename, info.file_size) for info in archive.infolist() if not info.is_dir()
+                    )
+                    if problems:
+                        for problem in problems:
+                            messages.error(request, f"❌ {problem}")
+                    else:
+                        results = import_bundle(members, archive.open, delete_existing, dry_run, bundle_file.name)
+                        for model_type, import_run, errors in results:
+                            summary = (
+                                f"📦 {import_run.file_name}: {import_run.success_count} {model_type} records "
+                                f"{'would be imported' if dry_run else 'imported'}, {import_run.error_count} failed"
+                            )
+                            if import_run.status == "failed":
+                                messages.error(request, f"❌ {import_run.file_name}: {'; '.join(errors)}")
+                            elif import_run.error_count:
+                                error_log_url = f"/download-error-log/{import_run.error_log_filename}/"
+                                messages.warning(
+                                    request,
+                                    # the file names come from the zip, escape them
+                                    format_html("⚠️ {}. <a href='{}' target='_blank'>📄 Error Log</a>", summary, error_log_url),
+                                )
+                            else:
+                                messages.success(request, f"✅ {summary}")
+            except zipfile.BadZipFile:
+                messages.error(request, "❌ The bundle is not a valid zip file")
+            except Exception as e:
+                logger.error(f"Bundle import error: {str(e)}")
+                messages.error(request, f"❌ Error importing bundle: {str(e)}")
+        else:
+            for field_errors in bundle_form.errors.values():
+                for error in field_errors:
+                    messages.error(request, f"❌ {error}")
+
+    return render(request, "pages/index.html", {"form": CSVImportForm()})
+
+
+def uploaded_file_sha256(request, field_name):
+    """SHA-256 of an uploaded file, computed by HashingUploadHandler while it streamed in"""
+    digest = getattr(request, "upload_hashes", {}).get(field_name)
+    if digest is None:
+        # handler not installed (e.g. custom FILE_UPLOAD_HANDLERS), hash it now
+        hasher = hashlib.sha256()
+        uploaded = request.FILES[field_name]
+        for chunk in uploaded.chunks():
+            hasher.update(chunk)
+        uploaded.seek(0)
+        digest = hasher.hexdigest()
+    return digest
+
+
+def find_clean_import(file_sha256, model_type):
+    """
+    Most recent real import of the same file content that finished without errors
+    A shard run only counts when every shard run of its group finished without errors
+    """
+    unclean_shards = ImportRun.objects.filter(shard_group=OuterRef("shard_group")).exclude(status="completed", error_count=0)
+    return (
+        ImportRun.objects.filter(
+            file_sha256=file_sha256,
+            model_type=model_type,
+            status="completed",
+            error_count=0,
+            dry_run=False,
+        )
+        .exclude(Exists(unclean_shards))
+        .order_by("-started_at")
+        .first()
+    )
+
+
+def finish_import_run(import_run, success_count, error_count, errors):
+    """
+    Store the importer result on its ImportRun. A failed run keeps the counters of its
+    last committed checkpoint, resume_import carries on from them.
+    """
+    # importers report unrecoverable problems as (0, 0, [message])
+    fatal = success_count == 0 and error_count == 0 and bool(errors)
+    if fatal:
+        # the instance may hold the counters of a batch that was rolled back
+        import_run.refresh_from_db(
+            fields=["success_count", "error_count", "unchanged_count", "checkpoint_offset", "checkpoint_row"]
+        )
     else:
-        return HttpResponse("Error log file not found", status=404)
+        import_run.success_count = success_count
+        import_run.error_count = error_count
+    import_run.status = "failed" if fatal else "completed"
+    import_run.finished_at = timezone.now()
+    import_run.save(update_fields=["success_count", "error_count", "unchanged_count", "status", "finished_at"])
+    if import_run.status == "completed" or import_run.dry_run:
+        # nothing left to resume
+        release_stored_upload(import_run)
+    if not import_run.dry_run:
+        import_metrics.IMPORTS.inc(model=import_run.model_type, status=import_run.status)
 
-def export_csv(request,model_type):
-    if model_type == "customer":
-        return export_customers_csv()
-    elif model_type == "product":
-        return export_products_csv()
-    elif model_type == "order":
-        return export_orders_csv()
+
+IMPORT_ERRORS_PAGE_SIZE = 100
+IMPORT_ERRORS_MAX_PAGE_SIZE = 1000
+
+
+def import_errors(request):
+    """
+    Filterable, keyset-paginated list of stored import row errors (JSON)
+    Filters: run, model_type, field, code, since, until (ISO datetimes)
+    Paging: newest first, pass the returned next_after as ?after= for the next page
+    """
+    queryset = ImportRowError.objects.all()
+    for param in ("model_type", "field", "code"):
+        if request.GET.get(param):
+            queryset = queryset.filter(**{param: request.GET[param]})
+
+    try:
+        if request.GET.get("run"):
+            queryset = queryset.filter(run_id=int(request.GET["run"]))
+        if request.GET.get("after"):
+            queryset = queryset.filter(id__lt=int(request.GET["after"]))
+        limit = min(int(request.GET.get("limit", IMPORT_ERRORS_PAGE_SIZE)), IMPORT_ERRORS_MAX_PAGE_SIZE)
+    except ValueError:
+        return JsonResponse({"error": "run, after and limit must be integers"}, status=400)
+
+    for param, lookup in (("since", "created_at__gte"), ("until", "created_at__lt")):
+        if request.GET.get(param):
+            value = parse_datetime(request.GET[param])
+            if value is None:
+                return JsonResponse({"error": f"{param} must be an ISO datetime"}, status=400)
+            if timezone.is_naive(value):
+                value = timezone.make_aware(value)
+            queryset = queryset.filter(**{lookup: value})
+
+    rows = list(
+        queryset.order_by("-id").values(
+            "id", "run_id", "model_type", "row_number", "field", "code", "message", "raw_data", "created_at"
+        )[:limit]
+    )
+    next_after = rows[-1]["id"] if len(rows) == limit else None
+    return JsonResponse({"results": rows, "next_after": next_after})
+
+
+# ====== CHUNKED UPLOADS ======
+# POST uploads/ -> POST uploads/<id>/chunks/<n>/ for each chunk (any order, re-sends
+# are fine) -> GET uploads/<id>/ to see what is missing after a disconnect
+# -> POST uploads/<id>/complete/ to verify the checksum and import the file from disk
+
+
+def _chunked_upload_state(upload):
+    if upload.status == "uploading":
+        received = received_upload_chunks(upload.upload_id)
     else:
-        return HttpResponse("Invalid model type", status=400)
+        # the part files were assembled into the stored upload and removed
+        received = range(upload.total_chunks)
+    state = {
+        "upload_id": str(upload.upload_id),
+        "status": upload.status,
+        "chunk_size": upload.chunk_size,
+        "total_chunks": upload.total_chunks,
+        "received": sorted(received),
+        "missing": [index for index in range(upload.total_chunks) if index not in received],
+        "import_run": upload.import_run_id,
+    }
+    import_run = upload.import_run
+    if import_run is not None:
+        state.update(
+            {
+                "import_status": import_run.status,
+                "success_count": import_run.success_count,
+                "error_count": import_run.error_count,
+                "unchanged_count": import_run.unchanged_count,
+                "checkpoint_row": import_run.checkpoint_row,
+                "error_log_url": (
+                    f"/download-error-log/{import_run.error_log_filename}/" if import_run.error_count else None
+                ),
+            }
+        )
+    return state
+
 
-def export_customers_csv():
-    response = HttpResponse(content_type="text/csv")
-    response["Content-Disposition"] = 'attachment; filename="customers.csv"'
+def chunked_upload_start(request):
+    """
+    Start (or pick up again) a chunked upload
+    POST model_type, file_name, file_size, sha256 and optionally delete_option, dry_run, force
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "POST required"}, status=405)
 
-    writer = csv.writer(response)
-    writer.writerow(["name", "email", "phone", "address"])
+    model_type = request.POST.get("model_type", "")
+    file_name = request.POST.get("file_name", "")
+    file_sha256 = request.POST.get("sha256", "").lower()
+    if model_type not in dict(ImportRun.MODEL_CHOICES):
+        return JsonResponse({"error": "model_type must be customer, product or order"}, status=400)
+    if not file_name.endswith(".csv"):
+        return JsonResponse({"error": "file_name must have a .csv extension"}, status=400)
+    if len(file_sha256) != 64 or any(c not in "0123456789abcdef" for c in file_sha256):
+        return JsonResponse({"error": "sha256 must be the hex SHA-256 of the whole file"}, status=400)
+    try:
+        file_size = int(request.POST.get("file_size", ""))
+    except ValueError:
+        file_size = 0
+    if file_size <= 0:
+        return JsonResponse({"error": "file_size must be a positive integer"}, status=400)
 
-    customers = Customer.objects.all()
-    for customer in customers:
-        writer.writerow(
-            [
-                customer.name,
-                customer.email,
-                customer.phone or "",
-                customer.address or "",
-            ]
+    # the same file still uploading: hand back its session so the client only sends what is missing
+    upload = ChunkedUpload.objects.filter(
+        model_type=model_type, file_sha256=file_sha256, file_size=file_size, status="uploading"
+    ).first()
+    if upload is None:
+        upload = ChunkedUpload.objects.create(
+            model_type=model_type,
+            file_name=file_name,
+            file_size=file_size,
+            file_sha256=file_sha256,
+            chunk_size=settings.IMPORT_CHUNK_SIZE,
+            delete_existing=request.POST.get("delete_option") == "replace",
+            dry_run=request.POST.get("dry_run") in ("1", "true", "on"),
+            force=request.POST.get("force") in ("1", "true", "on"),
         )
+    return JsonResponse(_chunked_upload_state(upload), status=201)
 
-    return response
 
-def export_products_csv():
-    response = HttpResponse(content_type="text/csv")
-    response["Content-Disposition"] = 'attachment; filename="products.csv"'
+def chunked_upload_chunk(request, upload_id, index):
+    """POST one chunk as the multipart file field "chunk", optionally with its own sha256"""
+    if request.method != "POST":
+        return JsonResponse({"error": "POST required"}, status=405)
+    upload = ChunkedUpload.objects.filter(upload_id=upload_id).first()
+    if upload is None:
+        return JsonResponse({"error": "Unknown upload"}, status=404)
+    if upload.status != "uploading":
+        return JsonResponse({"error": "Upload already completed"}, status=409)
+    if index >= upload.total_chunks:
+        return JsonResponse({"error": f"Chunk index must be below {upload.total_chunks}"}, status=400)
+    if "chunk" not in request.FILES:
+        return JsonResponse({"error": "Send the chunk as the multipart file field 'chunk'"}, status=400)
 
-    writer = csv.writer(response)
-    writer.writerow(["name", "sku", "description", "price", "stock_quantity", "weight"])
+    chunk = request.FILES["chunk"]
+    if chunk.size != upload.expected_chunk_size(index):
+        return JsonResponse(
+            {"error": f"Chunk {index} must be {upload.expected_chunk_size(index)} bytes, got {chunk.size}"}, status=400
+        )
+    chunk_sha256 = request.POST.get("sha256")
+    if chunk_sha256 and chunk_sha256.lower() != uploaded_file_sha256(request, "chunk"):
+        return JsonResponse({"error": f"Checksum mismatch for chunk {index}, send it again"}, status=400)
 
-    products = Product.objects.all()
-    for product in products:
-        writer.writerow(
-            [
-                product.name,
-                product.sku,
-                product.description or "",
-                product.price,
-                product.stock_quantity,
-                product.weight or "",
-            ]
+    save_upload_chunk(upload.upload_id, index, chunk)
+    return JsonResponse({"index": index, "received": len(received_upload_chunks(upload.upload_id))})
+
+
+def chunked_upload_status(request, upload_id):
+    """Received and missing chunks of an upload (JSON)"""
+    upload = ChunkedUpload.objects.filter(upload_id=upload_id).first()
+    if upload is None:
+        return JsonResponse({"error": "Unknown upload"}, status=404)
+    return JsonResponse(_chunked_upload_state(upload))
+
+
+def chunked_upload_complete(request, upload_id):
+    """
+    Assemble the chunks, check the file checksum and start the import on the "import" pool
+    Answers 202 at once, poll chunked_upload_status for import_status and the counts. If the
+    worker process dies part way, `manage.py resume_import <import_run>` carries on from the checkpoint
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "POST required"}, status=405)
+    upload = ChunkedUpload.objects.filter(upload_id=upload_id).first()
+    if upload is None:
+        return JsonResponse({"error": "Unknown upload"}, status=404)
+    if upload.status != "uploading":
+        return JsonResponse(_chunked_upload_state(upload), status=409)
+
+    state = _chunked_upload_state(upload)
+    if state["missing"]:
+        return JsonResponse({"error": "Chunks missing", **state}, status=400)
+
+    # claim the upload, a second complete call (or a late chunk) now gets 409
+    completed_at = timezone.now()
+    if not ChunkedUpload.objects.filter(pk=upload.pk, status="uploading").update(
+        status="complete", completed_at=completed_at
+    ):
+        upload.refresh_from_db()
+        return JsonResponse(_chunked_upload_state(upload), status=409)
+    upload.status = "complete"
+    upload.completed_at = completed_at
+
+    upload_path, file_sha256 = assemble_upload_chunks(upload.upload_id, upload.total_chunks, upload.file_sha256)
+    if upload_path is None:
+        # give the upload back to the client to send the broken chunks again
+        ChunkedUpload.objects.filter(pk=upload.pk).update(status="uploading", completed_at=None)
+        return JsonResponse(
+            {"error": f"Checksum mismatch: expected {upload.file_sha256}, assembled file is {file_sha256}", **state},
+            status=400,
+        )
+
+    previous_run = None if (upload.force or upload.dry_run) else find_clean_import(file_sha256, upload.model_type)
+    if previous_run is not None:
+        upload.import_run = previous_run
+        upload.save(update_fields=["import_run"])
+        return JsonResponse({**_chunked_upload_state(upload), "already_imported": True})
+
+    encoding = detect_encoding(lambda: open(upload_path, "rb"), IMPORT_ENCODINGS)
+    if encoding is None:
+        # the upload stays claimed, a failed run tells a later status or complete call why. The run
+        # has no upload_path (nothing to resume), prune_error_logs removes the assembled file
+        errors = ["Unable to decode the file. Please use UTF-8 encoding."]
+        import_run = ImportRun.objects.create(
+            model_type=upload.model_type,
+            file_name=upload.file_name,
+            file_sha256=file_sha256,
+            file_size=upload.file_size,
+            delete_existing=upload.delete_existing,
+            dry_run=upload.dry_run,
         )
+        finish_import_run(import_run, 0, 0, errors)
+        upload.import_run = import_run
+        upload.save(update_fields=["import_run"])
+        return JsonResponse({"error": errors[0], **_chunked_upload_state(upload)}, status=400)
 
+    os.makedirs(settings.ERROR_LOG_DIR, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    error_log_filename = f"import_errors_{upload.model_type}_{timestamp}{error_log_extension()}"
+    import_run = ImportRun.objects.create(
+        model_type=upload.model_type,
+        file_name=upload.file_name,
+        file_sha256=file_sha256,
+        file_size=upload.file_size,
+        upload_path=upload_path,
+        encoding=encoding,
+        delete_existing=upload.delete_existing,
+        dry_run=upload.dry_run,
+        error_log_filename=error_log_filename,
+    )
+    upload.import_run = import_run
+    upload.save(update_fields=["import_run"])
+
+    # a multi-GB import must not hold the request open past proxy and client timeouts
+    run_in_background("import", run_stored_import, import_run.pk)
+    return JsonResponse(
+        {**_chunked_upload_state(upload), "status_url": reverse("pages:chunked_upload_status", args=[upload.upload_id])},
+        status=202,
+    )
+
+
+def run_stored_import(import_run_id):
+    """Import a run's stored upload from the start (chunked_upload_complete's background work)"""
+    import_run = ImportRun.objects.get(pk=import_run_id)
+    try:
+        with open_stored_upload(import_run.upload_path, import_run.encoding) as (lines, base_offset):
+            success_count, error_count, errors = IMPORTERS[import_run.model_type](
+                lines,
+                os.path.join(settings.ERROR_LOG_DIR, import_run.error_log_filename),
+                import_run.encoding,
+                import_run.delete_existing,
+                import_run=import_run,
+                dry_run=import_run.dry_run,
+            )
+    except Exception as e:
+        # the importers report row and file problems themselves, this is e.g. the stored file gone
+        logger.error("Import #%s failed: %s", import_run_id, e, exc_info=True)
+        success_count, error_count, errors = 0, 0, [f"Import failed: {str(e)}"]
+    finish_import_run(import_run, success_count, error_count, errors)
+
+
+def _error_log_path(filename):
+    # only plain file names inside ERROR_LOG_DIR can be downloaded
+    if os.path.basename(filename) != filename or not filename.startswith("import_errors_"):
+        return None
+    file_path = os.path.join(settings.ERROR_LOG_DIR, filename)
+    return file_path if os.path.isfile(file_path) else None
+
+
+def _error_log_content_type(filename):
+    return "application/gzip" if filename.endswith(".gz") else "text/plain"
+
+
+def _parse_range(range_header, size):
+    """
+    Parse a single ``bytes=start-end`` Range header.
+    Returns (start, end) inclusive, None when there is no usable header,
+    or raises ValueError when the range cannot be satisfied.
+    """
+    if not range_header or not range_header.startswith("bytes=") or "," in range_header:
+        return None  # no range, or multiple ranges: serve the whole file
+    start_str, _, end_str = range_header[len("bytes="):].strip().partition("-")
+    try:
+        if start_str:
+            start = int(start_str)
+            end = int(end_str) if end_str else size - 1
+        else:
+            # suffix range: the last N bytes
+            start = max(size - int(end_str), 0)
+            end = size - 1
+    except ValueError:
+        return None
+    end = min(end, size - 1)
+    if start > end or start >= size:
+        raise ValueError("Range not satisfiable")
+    return start, end
+
+
+def _read_file_range(file_path, start, length, chunk_size=64 * 1024):
+    with open(file_path, "rb") as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(chunk_size, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def _range_not_satisfiable(size):
+    response = HttpResponse("Requested range not satisfiable", status=416)
+    response["Content-Range"] = f"bytes */{size}"
+    return response
+
+
+def _partial_response(streaming_content, filename, start, end, size):
+    response = StreamingHttpResponse(streaming_content, status=206, content_type=_error_log_content_type(filename))
+    response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    response["Content-Length"] = str(end - start + 1)
+    response["Accept-Ranges"] = "bytes"
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
     return response
 
-def export_orders_csv():
-    response = HttpResponse(content_type="text/csv")
-    response["Content-Disposition"] = 'attachment; filename="orders.csv"'
-
-    writer = csv.writer(response)
-    writer.writerow(
-        [
-            "customer_email",
-            "product_sku",
-            "quantity",
-            "order_date",
-            "status",
-            "total_amount",
-        ]
+
+def download_error_log(request, filename):
+    """
+    View to download error log files
+    Served with FileResponse (wsgi.file_wrapper / sendfile) and single byte-range support
+    """
+    file_path = _error_log_path(filename)
+    if file_path is None:
+        return HttpResponse("Error log file not found", status=404)
+
+    size = os.path.getsize(file_path)
+    try:
+        byte_range = _parse_range(request.headers.get("Range"), size)
+    except ValueError:
+        return _range_not_satisfiable(size)
+
+    if byte_range:
+        start, end = byte_range
+        return _partial_response(_read_file_range(file_path, start, end - start + 1), filename, start, end, size)
+
+    response = FileResponse(
+        open(file_path, "rb"),
+        as_attachment=True,
+        filename=filename,
+        content_type=_error_log_content_type(filename),
     )
+    response["Accept-Ranges"] = "bytes"
+    return response
+
+# ====== EXPORTS ======
+# Each export is read page by page on the primary key, so neither the sync nor the
+# async view holds the whole table (or one long-lived cursor) in memory.
+EXPORT_BATCH_SIZE = getattr(settings, "EXPORT_BATCH_SIZE", 2000)
+# ?since= exports leave out rows changed in the last few seconds, so a transaction that has not
+# committed yet cannot end up behind the watermark handed out
+EXPORT_CHANGES_LAG_SECONDS = getattr(settings, "EXPORT_CHANGES_LAG_SECONDS", 60)
 
-    orders = Order.objects.select_related("customer", "product").all()
-    for order in orders:
-        writer.writerow(
+
+def _customer_export_row(customer):
+    return [
+        customer.name,
+        customer.email,
+        customer.phone or "",
+        customer.address or "",
+    ]
+
+
+def _product_export_row(product):
+    return [
+        product.name,
+        product.sku,
+        product.description or "",
+        product.price,
+        product.current_stock,
+        product.weight or "",
+    ]
+
+
+def _order_export_row(order):
+    return [
+        order.customer.email,
+        order.product.sku,
+        order.quantity,
+        order.order_date.strftime("%Y-%m-%d %H:%M:%S"),
+        order.status,
+        order.total_amount,
+    ]
+
+
+def _export_datetime(value, end=False):
+    """
+    ISO date or datetime from an export filter, as (aware datetime, lookup suffix).
+    A bare date used as an end bound covers that whole day.
+    """
+    lookup = "lte" if end else "gte"
+    # dates first, parse_datetime would also read "2024-01-31" as midnight
+    day = parse_date(value)
+    if day is not None:
+        if end:
+            day, lookup = day + timedelta(days=1), "lt"
+        parsed = datetime.combine(day, time.min)
+    else:
+        parsed = parse_datetime(value)
+        if parsed is None:
+            raise ValueError(f"'{value}' is not an ISO date or datetime")
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed, lookup
+
+
+def _filter_order_export(queryset, params):
+    """date_from, date_to (ISO dates or datetimes), status (comma separated), customer (email), sku"""
+    if params.get("date_from"):
+        value, lookup = _export_datetime(params["date_from"])
+        queryset = queryset.filter(**{f"order_date__{lookup}": value})
+    if params.get("date_to"):
+        value, lookup = _export_datetime(params["date_to"], end=True)
+        queryset = queryset.filter(**{f"order_date__{lookup}": value})
+    if params.get("status"):
+        statuses = [status.strip() for status in params["status"].split(",") if status.strip()]
+        unknown = set(statuses) - set(dict(Order.ORDER_STATUS_CHOICES))
+        if unknown:
+            raise ValueError(f"Unknown status: {', '.join(sorted(unknown))}")
+        queryset = queryset.filter(status__in=statuses)
+    if params.get("customer"):
+        queryset = queryset.filter(customer__email=params["customer"].strip().lower())
+    if params.get("sku"):
+        queryset = queryset.filter(product__sku=params["sku"].strip())
+    return queryset
+
+
+# typed values (Decimal, int, datetime, None) for the JSON Lines and Parquet exports
+def _customer_export_record(customer):
+    return (customer.name, customer.email, customer.phone, customer.address)
+
+
+def _product_export_record(product):
+    return (product.name, product.sku, product.description, product.price, product.current_stock, product.weight)
+
+
+def _order_export_record(order):
+    return (
+        order.customer.email,
+        order.product.sku,
+        order.quantity,
+        order.order_date,
+        order.status,
+        order.total_amount,
+    )
+
+
+EXPORT_SPECS = {
+    "customer": {
+        "filename": "customers",
+        "header": ["name", "email", "phone", "address"],
+        "queryset": lambda: Customer.objects.all(),
+        "row": _customer_export_row,
+        "record": _customer_export_record,
+        "parquet_schema": lambda: pa.schema(
+            [("name", pa.string()), ("email", pa.string()), ("phone", pa.string()), ("address", pa.string())]
+        ),
+    },
+    "product": {
+        "filename": "products",
+        "header": ["name", "sku", "description", "price", "stock_quantity", "weight"],
+        # stock is exported as the snapshot plus the ledger movements after it
+        "queryset": lambda: Product.objects.with_stock(),
+        "row": _product_export_row,
+        "record": _product_export_record,
+        "parquet_schema": lambda: pa.schema(
+            [
+                ("name", pa.string()),
+                ("sku", pa.string()),
+                ("description", pa.string()),
+                ("price", pa.decimal128(10, 2)),
+                ("stock_quantity", pa.int32()),
+                ("weight", pa.decimal128(8, 3)),
+            ]
+        ),
+    },
+    "order": {
+        "filename": "orders",
+        "header": ["customer_email", "product_sku", "quantity", "order_date", "status", "total_amount"],
+        "queryset": lambda: Order.objects.select_related("customer", "product"),
+        "filter": _filter_order_export,
+        "row": _order_export_row,
+        "record": _order_export_record,
+        "parquet_schema": lambda: pa.schema(
             [
-                order.customer.email,
-                order.product.sku,
-                order.quantity,
-                order.order_date.strftime("%Y-%m-%d %H:%M:%S"),
-                order.status,
-                order.total_amount,
+                ("customer_email", pa.string()),
+                ("product_sku", pa.string()),
+                ("quantity", pa.int32()),
+                ("order_date", pa.timestamp("us", tz="UTC")),
+                ("status", pa.string()),
+                ("total_amount", pa.decimal128(12, 2)),
             ]
+        ),
+    },
+}
+
+
+def export_query(spec, params):
+    """
+    Filtered export queryset and keyset bounds from the query string.
+    Returns (queryset, after, limit, by_update); raises ValueError for a bad parameter.
+
+    Full exports page on pk (after=<pk>). With since=<ISO datetime> (and since_id=<pk> from the
+    previous watermark) only rows changed since then are exported, paged on (updated_at, pk),
+    and ``after`` is that (updated_at, pk) cursor.
+    """
+    queryset = spec["queryset"]()
+    if "filter" in spec:
+        queryset = spec["filter"](queryset, params)
+    after = limit = None
+    by_update = "since" in params
+    try:
+        if by_update:
+            since = parse_datetime(params["since"])
+            if since is None:
+                raise ValueError("since must be an ISO datetime")
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since)
+            after = (since, int(params.get("since_id") or 0))
+            cutoff = timezone.now() - timedelta(seconds=EXPORT_CHANGES_LAG_SECONDS)
+            queryset = queryset.filter(updated_at__lte=cutoff)
+        elif params.get("after"):
+            after = int(params["after"])
+        if params.get("limit"):
+            limit = int(params["limit"])
+    except ValueError as e:
+        raise ValueError(f"Invalid export parameter: {str(e)}") from None
+    if limit is not None and limit < 1:
+        raise ValueError("limit must be at least 1")
+    return queryset, after, limit, by_update
+
+
+def _keyset(queryset, after=None, last=None, by_update=False):
+    """Order on the export key and keep the rows in (after, last]"""
+    if not by_update:
+        queryset = queryset.order_by("pk")
+        if after is not None:
+            queryset = queryset.filter(pk__gt=after)
+        if last is not None:
+            queryset = queryset.filter(pk__lte=last)
+        return queryset
+    queryset = queryset.order_by("updated_at", "pk")
+    if after is not None:
+        queryset = queryset.filter(Q(updated_at__gt=after[0]) | Q(updated_at=after[0], pk__gt=after[1]))
+    if last is not None:
+        queryset = queryset.filter(Q(updated_at__lt=last[0]) | Q(updated_at=last[0], pk__lte=last[1]))
+    return queryset
+
+
+def _cursor_fields(by_update):
+    return ("updated_at", "pk") if by_update else ("pk",)
+
+
+def _cursor(values, by_update):
+    return tuple(values) if by_update else values[0]
+
+
+def export_page_end(queryset, alias, after, limit, by_update=False):
+    """Cursor of the last row of a ``limit`` sized page, or None when fewer rows are left (the final page)"""
+    values = (
+        _keyset(queryset.using(alias), after, by_update=by_update)
+        .values_list(*_cursor_fields(by_update))[limit - 1 : limit]
+        .first()
+    )
+    return None if values is None else _cursor(values, by_update)
+
+
+def export_watermark(queryset, alias, after):
+    """(updated_at, pk) of the newest change after ``after``, or ``after`` itself when nothing changed"""
+    values = (
+        _keyset(queryset.using(alias), after, by_update=True)
+        .reverse()
+        .values_list(*_cursor_fields(True))
+        .first()
+    )
+    return after if values is None else _cursor(values, True)
+
+
+def export_bounds(queryset, alias, after, limit, by_update):
+    """
+    (page_end, watermark, last) for an export: the cursor of the next page (None on the final
+    one), the next ?since= watermark (changes exports only) and where the stream stops
+    """
+    page_end = export_page_end(queryset, alias, after, limit, by_update) if limit else None
+    watermark = None
+    if by_update:
+        watermark = page_end or export_watermark(queryset, alias, after)
+    return page_end, watermark, watermark if by_update else page_end
+
+
+def fetch_export_page(
+    spec, alias, after=None, batch_size=EXPORT_BATCH_SIZE, row=None, queryset=None, last=None, by_update=False
+):
+    """
+    Fetch one batch of export rows after the ``after`` cursor (and up to ``last``), built with ``row``
+    (default spec["row"]) from ``queryset`` (default spec["queryset"]()).
+    Returns (rows, cursor); rows is empty once the table is exhausted.
+    """
+    queryset = spec["queryset"]() if queryset is None else queryset
+    objects = list(_keyset(queryset.using(alias), after, last, by_update)[:batch_size])
+    if not objects:
+        return [], after
+    row = row or spec["row"]
+    last_object = objects[-1]
+    cursor = (last_object.updated_at, last_object.pk) if by_update else last_object.pk
+    return [row(obj) for obj in objects], cursor
+
+
+def csv_text(rows):
+    """Render a list of rows as CSV text"""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue()
+
+
+def _json_value(value):
+    # timestamps are ISO 8601, so readers get typed columns (JSONLinesExport writes the Decimals)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+class CSVExport:
+    """Export encoder: start(), encode(rows) per page and finish() return the next piece of the file"""
+
+    content_type = "text/csv"
+    extension = "csv"
+
+    def __init__(self, spec):
+        self.spec = spec
+        self.row = spec["row"]
+
+    def start(self):
+        return csv_text([self.spec["header"]])
+
+    def encode(self, rows):
+        return csv_text(rows)
+
+    def finish(self):
+        return ""
+
+
+class JSONLinesExport:
+    """One JSON object per line with typed values"""
+
+    content_type = "application/x-ndjson"
+    extension = "jsonl"
+
+    def __init__(self, spec):
+        self.header = spec["header"]
+        self.row = spec["record"]
+        # the record is put together field by field: json cannot write a Decimal as a number
+        # without going through float, which would round prices and totals
+        self.keys = [json.dumps(name, ensure_ascii=False) + ": " for name in self.header]
+        self.value = json.JSONEncoder(default=_json_value, ensure_ascii=False).encode
+
+    def start(self):
+        return ""
+
+    def encode(self, rows):
+        return "".join(
+            "{"
+            + ", ".join(
+                key + (str(value) if isinstance(value, Decimal) else self.value(value))
+                for key, value in zip(self.keys, row)
+            )
+            + "}\n"
+            for row in rows
         )
 
+    def finish(self):
+        return ""
+
+
+class _ParquetSink(io.RawIOBase):
+    """Write target for ParquetWriter that hands the written bytes back out, so the file can stream"""
+
+    def __init__(self):
+        super().__init__()
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+class ParquetExport:
+    """Typed Parquet columns (needs pyarrow), written one row group of EXPORT_PARQUET_ROW_GROUP_SIZE rows at a time"""
+
+    content_type = "application/vnd.apache.parquet"
+    extension = "parquet"
+
+    def __init__(self, spec):
+        self.row = spec["record"]
+        self.schema = spec["parquet_schema"]()
+        self.row_group_size = getattr(settings, "EXPORT_PARQUET_ROW_GROUP_SIZE", 100000)
+        self.pending = []
+        self.sink = _ParquetSink()
+        self.writer = pq.ParquetWriter(self.sink, self.schema)
+
+    def start(self):
+        return self.sink.drain()
+
+    def encode(self, rows):
+        self.pending.extend(rows)
+        while len(self.pending) >= self.row_group_size:
+            self._write_row_group(self.pending[: self.row_group_size])
+            del self.pending[: self.row_group_size]
+        return self.sink.drain()
+
+    def finish(self):
+        if self.pending:
+            self._write_row_group(self.pending)
+            self.pending = []
+        self.writer.close()
+        return self.sink.drain()
+
+    def _write_row_group(self, rows):
+        columns = list(zip(*rows))
+        table = pa.Table.from_arrays(
+            [pa.array(column, type=field.type) for column, field in zip(columns, self.schema)], schema=self.schema
+        )
+        self.writer.write_table(table, row_group_size=len(rows))
+
+
+EXPORT_FORMATS = {
+    "csv": CSVExport,
+    "jsonl": JSONLinesExport,
+    "parquet": ParquetExport,
+}
+
+
+def export_encoder(spec, export_format):
+    """
+    Encoder for ?format= (csv, jsonl or parquet)
+    Returns (encoder, None) or (None, error message)
+    """
+    encoder_class = EXPORT_FORMATS.get(export_format)
+    if encoder_class is None:
+        return None, f"Unknown format '{export_format}', use one of: {', '.join(EXPORT_FORMATS)}"
+    if encoder_class is ParquetExport and pa is None:
+        return None, "Parquet export needs pyarrow installed"
+    return encoder_class(spec), None
+
+
+def _stream_export(spec, alias, encoder, queryset=None, after=None, last=None, by_update=False):
+    meter = import_metrics.ExportMeter(spec["filename"], encoder.extension)
+    try:
+        yield meter.sent(encoder.start())
+        while True:
+            rows, after = fetch_export_page(
+                spec, alias, after, row=encoder.row, queryset=queryset, last=last, by_update=by_update
+            )
+            if not rows:
+                break
+            yield meter.sent(encoder.encode(rows), len(rows))
+        yield meter.sent(encoder.finish())
+    finally:
+        # also when the client goes away mid-stream
+        meter.finish()
+
+
+def _export_response(streaming_content, spec, encoder, request, page_end=None, watermark=None):
+    response = StreamingHttpResponse(streaming_content, content_type=encoder.content_type)
+    response["Content-Disposition"] = f'attachment; filename="{spec["filename"]}.{encoder.extension}"'
+    # cursors go in headers, the export itself has no room for them
+    params = request.GET.copy()
+    if watermark is not None:
+        params["since"], params["since_id"] = watermark[0].isoformat(), watermark[1]
+        response["X-Next-Since"] = params["since"]
+        response["X-Next-Since-Id"] = str(watermark[1])
+    if page_end is not None:
+        if watermark is None:
+            params["after"] = page_end
+            response["X-Next-After"] = str(page_end)
+        response["Link"] = f'<{request.path}?{params.urlencode()}>; rel="next"'
+    return response
+
+
+def export_csv(request,model_type):
+    """
+    Stream an export. Query parameters: format (csv, jsonl, parquet), the spec's filters
+    (orders: date_from, date_to, status, customer, sku) and keyset paging with after=<pk>
+    and limit=; a page that is not the last one returns the next cursor in X-Next-After.
+    since=<ISO datetime>&since_id=<pk> exports only the rows changed after that watermark
+    and returns the next one in X-Next-Since / X-Next-Since-Id.
+    """
+    spec = EXPORT_SPECS.get(model_type)
+    if spec is None:
+        return HttpResponse("Invalid model type", status=400)
+    encoder, error = export_encoder(spec, request.GET.get("format", "csv"))
+    if encoder is None:
+        return HttpResponse(error, status=400)
+    try:
+        queryset, after, limit, by_update = export_query(spec, request.GET)
+    except ValueError as e:
+        return HttpResponse(str(e), status=400)
+
+    # exports are read-only scans, keep them off the primary when a replica exists
+    alias = reporting_db()
+    page_end, watermark, last = export_bounds(queryset, alias, after, limit, by_update)
+    return _export_response(
+        _stream_export(spec, alias, encoder, queryset, after, last, by_update),
+        spec, encoder, request, page_end, watermark,
+    )
+
+def metrics(request):
+    """Import and export metrics of all worker processes in the Prometheus text format"""
+    if settings.METRICS_TOKEN and not hmac.compare_digest(
+        request.headers.get("Authorization", ""), f"Bearer {settings.METRICS_TOKEN}"
+    ):
+        return HttpResponse("Unauthorized", status=401)
+    return HttpResponse(import_metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+@staff_member_required
+def request_profiles(request):
+    """Saved request profiles, newest first (JSON), see pages.profiling for how to record one"""
+    profiles = list_profiles(settings.PROFILES_DIR)
+    for profile in profiles:
+        profile["modified"] = datetime.fromtimestamp(profile["modified"]).isoformat()
+        profile["downloads"] = {
+            extension: request.build_absolute_uri(
+                reverse("pages:download_request_profile", args=[profile["name"] + extension])
+            )
+            for extension in profile["files"]
+        }
+    return JsonResponse({"results": profiles})
+
+
+@staff_member_required
+def download_request_profile(request, filename):
+    file_path = profile_path(filename)
+    if file_path is None:
+        return HttpResponse("Profile not found", status=404)
+    content_type = "text/plain; charset=utf-8" if filename.endswith(".collapsed") else "application/octet-stream"
+    return FileResponse(open(file_path, "rb"), as_attachment=True, filename=filename, content_type=content_type)
+
+# ====== ASYNC VIEWS (ASGI) ======
+# The ASGI handler spools the request body to disk without a thread, and the
+# blocking work below runs on bounded thread pools (see pages.helper.run_in_pool),
+# so slow clients wait on the event loop instead of occupying a worker.
+
+
+async def import_csv_async(request):
+    # imports are long and write heavy, they get their own small pool so they
+    # cannot starve export reads
+    return await run_in_pool("import", import_csv, request)
+
+
+async def _stream_export_async(spec, alias, encoder, queryset=None, after=None, last=None, by_update=False):
+    meter = import_metrics.ExportMeter(spec["filename"], encoder.extension)
+    try:
+        yield meter.sent(encoder.start())
+        while True:
+            rows, after = await run_in_pool(
+                "orm", fetch_export_page, spec, alias, after,
+                row=encoder.row, queryset=queryset, last=last, by_update=by_update,
+            )
+            if not rows:
+                break
+            yield meter.sent(encoder.encode(rows), len(rows))
+        yield meter.sent(encoder.finish())
+    finally:
+        meter.finish()
+
+
+async def export_csv_async(request, model_type):
+    spec = EXPORT_SPECS.get(model_type)
+    if spec is None:
+        return HttpResponse("Invalid model type", status=400)
+    encoder, error = export_encoder(spec, request.GET.get("format", "csv"))
+    if encoder is None:
+        return HttpResponse(error, status=400)
+    try:
+        queryset, after, limit, by_update = export_query(spec, request.GET)
+    except ValueError as e:
+        return HttpResponse(str(e), status=400)
+
+    alias = await run_in_pool("orm", reporting_db)
+    page_end, watermark, last = await run_in_pool("orm", export_bounds, queryset, alias, after, limit, by_update)
+    return _export_response(
+        _stream_export_async(spec, alias, encoder, queryset, after, last, by_update),
+        spec, encoder, request, page_end, watermark,
+    )
+
+
+async def _read_file_async(file_path, start=0, length=None, chunk_size=64 * 1024):
+    f = await run_in_pool("io", open, file_path, "rb")
+    try:
+        if start:
+            await run_in_pool("io", f.seek, start)
+        while length is None or length > 0:
+            size = chunk_size if length is None else min(chunk_size, length)
+            chunk = await run_in_pool("io", f.read, size)
+            if not chunk:
+                break
+            if length is not None:
+                length -= len(chunk)
+            yield chunk
+    finally:
+        await run_in_pool("io", f.close)
+
+
+async def download_error_log_async(request, filename):
+    """
+    Async version of download_error_log, the file is streamed in chunks
+    """
+    file_path = await run_in_pool("io", _error_log_path, filename)
+    if file_path is None:
+        return HttpResponse("Error log file not found", status=404)
+
+    size = await run_in_pool("io", os.path.getsize, file_path)
+    try:
+        byte_range = _parse_range(request.headers.get("Range"), size)
+    except ValueError:
+        return _range_not_satisfiable(size)
+
+    if byte_range:
+        start, end = byte_range
+        return _partial_response(_read_file_async(file_path, start, end - start + 1), filename, start, end, size)
+
+    response = StreamingHttpResponse(_read_file_async(file_path), content_type=_error_log_content_type(filename))
+    response["Content-Length"] = str(size)
+    response["Accept-Ranges"] = "bytes"
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
     return response
 
 def debug_csv_upload(request):
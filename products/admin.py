@@ -1,8 +1,36 @@
+from django import forms
 from django.contrib import admin
-from .models import Product
+from .models import InventoryMovement, Product
 # Register your models here.
 
 
+class ProductAdminForm(forms.ModelForm):
+    """
+    Shows the current stock (snapshot plus ledger) in stock_quantity. The stock shown when
+    the page was rendered comes back in stock_shown, so a save only replaces the stock when
+    the admin changed it, and orders placed while the form was open are not lost.
+    """
+
+    stock_shown = forms.IntegerField(required=False, widget=forms.HiddenInput)
+
+    class Meta:
+        model = Product
+        fields = "__all__"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # the stored snapshot, construct_instance() overwrites stock_quantity on the instance
+        self.stock_snapshot = self.instance.stock_quantity
+        if self.instance.pk is not None:
+            current_stock = getattr(self.instance, "current_stock", None)
+            if current_stock is None:
+                current_stock = self.instance.available_stock()
+            self.initial["stock_quantity"] = self.initial["stock_shown"] = current_stock
+
+    def stock_changed(self):
+        return self.cleaned_data["stock_quantity"] != self.cleaned_data.get("stock_shown")
+
+
 class ProductAdmin(admin.ModelAdmin):
     list_display = (
         "product_id",
@@ -10,13 +38,40 @@ class ProductAdmin(admin.ModelAdmin):
         "sku",
         "description",
         "price",
-        "stock_quantity",
+        "current_stock",
         "weight",
         "created_at",
     )
     list_display_links = ("product_id", "name")
     search_fields = ("name", "sku", "description")
     list_per_page = 25
+    form = ProductAdminForm
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_stock()
+
+    @admin.display(description="Stock", ordering="current_stock")
+    def current_stock(self, obj):
+        return obj.current_stock
+
+    def save_model(self, request, obj, form, change):
+        if change:
+            if form.stock_changed():
+                # a new absolute stock, the ledger lock (PostgreSQL) is taken in the save's transaction
+                obj.set_stock(form.cleaned_data["stock_quantity"])
+            else:
+                # keep the stored snapshot and its watermark, the movements since still count
+                obj.stock_quantity = form.stock_snapshot
+        super().save_model(request, obj, form, change)
+
+
+class InventoryMovementAdmin(admin.ModelAdmin):
+    list_display = ("id", "product", "delta", "reason", "order_id", "created_at")
+    list_filter = ("reason",)
+    list_select_related = ("product",)
+    search_fields = ("product__sku",)
+    list_per_page = 25
 
 
 admin.site.register(Product, ProductAdmin)
+admin.site.register(InventoryMovement, InventoryMovementAdmin)
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_alter_product_name_alter_product_price_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='row_hash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_product_row_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['updated_at', 'product_id'], name='products_pr_updated_020a75_idx'),
+        ),
+    ]
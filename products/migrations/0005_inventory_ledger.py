@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0004_order_access_path_indexes'),
+        ('products', '0004_product_updated_at_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='stock_movement_id',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.CreateModel(
+            name='InventoryMovement',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('delta', models.IntegerField()),
+                ('reason', models.CharField(choices=[('order_created', 'Order created'), ('order_changed', 'Order quantity changed'), ('order_deleted', 'Order deleted')], max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('order', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='inventory_movements', to='orders.order')),
+                ('product', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='movements', to='products.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', 'id'], name='products_in_product_5ca663_idx')],
+            },
+        ),
+    ]
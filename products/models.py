@@ -1,9 +1,69 @@
 # models.py - Add to your existing Product model
 import re
-from django.db import models
+from django.db import connection, models, transaction
+from django.db.models import Exists, F, Max, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
 from django.core.validators import MinValueValidator
 from django.core.validators import MinLengthValidator
 from django.core.exceptions import ValidationError
+from decimal import Decimal
+from django.utils import timezone
+from pages.helper import row_fingerprint
+
+
+class ProductQuerySet(models.QuerySet):
+    def with_stock(self):
+        """
+        Annotate current_stock (the stock snapshot plus the ledger movements after it) and
+        last_movement_id (what Product.set_stock() would otherwise look up)
+        """
+        movements = InventoryMovement.objects.filter(product=OuterRef("pk")).order_by()
+        moved = (
+            movements.filter(id__gt=OuterRef("stock_movement_id"))
+            .values("product")
+            .annotate(total=Sum("delta"))
+            .values("total")
+        )
+        return self.annotate(
+            current_stock=F("stock_quantity") + Coalesce(Subquery(moved), 0),
+            last_movement_id=Subquery(movements.order_by("-id").values("id")[:1]),
+        )
+
+    def snapshot_stock(self):
+        """
+        Fold the ledger movements up to the current latest one into stock_quantity, one UPDATE
+        for the products that have any. Returns (products updated, watermark).
+        """
+        with transaction.atomic():
+            lock_movements()
+            upto = InventoryMovement.objects.aggregate(upto=Max("id"))["upto"]
+            if upto is None:
+                return 0, 0
+            pending = InventoryMovement.objects.filter(
+                product=OuterRef("pk"), id__gt=OuterRef("stock_movement_id"), id__lte=upto
+            ).order_by()
+            moved = pending.values("product").annotate(total=Sum("delta")).values("total")
+            updated = self.filter(Exists(pending)).update(
+                stock_quantity=F("stock_quantity") + Subquery(moved),
+                stock_movement_id=upto,
+                # the fingerprint was taken with the old stock, the next import recomputes it
+                row_hash="",
+                updated_at=timezone.now(),
+            )
+        return updated, upto
+
+
+def lock_movements():
+    """
+    Wait for the transactions still adding ledger movements and hold off new ones until the
+    current transaction ends, so every movement id up to the latest one is committed.
+    PostgreSQL hands out an id when the row is inserted, a movement with a lower id than a
+    new watermark could otherwise commit after the snapshot and never be counted.
+    SQLite has one writer, ids there are committed in order.
+    """
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute(f"LOCK TABLE {InventoryMovement._meta.db_table} IN SHARE MODE")
 
 
 class Product(models.Model):
@@ -37,6 +97,36 @@ class Product(models.Model):
         help_text="Weight in kg (optional)",
     )
     created_at = models.DateTimeField(auto_now_add=True)
+    # bumped on every save, drives the incremental (?since=) exports
+    updated_at = models.DateTimeField(auto_now=True)
+    # fingerprint of the imported fields, lets a re-import skip unchanged rows
+    row_hash = models.CharField(max_length=64, blank=True, default="", editable=False)
+    # stock_quantity is a snapshot that includes every InventoryMovement of the product
+    # up to this id; orders only append movements (see snapshot_inventory)
+    stock_movement_id = models.BigIntegerField(default=0, editable=False)
+
+    objects = ProductQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # changes since a watermark, in (updated_at, pk) order
+            models.Index(fields=["updated_at", "product_id"]),
+        ]
+
+    @staticmethod
+    def fingerprint(name, sku, description, price, stock_quantity, weight):
+        # decimals are compared at their column scale so 10, 10.0 and 10.00 match
+        return row_fingerprint(
+            name,
+            sku,
+            description or "",
+            f"{Decimal(str(price)):.2f}",
+            int(stock_quantity),
+            f"{Decimal(str(weight)):.3f}" if weight is not None else "",
+        )
+
+    def compute_row_hash(self):
+        return self.fingerprint(self.name, self.sku, self.description, self.price, self.stock_quantity, self.weight)
 
     def clean(self):
         errors = {}
@@ -74,5 +164,71 @@ class Product(models.Model):
         if errors:
             raise ValidationError(errors)
 
+    def available_stock(self):
+        """Current stock: the snapshot plus the movements appended after it"""
+        moved = self.movements.filter(id__gt=self.stock_movement_id).aggregate(total=Sum("delta"))["total"]
+        return self.stock_quantity + (moved or 0)
+
+    def set_stock(self, quantity):
+        """
+        Replace the stock outright (import, admin), the new snapshot starts after the latest movement.
+        Call it in the transaction that saves the product: on PostgreSQL it locks the ledger
+        against new movements (lock_movements) until that transaction ends.
+        """
+        self.stock_quantity = quantity
+        if not self.pk:
+            self.stock_movement_id = 0
+        elif connection.vendor == "postgresql":
+            # the with_stock() annotation was read before the lock, a movement may have committed since
+            lock_movements()
+            self.stock_movement_id = self.movements.order_by("-id").values_list("id", flat=True).first() or 0
+        elif hasattr(self, "last_movement_id"):
+            self.stock_movement_id = self.last_movement_id or 0
+        else:
+            self.stock_movement_id = self.movements.order_by("-id").values_list("id", flat=True).first() or 0
+
+    def save(self, *args, **kwargs):
+        self.row_hash = self.compute_row_hash()
+        if kwargs.get("update_fields") is not None:
+            # auto_now only applies to fields that are saved
+            kwargs["update_fields"] = {*kwargs["update_fields"], "row_hash", "updated_at"}
+            if "stock_quantity" in kwargs["update_fields"]:
+                kwargs["update_fields"].add("stock_movement_id")
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.name} ({self.sku})"
+
+
+class InventoryMovement(models.Model):
+    """
+    Append-only stock ledger. Orders add a row instead of rewriting Product.stock_quantity,
+    so concurrent orders for one product never wait on its row lock.
+    """
+
+    REASON_CHOICES = [
+        ("order_created", "Order created"),
+        ("order_changed", "Order quantity changed"),
+        ("order_deleted", "Order deleted"),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    # served by the (product, id) index
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="movements", db_index=False)
+    delta = models.IntegerField()
+    reason = models.CharField(max_length=20, choices=REASON_CHOICES)
+    # no constraint and no cascade, the audit trail keeps the id of a deleted order
+    order = models.ForeignKey(
+        "orders.Order", null=True, blank=True, on_delete=models.DO_NOTHING, db_constraint=False,
+        related_name="inventory_movements",
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # movements after a product's snapshot watermark
+            models.Index(fields=["product", "id"]),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id}: {self.delta:+d} ({self.reason})"
@@ -1,3 +1,143 @@
+import io
+import os
+import tempfile
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
 from django.test import TestCase
+from django.urls import reverse
+
+from customers.models import Customer
+from orders.models import Order
+from pages.models import ImportRun
+
+from .models import InventoryMovement, Product
+from .views import import_products_with_validation
+
+HEADER = "name,sku,description,price,stock_quantity,weight\n"
+
+
+class ProductImportTests(TestCase):
+    def run_import(self, rows, **kwargs):
+        with tempfile.TemporaryDirectory() as directory:
+            return import_products_with_validation(
+                io.StringIO(HEADER + rows), os.path.join(directory, "errors.txt"), **kwargs
+            )
+
+    def test_repeated_sku_in_one_batch(self):
+        success_count, error_count, errors = self.run_import(
+            "Widget,W-1,,10.00,5,\nWidget,W-1,,10.00,5,\nWidget,W-1,,12.00,7,\n"
+        )
+        self.assertEqual((success_count, error_count, errors), (1, 0, []))
+        product = Product.objects.with_stock().get(sku="W-1")
+        self.assertEqual((product.price, product.current_stock), (12, 7))
+
+    def test_header_in_any_order(self):
+        with tempfile.TemporaryDirectory() as directory:
+            result = import_products_with_validation(
+                io.StringIO("SKU,Stock Quantity,Price,Product Name,name\nW-1,4,$1.50,ignored,Widget\n"),
+                os.path.join(directory, "errors.txt"),
+            )
+        self.assertEqual(result, (1, 0, []))
+        product = Product.objects.get(sku="W-1")
+        self.assertEqual((product.name, product.price, product.stock_quantity, product.weight), ("Widget", Decimal("1.50"), 4, None))
+
+    def test_dry_run_writes_nothing(self):
+        self.run_import("Widget,W-1,,10.00,5,\n")
+        rows = "Widget,W-1,,10.00,5,\nWidget,W-1,,11.00,5,\nGadget,G-1,,5.00,2,\nBad,B-1,,abc,1,\n"
+
+        self.assertEqual(self.run_import(rows, dry_run=True)[:2], (1, 1))
+        self.assertEqual(list(Product.objects.values_list("sku", "price")), [("W-1", 10)])
+        self.assertFalse(InventoryMovement.objects.filter(product__sku="G-1").exists())
+
+        self.assertEqual(self.run_import(rows)[:2], (1, 1))
+        self.assertEqual(sorted(Product.objects.values_list("sku", "price")), [("G-1", 5), ("W-1", 11)])
+
+    def test_unchanged_rows_are_skipped_on_reimport(self):
+        self.run_import("Widget,W-1,,10.00,5,\nGadget,G-1,Small,5.50,2,0.25\n")
+        run = ImportRun.objects.create(model_type="product")
+        # the same values at another scale are the same fingerprint
+        self.assertEqual(self.run_import("Widget,W-1,,10,5,\nGadget,G-1,Small,5.5,2,0.250\n", import_run=run)[:2], (0, 0))
+        self.assertEqual(run.unchanged_count, 2)
+
+    def test_product_with_orders_since_the_snapshot_is_not_unchanged(self):
+        self.run_import("Widget,W-1,,10.00,5,\n")
+        customer = Customer.objects.create(name="Stock Tester", email="stock@example.com")
+        Order.objects.create(
+            customer=customer, product=Product.objects.get(sku="W-1"), quantity=2,
+            order_date="2024-01-01T00:00:00Z", total_amount=20,
+        )
+        run = ImportRun.objects.create(model_type="product")
+        self.run_import("Widget,W-1,,10.00,5,\n", import_run=run)
+        self.assertEqual(run.unchanged_count, 0)
+        self.assertEqual(Product.objects.get(sku="W-1").available_stock(), 5)
+
+    def test_reimport_keeps_ledger_movements_out_of_the_new_stock(self):
+        self.run_import("Widget,W-1,,10.00,5,\n")
+        customer = Customer.objects.create(name="Stock Tester", email="stock@example.com")
+        Order.objects.create(
+            customer=customer, product=Product.objects.get(sku="W-1"), quantity=2,
+            order_date="2024-01-01T00:00:00Z", total_amount=20,
+        )
+        self.assertEqual(Product.objects.with_stock().get(sku="W-1").current_stock, 3)
+
+        self.run_import("Widget,W-1,,10.00,40,\n")
+        self.assertEqual(Product.objects.get(sku="W-1").available_stock(), 40)
+
+
+class StockSnapshotTests(TestCase):
+    def test_snapshot_folds_movements_into_stock(self):
+        product = Product.objects.create(name="Widget", sku="W-1", price=10, stock_quantity=10)
+        other = Product.objects.create(name="Gadget", sku="G-1", price=5, stock_quantity=3)
+        InventoryMovement.objects.create(product=product, delta=-4, reason="order_created")
+        InventoryMovement.objects.create(product=product, delta=1, reason="order_deleted")
+
+        updated, upto = Product.objects.snapshot_stock()
+
+        self.assertEqual(updated, 1)
+        product.refresh_from_db()
+        self.assertEqual((product.stock_quantity, product.stock_movement_id), (7, upto))
+        self.assertEqual(product.available_stock(), 7)
+        other.refresh_from_db()
+        self.assertEqual(other.stock_quantity, 3)
+        self.assertEqual(Product.objects.snapshot_stock(), (0, upto))
+
+
+class ProductAdminTests(TestCase):
+    def setUp(self):
+        self.client.force_login(get_user_model().objects.create_superuser("admin", password="secret"))
+        self.product = Product.objects.create(name="Widget", sku="W-1", price=10, stock_quantity=10)
+        self.customer = Customer.objects.create(name="Stock Tester", email="stock@example.com")
+        self.url = reverse("admin:products_product_change", args=[self.product.pk])
+
+    def order(self, quantity):
+        Order.objects.create(
+            customer=self.customer, product=self.product, quantity=quantity,
+            order_date="2024-01-01T00:00:00Z", total_amount=10 * quantity,
+        )
+
+    def post(self, stock_quantity, stock_shown, name="Widget"):
+        data = {"name": name, "sku": "W-1", "description": "", "price": "10.00", "weight": "",
+                "stock_quantity": stock_quantity, "stock_shown": stock_shown}
+        response = self.client.post(self.url, data)
+        self.assertEqual(response.status_code, 302)
+
+    def test_change_page_shows_the_current_stock(self):
+        self.order(3)
+        form = self.client.get(self.url).context["adminform"].form
+        self.assertEqual((form.initial["stock_quantity"], form.initial["stock_shown"]), (7, 7))
+
+    def test_orders_placed_while_the_form_is_open_are_kept(self):
+        self.order(3)
+        shown = self.client.get(self.url).context["adminform"].form.initial["stock_shown"]
+        self.order(2)
+
+        self.post(shown, shown, name="Widget Pro")
+        product = Product.objects.get(pk=self.product.pk)
+        self.assertEqual((product.name, product.available_stock()), ("Widget Pro", 5))
 
-# Create your tests here.
+        # a changed stock replaces it outright
+        self.post(40, 5)
+        self.assertEqual(Product.objects.get(pk=self.product.pk).available_stock(), 40)
+        self.order(1)
+        self.assertEqual(Product.objects.get(pk=self.product.pk).available_stock(), 39)
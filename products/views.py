@@ -3,12 +3,24 @@ from django.shortcuts import render, redirect
 from django.http import HttpResponse
 from django.contrib import messages
 
-# from django.db import transaction
+from django.db import transaction
 from products.models import Product
 from products.forms import ProductCSVForm
+from customers.models import CustomerStats
 
 from pages.helper import parse_numeric_string
+from pages.helper import parse_numeric_columns
+from pages.helper import HAS_NUMPY
 from pages.helper import format_currency
+from pages.helper import open_error_log
+from pages.helper import ImportErrorRecorder
+from pages.helper import ImportProfiler
+from pages.helper import RowDebugLog
+from pages.metrics import ImportMeter
+from pages.helper import batched_rows
+from pages.helper import OffsetTrackingLines
+from pages.helper import RowProjection
+from pages.helper import save_import_checkpoint
 
 from django.conf import settings
 import os
@@ -19,6 +31,15 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# price / stock / weight as ProductCSVForm accepts them, for the columnar check:
+# (kind, whole digits, decimal places, value when empty). Stock stops at 9 digits so
+# anything near the IntegerField limit takes the scalar path and its messages.
+NUMERIC_COLUMNS = {
+    "price": ("float", 8, 2, 0.0),
+    "stock_quantity": ("int", 9, None, 0),
+    "weight": ("float", 5, 3, None),
+}
+
 def validate_sku_format(sku):
     """Validate SKU format"""
     import re
@@ -34,14 +55,26 @@ def validate_sku_format(sku):
         return False, "SKU cannot be empty"
     return True, ""
 
-def import_products_with_validation(decoded_data, error_log_path, encoding="utf-8",delete_existing=False):
+def import_products_with_validation(decoded_data, error_log_path, encoding="utf-8",delete_existing=False, import_run=None, dry_run=False, resume=False, base_offset=0, lookup=None, batch_size=None):
     """
     Import products with comprehensive validation and error logging
+    Row errors are also stored against import_run (pages.models.ImportRun) when given
+    dry_run validates against the existing SKUs loaded once and writes nothing
+    Each batch commits in one transaction together with its checkpoint on import_run;
+    resume=True continues that run's counters and row numbers (see resume_import)
+    decoded_data is the decoded file or a text stream of its lines (large uploads are never read whole)
+    lookup (pages.helper.ImportLookup) collects the imported products by SKU for a bundle import
+    batch_size rows are committed per transaction (default IMPORT_BATCH_SIZE)
     """
+    recorder = ImportErrorRecorder(import_run, "product")
+    profiler = ImportProfiler("Product import")
+    row_log = RowDebugLog(logger)
+    meter = ImportMeter("product", dry_run)
+    error_file = None
     try:
         # ====== DELETE EXISTING PRODUCTS IF REQUESTED ======
         products_deleted = 0
-        if delete_existing:
+        if delete_existing and not dry_run:
             try:
                 # Get count before deletion
                 products_deleted = Product.objects.count()
@@ -49,30 +82,44 @@ def import_products_with_validation(decoded_data, error_log_path, encoding="utf-
                 # Delete all orders
                 deleted_info = Product.objects.all().delete()
                 products_deleted = deleted_info[0] if deleted_info else 0
+                # the orders went with them (cascade), so did every customer's order counters
+                CustomerStats.objects.all().delete()
 
-                logger.info(
-                    f"Deleted {products_deleted} existing products before import"
-                )
+                logger.info("Deleted %s existing products before import", products_deleted)
             except Exception as delete_error:
-                logger.error(f"Error deleting existing products: {str(delete_error)}")
+                logger.error("Error deleting existing products: %s", delete_error)
                 return 0, 0, [f"Error clearing existing products: {str(delete_error)}"]
             
-        # Create StringIO object from decoded data
-        io_string = io.StringIO(decoded_data)
+        # ====== DRY RUN: load existing SKUs once, nothing is written ======
+        existing_skus = None
+        if dry_run:
+            existing_skus = {}
+            if not delete_existing:
+                # a product with orders after its stock snapshot is never unchanged
+                existing_skus = {
+                    sku: row_hash if current_stock == stock_quantity else ""
+                    for sku, row_hash, stock_quantity, current_stock in Product.objects.with_stock().values_list(
+                        "sku", "row_hash", "stock_quantity", "current_stock"
+                    )
+                }
+
+        profiler.switch("sniff")
+        # Line iterator that tracks the byte offset of each row for checkpoints
+        lines = OffsetTrackingLines(decoded_data, encoding, base_offset)
 
         # Try to detect dialect
-        sample = decoded_data[:1024]
+        sample = lines.sample()
         sniffer = csv.Sniffer()
 
         try:
             dialect = sniffer.sniff(sample)
             delimiter = dialect.delimiter
-            logger.info(f"Detected CSV delimiter: {repr(delimiter)}")
+            logger.info("Detected CSV delimiter: %r", delimiter)
         except:
             delimiter = ","
             logger.warning("Could not detect CSV delimiter, using comma")
 
-        reader = csv.reader(io_string, delimiter=delimiter, quotechar='"')
+        reader = csv.reader(lines, delimiter=delimiter, quotechar='"')
 
         # Read header
         try:
@@ -83,264 +130,368 @@ def import_products_with_validation(decoded_data, error_log_path, encoding="utf-
             return 0, 0, [f"Error reading CSV header: {str(e)}"]
 
         # Log header info
-        logger.info(f"Product CSV Header: {header}")
-        logger.info(f"Number of columns: {len(header)}")
-
-        # # Normalize header names
-        # normalized_header = [col.strip().lower() for col in header]
-        # logger.info(f"Normalized Header: {normalized_header}")
+        logger.info("Product CSV Header: %s", header)
+        logger.info("Number of columns: %s", len(header))
 
-        # Map column indices (flexible column mapping)
-        column_mapping = {}
+        # Match the header to the fields by name once, in any column order
         expected_columns = ["name","sku","description","price","stock_quantity","weight",]
-
-       
-        # If no mapping found, assume standard order
-        if not column_mapping:
-            column_mapping = {
-                expected: i
-                for i, expected in enumerate(expected_columns[: len(header)])
-            }
-
-        logger.info(f"Product Column mapping: {column_mapping}")
+        project_row = RowProjection(header, expected_columns)
+        column_mapping = project_row.mapping
+        missing_columns = project_row.missing_required(ProductCSVForm)
+        if missing_columns:
+            return 0, 0, [f"CSV header is missing required column(s): {', '.join(missing_columns)} (header: {header})"]
+        header_warnings = project_row.warnings()
+        for warning in header_warnings:
+            logger.warning("Product CSV: %s", warning)
+
+        logger.info("Product Column mapping: %s", column_mapping)
+
+        # Open error log file, the row lines are written after each batch
+        error_file = open_error_log(error_log_path)
+        error_file.write(f"Product Import Error Log - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+        error_file.write("=" * 80 + "\n\n")
+        if dry_run:
+            error_file.write("DRY RUN - validation only, no data was written\n")
+        error_file.write(f"Encoding: {encoding}\n")
+        error_file.write(f"Delimiter: {repr(delimiter)}\n")
+        error_file.write(f"Header: {header}\n")
+        error_file.write(f"Column Mapping: {column_mapping}\n")
+        for warning in header_warnings:
+            error_file.write(f"Header warning: {warning}\n")
+        error_file.write("-" * 80 + "\n\n")
 
         success_count = 0
         error_count = 0
         error_details = []
-        error_log_content = []  # Store log lines in memory
+        error_log_content = []  # log lines of the current batch
         
-        for row_num, row in enumerate(reader, start=2):
-            print("product row num",row_num)
-            row_errors = []
-
-            # Log raw row
-            error_log_content.append(f"Row {row_num}: {row}\n")
-
-            # Check for empty row
-            if not row or not any(cell and str(cell).strip() for cell in row):
-                error_log_content.append(f"  [SKIPPED] Empty row\n\n")
-                error_count += 1
-                error_details.append(f"Row {row_num}: Empty row")
-                continue
+        unchanged_count = 0
+        start_row = 2
+        if resume and import_run is not None:
+            success_count = import_run.success_count
+            error_count = import_run.error_count
+            unchanged_count = import_run.unchanged_count
+            start_row = import_run.checkpoint_row + 1 if import_run.checkpoint_row else 2
+        sku_index = column_mapping.get("sku")
+
+        columnar = settings.IMPORT_COLUMNAR_NUMERICS and HAS_NUMPY
+        if settings.IMPORT_COLUMNAR_NUMERICS and not HAS_NUMPY:
+            logger.warning("IMPORT_COLUMNAR_NUMERICS is set but NumPy is not installed, parsing numbers row by row")
+        numeric_indexes = {field: column_mapping.get(field) for field in NUMERIC_COLUMNS}
+
+        meter.start(success_count, error_count, unchanged_count)
+        # "read" is decoding and CSV parsing, batched_rows pulls them a batch at a time
+        profiler.switch("read")
+        for batch in batched_rows(reader, start=start_row, batch_size=batch_size or settings.IMPORT_BATCH_SIZE):
+            profiler.switch("database")
+            # one indexed read per batch for the products that already exist
+            existing_products = {}
+            if not dry_run and sku_index is not None:
+                batch_skus = {row[sku_index].strip() for _, row in batch if sku_index < len(row)}
+                existing_products = {p.sku: p for p in Product.objects.with_stock().filter(sku__in=batch_skus)}
+
+            # optional: check the numeric columns of the whole batch at once,
+            # rows that do not pass take the row by row path below for their error messages
+            profiler.switch("validate")
+            batch_numbers = {}
+            if columnar:
+                columns = {
+                    field: [row[index].strip() if index is not None and index < len(row) else "" for _, row in batch]
+                    for field, index in numeric_indexes.items()
+                }
+                values, ok = parse_numeric_columns(columns, NUMERIC_COLUMNS)
+                batch_numbers = {
+                    row_num: {field: values[field][i] for field in NUMERIC_COLUMNS}
+                    for i, (row_num, _) in enumerate(batch)
+                    if ok[i]
+                }
+
+            # the batch and its checkpoint commit together
+            with transaction.atomic():
+                for row_num, row in batch:
+                    row_log(row_num, "%s", row)
+                    row_errors = []
+
+                    # Log raw row
+                    error_log_content.append(f"Row {row_num}: {row}\n")
+
+                    # Check for empty row
+                    if not row or not any(cell and str(cell).strip() for cell in row):
+                        error_log_content.append(f"  [SKIPPED] Empty row\n\n")
+                        error_count += 1
+                        error_details.append(f"Row {row_num}: Empty row")
+                        recorder.add(row_num, "empty_row", "Empty row", raw_data=row)
+                        continue
 
-            try:
-                # Extract data based on column mapping
-                data = {}
-                for field, col_index in column_mapping.items():
-                    if col_index < len(row):
-                        value = row[col_index]
-                        if value is not None:
-                            data[field] = str(value).strip()
+                    try:
+                        profiler.switch("validate")
+                        # One call: the header was matched to the fields up front
+                        data = project_row(row)
+
+                        numbers = batch_numbers.get(row_num)
+                        if numbers is not None:
+                            # price / stock / weight already passed the columnar check for this batch
+                            data.update(numbers)
                         else:
-                            data[field] = ""
-                    else:
-                        data[field] = ""
-
-                # Ensure all fields are present
-                for field in expected_columns:
-                    if field not in data:
-                        data[field] = ""
-
-                # Special handling for numeric fields
-                # Convert empty strings to None for optional fields
-                if data.get("weight", "").strip() == "":
-                    data["weight"] = ""
-
-                # Convert numeric fields, handle commas as thousands separators
-                for field in ["price", "stock_quantity", "weight"]:
-                    if field in data and data[field]:
-                        # Remove currency symbols, commas, and whitespace
-                        value_str = str(data[field]).strip()
-                        value_str = (
-                            value_str.replace("$", "").replace("€", "").replace("£", "")
-                        )
-                        value_str = value_str.replace(",", "")
-
-                        try:
-                            if field == "stock_quantity":
-                                # Remove decimal for integer
-                                if "." in value_str:
-                                    value_str = value_str.split(".")[0]
-                                data[field] = int(value_str) if value_str else 0
-                            elif field in ["price", "weight"]:
-                                data[field] = float(value_str) if value_str else ""
-                        except ValueError:
-                            # Keep original for validation error
-                            pass
-
-                # ====== USE HELPER 1: Parse numeric fields ======
-                try:
-                    # Parse price using helper
-                    if data.get("price"):
-                        data["price"] = parse_numeric_string(data["price"], "float")
-                    else:
-                        data["price"] = 0.0
-                except ValueError as e:
-                    row_errors.append(f"Invalid price format: {str(e)}")
-                    data["price"] = data.get(
-                        "price", ""
-                    )  # Keep original for error display
-
-                try:
-                    # Parse stock quantity using helper
-                    if data.get('stock_quantity'):
-                        data['stock_quantity'] = parse_numeric_string(data['stock_quantity'], 'int')
-                    else:
-                        data['stock_quantity'] = 0
-                except ValueError as e:
-                    row_errors.append(f"Invalid stock quantity format: {str(e)}")
-                    data['stock_quantity'] = data.get('stock_quantity', '')
+                            # Special handling for numeric fields
+                            # Convert empty strings to None for optional fields
+                            if data.get("weight", "").strip() == "":
+                                data["weight"] = ""
+
+                            # Convert numeric fields, handle commas as thousands separators
+                            for field in ["price", "stock_quantity", "weight"]:
+                                if field in data and data[field]:
+                                    # Remove currency symbols, commas, and whitespace
+                                    value_str = str(data[field]).strip()
+                                    value_str = (
+                                        value_str.replace("$", "").replace("€", "").replace("£", "")
+                                    )
+                                    value_str = value_str.replace(",", "")
+
+                                    try:
+                                        if field == "stock_quantity":
+                                            # Remove decimal for integer
+                                            if "." in value_str:
+                                                value_str = value_str.split(".")[0]
+                                            data[field] = int(value_str) if value_str else 0
+                                        elif field in ["price", "weight"]:
+                                            data[field] = float(value_str) if value_str else ""
+                                    except ValueError:
+                                        # Keep original for validation error
+                                        pass
+
+                            # ====== USE HELPER 1: Parse numeric fields ======
+                            try:
+                                # Parse price using helper
+                                if data.get("price"):
+                                    data["price"] = parse_numeric_string(data["price"], "float")
+                                else:
+                                    data["price"] = 0.0
+                            except ValueError as e:
+                                row_errors.append(f"Invalid price format: {str(e)}")
+                                recorder.add(row_num, "invalid_number", f"Invalid price format: {str(e)}", field="price", raw_data=row)
+                                data["price"] = data.get(
+                                    "price", ""
+                                )  # Keep original for error display
+
+                            try:
+                                # Parse stock quantity using helper
+                                if data.get('stock_quantity'):
+                                    data['stock_quantity'] = parse_numeric_string(data['stock_quantity'], 'int')
+                                else:
+                                    data['stock_quantity'] = 0
+                            except ValueError as e:
+                                row_errors.append(f"Invalid stock quantity format: {str(e)}")
+                                recorder.add(row_num, "invalid_number", f"Invalid stock quantity format: {str(e)}", field="stock_quantity", raw_data=row)
+                                data['stock_quantity'] = data.get('stock_quantity', '')
                     
-                try:
-                    # Parse weight using helper (optional field)
-                    if data.get('weight') and str(data['weight']).strip():
-                        data['weight'] = parse_numeric_string(data['weight'], 'float')
-                    else:
-                        data['weight'] = None  # Set to None for optional field
-                except ValueError as e:
-                    row_errors.append(f"Invalid weight format: {str(e)}")
-                    print("weight",row_errors)
-                    data['weight'] = data.get('weight', '')
+                            try:
+                                # Parse weight using helper (optional field)
+                                if data.get('weight') and str(data['weight']).strip():
+                                    data['weight'] = parse_numeric_string(data['weight'], 'float')
+                                else:
+                                    data['weight'] = None  # Set to None for optional field
+                            except ValueError as e:
+                                row_errors.append(f"Invalid weight format: {str(e)}")
+                                recorder.add(row_num, "invalid_number", f"Invalid weight format: {str(e)}", field="weight", raw_data=row)
+                                row_log(row_num, "invalid weight %r", data.get("weight"))
+                                data['weight'] = data.get('weight', '')
                     
                 
-                # ====== USE HELPER 2: Validate SKU format ======
-                sku_value = data.get('sku', '')
-                if sku_value:
-                    sku_valid, sku_error_msg = validate_sku_format(sku_value)
-                    if not sku_valid:
-                        row_errors.append(sku_error_msg)
+                        # ====== USE HELPER 2: Validate SKU format ======
+                        sku_value = data.get('sku', '')
+                        if sku_value:
+                            sku_valid, sku_error_msg = validate_sku_format(sku_value)
+                            if not sku_valid:
+                                row_errors.append(sku_error_msg)
+                                recorder.add(row_num, "invalid_sku", sku_error_msg, field="sku", raw_data=row)
                 
-                # If we already have errors from helper functions, skip form validation
-                if row_errors:
-                    error_count += 1
-                    for error in row_errors:
-                        error_details.append(f"Row {row_num}: {error}")
-                    error_log_content.append(f"  ❌ PRE-VALIDATION ERRORS:\n")
-                    for error in row_errors:
-                        error_log_content.append(f"     • {error}\n")
-                    error_log_content.append(f"     Raw data: {data}\n\n")
-                    continue
+                        # If we already have errors from helper functions, skip form validation
+                        if row_errors:
+                            error_count += 1
+                            for error in row_errors:
+                                error_details.append(f"Row {row_num}: {error}")
+                            error_log_content.append(f"  ❌ PRE-VALIDATION ERRORS:\n")
+                            for error in row_errors:
+                                error_log_content.append(f"     • {error}\n")
+                            error_log_content.append(f"     Raw data: {data}\n\n")
+                            continue
                 
-                # Log extracted data
-                error_log_content.append(f"  Extracted data: {data}\n")
-
-                # Validate using form
-                form = ProductCSVForm(data)
-
-                if form.is_valid():
-                    cleaned_data = form.cleaned_data
-
-                    try:
-                        # Check for duplicate SKU
-                        print(cleaned_data["sku"]);
-                        if Product.objects.filter(sku=cleaned_data["sku"]).exists():
-                            product = Product.objects.get(sku=cleaned_data["sku"])
-
-                            # Check if we should update or skip
-                            update_existing = True  # You can make this configurable
-
-                            if update_existing:
-                                # Update existing product
-                                product.name = cleaned_data["name"]
-                                product.description = (cleaned_data.get("description") or "")
-                                product.price = cleaned_data["price"]
-                                product.stock_quantity = cleaned_data["stock_quantity"]
-                                product.weight = cleaned_data.get("weight")
-                                product.save()
-                                error_log_content.append(f"  ✅ UPDATED existing product: {cleaned_data['sku']}\n\n")
-                            else:
-                                error_log_content.append(f"  ⚠️ SKIPPED duplicate SKU: {cleaned_data['sku']}\n\n")
-                                error_count += 1
-                                error_details.append(f"Row {row_num}: Duplicate SKU - {cleaned_data['sku']}")
-                                success_count += 1
-                                continue
-                        else:
-                            # Create new product
-                            Product.objects.create(
-                                name=cleaned_data["name"],
-                                sku=cleaned_data["sku"],
-                                description=cleaned_data.get("description") or "",
-                                price=cleaned_data["price"],
-                                stock_quantity=cleaned_data["stock_quantity"],
-                                weight=cleaned_data.get("weight"),
-                            )
-                            success_count += 1
-                            error_log_content.append(f"  ✅ CREATED new product: {cleaned_data['sku']}\n\n")
+                        # Log extracted data
+                        error_log_content.append(f"  Extracted data: {data}\n")
+
+                        # Validate using form
+                        form = ProductCSVForm(data)
+                        is_valid = form.is_valid()
+                        profiler.switch("database")
+
+                        if is_valid:
+                            cleaned_data = form.cleaned_data
+
+                            try:
+                                # Check for duplicate SKU
+                                row_hash = Product.fingerprint(
+                                    cleaned_data["name"],
+                                    cleaned_data["sku"],
+                                    cleaned_data.get("description"),
+                                    cleaned_data["price"],
+                                    cleaned_data["stock_quantity"],
+                                    cleaned_data.get("weight"),
+                                )
+                                if dry_run:
+                                    if lookup is not None and existing_skus.get(cleaned_data["sku"]) != row_hash:
+                                        # unsaved, lets a dry-run order stage check stock against the file
+                                        lookup.products[cleaned_data["sku"]] = Product(
+                                            name=cleaned_data["name"],
+                                            sku=cleaned_data["sku"],
+                                            stock_quantity=cleaned_data["stock_quantity"],
+                                        )
+                                    if existing_skus.get(cleaned_data["sku"]) == row_hash:
+                                        unchanged_count += 1
+                                        error_log_content.append(f"  ⏭️ UNCHANGED product: {cleaned_data['sku']}\n\n")
+                                    elif cleaned_data["sku"] in existing_skus:
+                                        existing_skus[cleaned_data["sku"]] = row_hash
+                                        error_log_content.append(f"  ✅ WOULD UPDATE existing product: {cleaned_data['sku']}\n\n")
+                                    else:
+                                        existing_skus[cleaned_data["sku"]] = row_hash
+                                        success_count += 1
+                                        error_log_content.append(f"  ✅ WOULD CREATE new product: {cleaned_data['sku']}\n\n")
+                                elif cleaned_data["sku"] in existing_products:
+                                    product = existing_products[cleaned_data["sku"]]
+
+                                    # Check if we should update or skip
+                                    update_existing = True  # You can make this configurable
+
+                                    if product.row_hash == row_hash and product.current_stock == product.stock_quantity:
+                                        # same content as the stored row and no orders since, skip the write
+                                        unchanged_count += 1
+                                        error_log_content.append(f"  ⏭️ UNCHANGED product: {cleaned_data['sku']}\n\n")
+                                    elif update_existing:
+                                        # Update existing product
+                                        product.name = cleaned_data["name"]
+                                        product.description = (cleaned_data.get("description") or "")
+                                        product.price = cleaned_data["price"]
+                                        product.weight = cleaned_data.get("weight")
+                                        with transaction.atomic():  # savepoint, a failed row must not break the batch
+                                            product.set_stock(cleaned_data["stock_quantity"])
+                                            product.save(update_fields=["name", "description", "price", "stock_quantity", "weight"])
+                                        # the new snapshot is the current stock, a repeated SKU later in the batch compares with it
+                                        product.current_stock = product.stock_quantity
+                                        product.last_movement_id = product.stock_movement_id
+                                        error_log_content.append(f"  ✅ UPDATED existing product: {cleaned_data['sku']}\n\n")
+                                    else:
+                                        error_log_content.append(f"  ⚠️ SKIPPED duplicate SKU: {cleaned_data['sku']}\n\n")
+                                        error_count += 1
+                                        error_details.append(f"Row {row_num}: Duplicate SKU - {cleaned_data['sku']}")
+                                        success_count += 1
+                                        continue
+                                else:
+                                    # Create new product
+                                    with transaction.atomic():  # savepoint, a failed row must not break the batch
+                                        product = Product.objects.create(
+                                            name=cleaned_data["name"],
+                                            sku=cleaned_data["sku"],
+                                            description=cleaned_data.get("description") or "",
+                                            price=cleaned_data["price"],
+                                            stock_quantity=cleaned_data["stock_quantity"],
+                                            weight=cleaned_data.get("weight"),
+                                        )
+                                    # what with_stock() annotates, for a repeated SKU later in the batch
+                                    product.current_stock = product.stock_quantity
+                                    product.last_movement_id = None
+                                    existing_products[cleaned_data["sku"]] = product
+                                    success_count += 1
+                                    error_log_content.append(f"  ✅ CREATED new product: {cleaned_data['sku']}\n\n")
                             
-                        #print("error_log_content", error_log_content)
+                                #print("error_log_content", error_log_content)
                         
 
-                    except Exception as db_error:
+                            except Exception as db_error:
+                                error_count += 1
+                                error_msg = f"Row {row_num}: Database Error - {str(db_error)}"
+                                row_errors.append(error_msg)
+                                error_details.append(error_msg)
+                                error_log_content.append(f"  ❌ DATABASE ERROR: {str(db_error)}\n")
+                                error_log_content.append(f"     Data: {cleaned_data}\n\n")
+                                recorder.add(row_num, "database", str(db_error), raw_data=data)
+
+                        else:
+                            # Collect all form errors
+                            error_count += 1
+                            for field, field_errors in form.errors.items():
+                                for error in field_errors:
+                                    error_msg = f"Row {row_num}: {field.capitalize()} - {error}"
+                                    row_errors.append(error_msg)
+                                    error_details.append(error_msg)
+
+                            # Write detailed errors to log file
+                            recorder.add_form_errors(row_num, form, raw_data=data)
+                            error_log_content.append(f"  ❌ VALIDATION FAILED:\n")
+                            for field, field_errors in form.errors.items():
+                                for error in field_errors:
+                                    error_log_content.append(f"     • {field}: {error}\n")
+                            error_log_content.append(f"     Raw data: {data}\n\n")
+
+                    except Exception as e:
                         error_count += 1
-                        error_msg = f"Row {row_num}: Database Error - {str(db_error)}"
+                        error_msg = f"Row {row_num}: Processing Error - {str(e)}"
                         row_errors.append(error_msg)
                         error_details.append(error_msg)
-                        error_log_content.append(f"  ❌ DATABASE ERROR: {str(db_error)}\n")
-                        error_log_content.append(f"     Data: {cleaned_data}\n\n")
-
-                else:
-                    # Collect all form errors
-                    error_count += 1
-                    for field, field_errors in form.errors.items():
-                        for error in field_errors:
-                            error_msg = f"Row {row_num}: {field.capitalize()} - {error}"
-                            row_errors.append(error_msg)
-                            error_details.append(error_msg)
-
-                    # Write detailed errors to log file
-                    error_log_content.append(f"  ❌ VALIDATION FAILED:\n")
-                    for field, field_errors in form.errors.items():
-                        for error in field_errors:
-                            error_log_content.append(f"     • {field}: {error}\n")
-                    error_log_content.append(f"     Raw data: {data}\n\n")
-
-            except Exception as e:
-                error_count += 1
-                error_msg = f"Row {row_num}: Processing Error - {str(e)}"
-                row_errors.append(error_msg)
-                error_details.append(error_msg)
-                error_log_content.append(f"  ❌ PROCESSING ERROR: {str(e)}\n")
-                error_log_content.append(f"     Raw row: {row}\n\n")
+                        error_log_content.append(f"  ❌ PROCESSING ERROR: {str(e)}\n")
+                        error_log_content.append(f"     Raw row: {row}\n\n")
+                        recorder.add(row_num, "processing", str(e), raw_data=row)
+
+                recorder.flush()
+                save_import_checkpoint(import_run, lines.offset, row_num, success_count, error_count, unchanged_count)
+
+            if lookup is not None:
+                lookup.products.update(existing_products)
+            profiler.switch("error_log")
+            error_file.writelines(error_log_content)
+            error_log_content.clear()
+            meter.batch(len(batch), success_count, error_count, unchanged_count)
+            profiler.switch("read")
+
+        profiler.switch("database")
+        recorder.flush()
+        if import_run is not None:
+            import_run.unchanged_count = unchanged_count
 
         # Update summary
         total_rows = row_num - 1 if "row_num" in locals() else 0
         
         # Create summary
         summary_lines = [
-            f"Product Import Error Log - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n",
-            "=" * 80 + "\n\n",
-            f"Encoding: {encoding}\n",
-            f"Delimiter: {repr(delimiter)}\n",
+            "=" * 80 + "\n",
+            f"IMPORT SUMMARY - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n",
             f"Total rows processed: {total_rows}\n",
             f"Successful: {success_count}\n",
             f"Failed: {error_count}\n",
             f"Success rate: {(success_count / max(total_rows, 1) * 100):.1f}%\n",
             f"Duplicates handled: {'Update existing'}\n",
-            "-" * 80 + "\n\n",
+            f"Unchanged (skipped): {unchanged_count}\n",
         ]
-        
-        
-        # Open error log file
-        with open(error_log_path, "w", encoding="utf-8") as error_file:
-            error_file.write(f"Product Import Error Log - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-            error_file.write("=" * 80 + "\n\n")
-            error_file.write(f"Encoding: {encoding}\n")
-            error_file.write(f"Delimiter: {repr(delimiter)}\n")
-            error_file.write(f"Header: {header}\n")
-            error_file.write(f"Column Mapping: {column_mapping}\n")
-            error_file.write("-" * 80 + "\n\n")     
-            error_file.writelines(summary_lines)
-            error_file.writelines(row_errors)
-            error_file.writelines(error_log_content)
-            #error_file.write(summary + content[len(summary) :])
+
+        # the rows are already in the log, the summary and profile go after them
+        profiler.switch("error_log")
+        error_file.writelines(summary_lines)
+        profiler.finish()
+        error_file.write("=" * 80 + "\n")
+        error_file.write("IMPORT PROFILE\n")
+        error_file.writelines(profiler.lines())
 
         return success_count, error_count, error_details[:20]
 
     except Exception as e:
-        logger.error(
-            f"Error in import_products_with_validation: {str(e)}", exc_info=True
-        )
-        # Create minimal error log
-        with open(error_log_path, "w", encoding="utf-8") as f:
-            f.write(f"Fatal Error during product import: {str(e)}\n")
+        logger.error("Error in import_products_with_validation: %s", e, exc_info=True)
+        # keep the rows logged so far, or create a minimal error log
+        if error_file is None:
+            error_file = open_error_log(error_log_path)
+        error_file.write(f"Fatal Error during product import: {str(e)}\n")
         return 0, 0, [f"Fatal error: {str(e)}"]
+    finally:
+        # also closes the profile (and its tracemalloc use) on the early returns
+        profiler.finish()
+        meter.finish()
+        if error_file is not None:
+            error_file.close()